@@ -0,0 +1,304 @@
+"""
+Benchmark of the full dispense sequence on simulated or mock hardware.
+
+Cups of random beverages are dispensed either one at a time through
+DispenseSequenceManager or as single-cup orders through MainController
+and its pipeline. The hardware call behind each stage is timed. The
+report gives cups per hour, p50/p95/p99 time per stage, fill error per
+beverage and CPU time per cup, and can be written as JSON and compared
+with an earlier run.
+
+On the simulator (--hardware sim) stage times and throughput are virtual
+time. The simulated taps feed their pulses and scale readings into the
+driver's PourControl, so the fill error is the volume that really flowed
+against the driver's target when the driver's own logic closed the valve.
+Without a scale (the sequence target) it includes the flow sensor's
+uncalibrated k-factor. The simulator runs blocking calls one after
+another, so MainController's throughput there is the sum of its stage
+times; benchmarks.evening_simulation models the overlap. On the mocks
+(--hardware mock) everything is wall time and there is no fill error.
+
+Run from the repository root:
+    python -m benchmarks.dispense_benchmark --cups 200 --output before.json
+    python -m benchmarks.dispense_benchmark --cups 200 --compare before.json
+"""
+import os
+import json
+import time
+import random
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+
+# Stage and the hardware component and method that perform it
+STAGE_METHODS = {
+    'cup': ('cup_dispenser', 'dispense_cup'),
+    'pour': ('beer_dispenser', 'pour_beer'),
+    'deliver': ('cup_delivery', 'deliver_cup')
+}
+
+def percentile(values, fraction):
+    """Value below which the given fraction of the sorted values falls."""
+    return values[min(int(len(values) * fraction), len(values) - 1)] if values else None
+
+
+class StageRecorder:
+    """Times every call of the hardware method behind each stage."""
+    
+    def __init__(self, clock):
+        """
+        Initialize the recorder.
+        
+        Args:
+            clock (callable): Returns the current time in seconds
+        """
+        self.clock = clock
+        self.durations = {stage: [] for stage in STAGE_METHODS}
+        self.failures = {stage: 0 for stage in STAGE_METHODS}
+        self.fill_errors = {}
+        self.lock = threading.Lock()
+    
+    def attach(self, owner):
+        """
+        Wrap the stage methods of a controller's hardware components.
+        
+        Args:
+            owner: Object with cup_dispenser, beer_dispenser and cup_delivery attributes
+        """
+        for stage, (attribute, method) in STAGE_METHODS.items():
+            component = getattr(owner, attribute)
+            setattr(component, method, self._timed(stage, component, getattr(component, method)))
+    
+    def _timed(self, stage, component, method):
+        """Wrap one stage method."""
+        def timed(*args, **kwargs):
+            started = self.clock()
+            result = method(*args, **kwargs)
+            duration = self.clock() - started
+            with self.lock:
+                self.durations[stage].append(duration)
+                if not result:
+                    self.failures[stage] += 1
+            if result and stage == 'pour':
+                self._record_fill(component, kwargs.get('beverage_type', args[1] if len(args) > 1 else None))
+            return result
+        return timed
+    
+    def _record_fill(self, beer_dispenser, beverage_type):
+        """Record the fill error of a pour on simulated taps, which know what really flowed."""
+        tap = beer_dispenser.taps[beverage_type or beer_dispenser.get_current_beverage()]
+        pour = getattr(tap, 'last_pour', None)
+        if pour is not None:
+            with self.lock:
+                self.fill_errors.setdefault(tap.beverage_type, []).append(pour['poured_ml'] - pour['target_ml'])
+    
+    def summary(self):
+        """
+        Summarize the recorded calls.
+        
+        Returns:
+            tuple: Per-stage time statistics and per-beverage fill error statistics
+        """
+        stages = {}
+        for stage, durations in self.durations.items():
+            durations = sorted(durations)
+            stages[stage] = {
+                'count': len(durations),
+                'failures': self.failures[stage],
+                'mean': sum(durations) / len(durations) if durations else None,
+                'p50': percentile(durations, 0.50),
+                'p95': percentile(durations, 0.95),
+                'p99': percentile(durations, 0.99)
+            }
+        
+        fill = {}
+        for beverage, errors in sorted(self.fill_errors.items()):
+            fill[beverage] = {
+                'count': len(errors),
+                'mean': sum(errors) / len(errors),
+                'rms': (sum(e * e for e in errors) / len(errors)) ** 0.5,
+                'p95_abs': percentile(sorted(abs(e) for e in errors), 0.95)
+            }
+        return stages, fill
+
+
+def run_sequence(cups, rng, recorder):
+    """
+    Dispense cups one at a time through DispenseSequenceManager.
+    
+    Returns:
+        int: Cups dispensed successfully
+    """
+    from hardware import CupDispenser, BeerDispenser, CupDelivery
+    from controllers.error_handler import ErrorHandler
+    from controllers.dispense_sequence import DispenseSequenceManager
+    from config import BEVERAGE_TYPES
+    
+    hardware = argparse.Namespace(cup_dispenser=CupDispenser(), beer_dispenser=BeerDispenser(),
+                                  cup_delivery=CupDelivery())
+    for component in vars(hardware).values():
+        component.initialize()
+    recorder.attach(hardware)
+    
+    error_handler = ErrorHandler()
+    manager = DispenseSequenceManager(hardware.cup_dispenser, hardware.beer_dispenser,
+                                      hardware.cup_delivery, error_handler)
+    completed = 0
+    try:
+        for _ in range(cups):
+            hardware.beer_dispenser.set_beverage_type(rng.choice(BEVERAGE_TYPES))
+            success, _ = manager.execute_full_sequence()
+            completed += success
+    finally:
+        manager.stop()
+        error_handler.stop()
+        for component in vars(hardware).values():
+            component.cleanup()
+    return completed
+
+
+def run_controller(cups, rng, recorder):
+    """
+    Dispense single-cup orders through MainController.
+    
+    Returns:
+        int: Cups dispensed successfully
+    """
+    from controllers.main_controller import MainController
+    from config import BEVERAGE_TYPES
+    
+    controller = MainController()
+    recorder.attach(controller)
+    if not controller.initialize_system():
+        raise RuntimeError("System initialization failed")
+    
+    orders = []
+    try:
+        # Keep the queue topped up without overflowing it
+        while len(orders) < cups:
+            if controller.order_queue.pending_count() >= 10:
+                time.sleep(0.01)
+                continue
+            orders.append(controller.submit_order([{'beverage': rng.choice(BEVERAGE_TYPES)}]))
+        
+        while not all(order.is_finished() for order in orders):
+            time.sleep(0.05)
+    finally:
+        controller.shutdown()
+    return sum(order.jobs[0].status == 'completed' for order in orders)
+
+
+def git_commit():
+    """Commit the benchmark ran on, or None outside a git checkout."""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous, current):
+    """Print each metric of the current run next to the previous one."""
+    def line(name, old, new):
+        if old is None or new is None:
+            return
+        change = f"{(new / old - 1) * 100:+6.1f}%" if old else ""
+        print(f"  {name:<24} {old:10.3f} -> {new:10.3f} {change}")
+    
+    print(f"Compared with {previous['meta'].get('commit')} ({previous['meta']['timestamp']}):")
+    line('cups/h', previous['cups_per_hour'], current['cups_per_hour'])
+    line('CPU ms/cup', previous['cpu_ms_per_cup'], current['cpu_ms_per_cup'])
+    for stage, stats in current['stages'].items():
+        for key in ('p50', 'p95', 'p99'):
+            line(f"{stage} {key} s", previous['stages'].get(stage, {}).get(key), stats[key])
+    for beverage, stats in current['fill_error_ml'].items():
+        old = previous['fill_error_ml'].get(beverage, {})
+        line(f"{beverage} fill mean ml", old.get('mean'), stats['mean'])
+        line(f"{beverage} fill rms ml", old.get('rms'), stats['rms'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--cups', type=int, default=200, help="Cups to dispense")
+    parser.add_argument('--hardware', choices=['sim', 'mock'], default='sim', help="Hardware to run on")
+    parser.add_argument('--target', choices=['sequence', 'controller'], default='sequence',
+                        help="DispenseSequenceManager or MainController")
+    parser.add_argument('--seed', type=int, default=1, help="Seed of the beverages and the simulator")
+    parser.add_argument('--output', help="Write the results to this JSON file")
+    parser.add_argument('--compare', help="JSON results of an earlier run to compare with")
+    args = parser.parse_args()
+    
+    # The hardware backend and the data paths are read when the modules are first imported
+    os.environ['USE_SIMULATOR'] = '1' if args.hardware == 'sim' else '0'
+    os.environ['USE_REAL_GPIO'] = '0'
+    os.environ['SIM_SEED'] = str(args.seed)
+    data_dir = tempfile.mkdtemp(prefix='dispense_benchmark_')
+    os.environ['POUR_LEDGER_PATH'] = os.path.join(data_dir, 'pours.db')
+    os.environ['INVENTORY_STATE_PATH'] = os.path.join(data_dir, 'inventory.json')
+    
+    # Every cup is logged, and the controller configures logging on import; keep the report readable
+    logging.disable(logging.ERROR)
+    
+    if args.hardware == 'sim':
+        from hardware.simulator import get_simulation
+        clock = get_simulation().clock.time
+    else:
+        clock = time.monotonic
+    recorder = StageRecorder(clock)
+    runner = run_sequence if args.target == 'sequence' else run_controller
+    
+    started = clock()
+    cpu_started = time.process_time()
+    try:
+        completed = runner(args.cups, random.Random(args.seed), recorder)
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+    cpu_time = time.process_time() - cpu_started
+    elapsed = clock() - started
+    
+    stages, fill = recorder.summary()
+    results = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'hardware': args.hardware,
+            'target': args.target,
+            'seed': args.seed
+        },
+        'cups': args.cups,
+        'completed': completed,
+        'elapsed_sec': elapsed,
+        'cups_per_hour': completed * 3600 / elapsed if elapsed > 0 else None,
+        'cpu_ms_per_cup': cpu_time * 1000 / args.cups,
+        'stages': stages,
+        'fill_error_ml': fill
+    }
+    
+    print(f"{args.target} on {args.hardware} hardware: {completed}/{args.cups} cups in {elapsed:.1f}s "
+          f"({results['cups_per_hour']:.1f} cups/h), {results['cpu_ms_per_cup']:.2f} ms CPU per cup")
+    print(f"{'stage':<8} {'calls':>6} {'failed':>7} {'p50':>7} {'p95':>7} {'p99':>7}")
+    for stage, stats in stages.items():
+        if stats['count']:
+            print(f"{stage:<8} {stats['count']:6d} {stats['failures']:7d} "
+                  f"{stats['p50']:6.2f}s {stats['p95']:6.2f}s {stats['p99']:6.2f}s")
+    for beverage, stats in fill.items():
+        print(f"Fill error {beverage:<7} mean {stats['mean']:+6.1f}ml, rms {stats['rms']:5.1f}ml, "
+              f"p95 |error| {stats['p95_abs']:5.1f}ml")
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == '__main__':
+    main()
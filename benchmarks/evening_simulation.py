@@ -0,0 +1,187 @@
+"""
+Simulated service evening on the discrete-event hardware simulator.
+
+Orders of mixed beverages arrive at random, go through the order queue
+and are dispensed by the simulated cup dispenser, taps and conveyor. The
+three stages overlap like DispensePipeline: a stage holds its cup until
+the next stage is free. Everything runs on one virtual clock, so an
+evening of thousands of cups takes seconds, and the same seed gives the
+same evening.
+
+Run from the repository root:
+    python -m benchmarks.evening_simulation --cups 10000
+"""
+import time
+import logging
+import argparse
+from benchmarks.scheduler_benchmark import generate_orders
+from controllers.order_queue import OrderQueue
+from controllers.scheduler import create_scheduler
+from controllers.dispense_pipeline import PIPELINE_STAGES
+from hardware.simulator import Simulation, SimCupDispenser, SimBeerDispenser, SimCupDelivery
+
+def percentile(values, fraction):
+    """Value below which the given fraction of the sorted values falls."""
+    return values[min(int(len(values) * fraction), len(values) - 1)] if values else 0.0
+
+
+class EveningSimulation:
+    """Dispenses a list of orders on simulated hardware in virtual time."""
+    
+    def __init__(self, orders, policy=None, seed=None):
+        """
+        Initialize the simulation.
+        
+        Args:
+            orders (list): (arrival_time, items) tuples in arrival order
+            policy (str, optional): Scheduling policy of the order queue; defaults to ORDER_SETTINGS
+            seed (int, optional): Seed of the hardware simulation
+        """
+        self.simulation = Simulation(seed)
+        self.clock = self.simulation.clock
+        self.cup_dispenser = SimCupDispenser(self.simulation)
+        self.beer_dispenser = SimBeerDispenser(self.simulation)
+        self.cup_delivery = SimCupDelivery(self.simulation)
+        self.queue = OrderQueue(max_pending_jobs=sum(len(items) for _, items in orders) + 1,
+                                scheduler=create_scheduler(policy))
+        self.orders = orders
+        
+        self.starters = {
+            'cup': lambda job, done: self.cup_dispenser.start_dispense(done),
+            'pour': lambda job, done: self.beer_dispenser.start_pour(job.volume_ml, job.beverage_type, done),
+            'deliver': lambda job, done: self.cup_delivery.start_delivery(done)
+        }
+        self.stage_jobs = {stage: None for stage in PIPELINE_STAGES}
+        self.stage_done = {stage: False for stage in PIPELINE_STAGES}
+        self.stage_started = {}
+        
+        self.arrivals = {}
+        self.waits = []
+        self.stage_times = {stage: [] for stage in PIPELINE_STAGES}
+        self.failures = {stage: 0 for stage in PIPELINE_STAGES}
+        self.fill_errors = {}
+        self.completed = 0
+    
+    def _arrive(self, items):
+        """Event queueing an order."""
+        order = self.queue.submit(items)
+        for job in order.jobs:
+            self.arrivals[job.job_id] = self.clock.time()
+        self._advance()
+    
+    def _start(self, stage, job):
+        """Put a job into a stage and start its hardware."""
+        self.stage_jobs[stage] = job
+        self.stage_done[stage] = False
+        self.stage_started[stage] = self.clock.time()
+        if not self.starters[stage](job, lambda success: self._stage_finished(stage, job, success)):
+            self._stage_finished(stage, job, False)
+    
+    def _stage_finished(self, stage, job, success):
+        """Callback of a stage's hardware."""
+        self.stage_times[stage].append(self.clock.time() - self.stage_started[stage])
+        if success:
+            self.stage_done[stage] = True
+            if stage == 'pour':
+                pour = self.beer_dispenser.taps[job.beverage_type].last_pour
+                self.fill_errors.setdefault(job.beverage_type, []).append(pour['poured_ml'] - pour['target_ml'])
+        else:
+            self.failures[stage] += 1
+            self.stage_jobs[stage] = None
+            job.finish('failed', f"{stage} stage failed")
+        self._advance()
+    
+    def _advance(self):
+        """Move finished jobs on, last stage first, and start the next job if the cup stage is free."""
+        for index in reversed(range(len(PIPELINE_STAGES))):
+            stage = PIPELINE_STAGES[index]
+            job = self.stage_jobs[stage]
+            if job is None or not self.stage_done[stage]:
+                continue
+            if index + 1 == len(PIPELINE_STAGES):
+                self.stage_jobs[stage] = None
+                job.finish('completed')
+                self.completed += 1
+            elif self.stage_jobs[PIPELINE_STAGES[index + 1]] is None:
+                self.stage_jobs[stage] = None
+                self._start(PIPELINE_STAGES[index + 1], job)
+        
+        if self.stage_jobs['cup'] is None:
+            job = self.queue.next_job(timeout=0)
+            if job is not None:
+                self.waits.append(self.clock.time() - self.arrivals.pop(job.job_id))
+                self._start('cup', job)
+    
+    def run(self):
+        """
+        Dispense every order.
+        
+        Returns:
+            dict: Cups, failures, throughput, waits, stage times and fill errors
+        """
+        self.cup_dispenser.initialize()
+        self.beer_dispenser.initialize()
+        self.cup_delivery.initialize()
+        for arrival, items in self.orders:
+            self.clock.schedule(arrival, self._arrive, items)
+        
+        started = time.process_time()
+        self.clock.run()
+        cpu_time = time.process_time() - started
+        self.beer_dispenser.cleanup()
+        
+        makespan = self.clock.time() - self.orders[0][0]
+        self.waits.sort()
+        return {
+            'cups': self.completed,
+            'failures': dict(self.failures),
+            'hours': makespan / 3600,
+            'cups_per_hour': self.completed * 3600 / makespan,
+            'mean_wait': sum(self.waits) / len(self.waits),
+            'p95_wait': percentile(self.waits, 0.95),
+            'stage_p50': {stage: percentile(sorted(times), 0.5) for stage, times in self.stage_times.items()},
+            'fill_error': {
+                beverage: (sum(errors) / len(errors),
+                           (sum(e * e for e in errors) / len(errors)) ** 0.5)
+                for beverage, errors in self.fill_errors.items()
+            },
+            'events': self.clock.events_processed,
+            'cpu_time': cpu_time
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--cups', type=int, default=10000, help="Cups ordered over the evening")
+    parser.add_argument('--interval', type=float, default=35.0, help="Mean seconds between orders")
+    parser.add_argument('--policy', help="Scheduling policy ('fifo' or 'grouped'), the configured one if omitted")
+    parser.add_argument('--seed', type=int, default=1, help="Seed of the arrivals and the hardware")
+    args = parser.parse_args()
+    
+    # Every cup is logged; keep the report readable
+    logging.getLogger().setLevel(logging.CRITICAL)
+    
+    orders = []
+    cups = 0
+    for arrival, items in generate_orders(args.cups, args.interval, args.seed):
+        items = items[:args.cups - cups]
+        orders.append((arrival, items))
+        cups += len(items)
+        if cups == args.cups:
+            break
+    
+    result = EveningSimulation(orders, args.policy, args.seed).run()
+    
+    print(f"{cups} cups in {len(orders)} orders, mean interval {args.interval}s, seed {args.seed}")
+    print(f"Delivered {result['cups']} cups in {result['hours']:.1f} simulated hours "
+          f"({result['cups_per_hour']:.1f} cups/h)")
+    print("Failures: " + ", ".join(f"{stage} {count}" for stage, count in result['failures'].items()))
+    print(f"Wait for a cup stage: mean {result['mean_wait']:.1f}s, p95 {result['p95_wait']:.1f}s")
+    print("Median stage time: " + ", ".join(f"{stage} {value:.1f}s" for stage, value in result['stage_p50'].items()))
+    for beverage, (mean, rms) in sorted(result['fill_error'].items()):
+        print(f"Fill error {beverage:<7} mean {mean:+6.1f}ml, rms {rms:5.1f}ml")
+    print(f"{result['events']} events in {result['cpu_time']:.2f}s of CPU time")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+"""
+Benchmark of the order scheduling policies on a simulated dispense pipeline.
+
+Orders of mixed beverages arrive at random and are dispensed by a model of
+the three-stage pipeline whose stage times come from config: the cup drop
+delay, the pour time at each beverage's flow and slow-pour rates plus a
+switch cost after a different beverage, and the conveyor time. Every
+policy sees the same arrivals.
+
+The switch cost is an assumption, not a measurement: LINE_SWITCH_SEC is an
+uncalibrated placeholder, and the scheduler optimizes the same figure the
+model charges. The throughput difference therefore shows how the policies
+behave if switching costs that much, not that grouping speeds up the
+machine. Pass --switch-sec to see how the difference depends on it.
+
+Run from the repository root:
+    python -m benchmarks.scheduler_benchmark --switch-sec 0 2 5
+"""
+import random
+import logging
+import argparse
+from controllers.order_queue import OrderQueue
+from controllers.scheduler import create_scheduler
+from config import BEVERAGE_POUR_SETTINGS, BEVERAGE_TYPES, CUP_SETTINGS, DELIVERY_SETTINGS
+
+def pour_time(beverage_type, last_beverage):
+    """Modelled pour stage duration in seconds."""
+    settings = BEVERAGE_POUR_SETTINGS[beverage_type]
+    volume = settings['DEFAULT_VOLUME_ML']
+    rate = settings['FLOW_RATE_ML_PER_SEC']
+    threshold = settings['SLOW_POUR_THRESHOLD']
+    duration = volume * threshold / rate + volume * (1 - threshold) / (rate * settings['SLOW_POUR_RATE'])
+    if last_beverage is not None and last_beverage != beverage_type:
+        duration += settings['LINE_SWITCH_SEC']
+    return duration
+
+
+def assume_switch_cost(seconds):
+    """Charge and plan with the same switch cost for every beverage."""
+    for settings in BEVERAGE_POUR_SETTINGS.values():
+        settings['LINE_SWITCH_SEC'] = seconds
+
+
+def generate_orders(count, mean_interval, seed):
+    """
+    Generate order arrivals.
+    
+    Returns:
+        list: (arrival_time, items) tuples in arrival order
+    """
+    rng = random.Random(seed)
+    now = 0.0
+    orders = []
+    for _ in range(count):
+        now += rng.expovariate(1.0 / mean_interval)
+        items = [{'beverage': rng.choice(BEVERAGE_TYPES)} for _ in range(rng.randint(1, 3))]
+        orders.append((now, items))
+    return orders
+
+
+def simulate(orders, policy):
+    """
+    Dispense the orders through the modelled pipeline.
+    
+    A stage holds its cup until the next stage is free, as in
+    DispensePipeline, and the next job is chosen when the cup stage frees up.
+    
+    Returns:
+        dict: Makespan, throughput, line switches and waiting times
+    """
+    queue = OrderQueue(max_pending_jobs=len(orders) * 3, scheduler=create_scheduler(policy))
+    arrivals = {}
+    next_order = 0
+    cup_free = 0.0
+    pour_free = 0.0  # Time the pour stage hands its cup to delivery
+    deliver_end = 0.0
+    last_beverage = None
+    switches = 0
+    waits = []
+    
+    while next_order < len(orders) or queue.pending_count():
+        # Admit every order that has arrived by the time the cup stage is free
+        if not queue.pending_count() and orders[next_order][0] > cup_free:
+            cup_free = orders[next_order][0]
+        while next_order < len(orders) and orders[next_order][0] <= cup_free:
+            arrival, items = orders[next_order]
+            order = queue.submit(items)
+            for job in order.jobs:
+                arrivals[job.job_id] = arrival
+            next_order += 1
+        
+        job = queue.next_job(timeout=0)
+        waits.append(cup_free - arrivals[job.job_id])
+        if last_beverage is not None and job.beverage_type != last_beverage:
+            switches += 1
+        
+        cup_end = cup_free + CUP_SETTINGS['DISPENSE_DELAY_SEC']
+        pour_start = max(cup_end, pour_free)
+        pour_end = pour_start + pour_time(job.beverage_type, last_beverage)
+        deliver_start = max(pour_end, deliver_end)
+        deliver_end = deliver_start + DELIVERY_SETTINGS['DELIVERY_TIMEOUT_SEC']
+        
+        cup_free = pour_start
+        pour_free = deliver_start
+        last_beverage = job.beverage_type
+    
+    makespan = deliver_end - orders[0][0]
+    waits.sort()
+    return {
+        'cups': len(waits),
+        'makespan': makespan,
+        'cups_per_hour': len(waits) * 3600 / makespan,
+        'switches': switches,
+        'mean_wait': sum(waits) / len(waits),
+        'p95_wait': waits[int(len(waits) * 0.95)],
+        'max_wait': waits[-1]
+    }
+
+
+def run_policies(args):
+    """
+    Run every policy on the same arrivals for each seed.
+    
+    Returns:
+        dict: Maps each policy to its results averaged over the runs
+    """
+    totals = {}
+    for seed in range(args.runs):
+        orders = generate_orders(args.orders, args.interval, seed)
+        for policy in ['fifo', 'grouped']:
+            result = simulate(orders, policy)
+            for key, value in result.items():
+                totals.setdefault(policy, {}).setdefault(key, 0.0)
+                totals[policy][key] += value / args.runs
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--orders', type=int, default=200, help="Orders per run")
+    parser.add_argument('--interval', type=float, default=10.0, help="Mean seconds between orders")
+    parser.add_argument('--runs', type=int, default=5, help="Runs with different seeds")
+    parser.add_argument('--switch-sec', type=float, nargs='+',
+                        help="Assumed switch costs to compare, instead of each beverage's LINE_SWITCH_SEC")
+    args = parser.parse_args()
+    
+    # Queueing is logged per order; keep the report readable
+    logging.getLogger().setLevel(logging.WARNING)
+    
+    print(f"{args.orders} orders, mean interval {args.interval}s, {args.runs} runs")
+    for switch_sec in args.switch_sec or [None]:
+        if switch_sec is None:
+            costs = ', '.join(f"{beverage} {settings['LINE_SWITCH_SEC']:g}s"
+                              for beverage, settings in BEVERAGE_POUR_SETTINGS.items())
+            print(f"\nAssumed switch cost from LINE_SWITCH_SEC (uncalibrated): {costs}")
+        else:
+            assume_switch_cost(switch_sec)
+            print(f"\nAssumed switch cost: {switch_sec:g}s")
+        
+        totals = run_policies(args)
+        print(f"{'policy':<8} {'cups/h':>8} {'switches':>9} {'mean wait':>10} {'p95 wait':>9} {'max wait':>9}")
+        for policy, result in totals.items():
+            print(f"{policy:<8} {result['cups_per_hour']:8.1f} {result['switches']:9.1f} "
+                  f"{result['mean_wait']:9.1f}s {result['p95_wait']:8.1f}s {result['max_wait']:8.1f}s")
+        
+        difference = totals['grouped']['cups_per_hour'] / totals['fifo']['cups_per_hour'] - 1
+        print(f"Modelled throughput difference of grouped over FIFO: {difference * 100:.1f}% "
+              f"(follows from the assumed switch cost)")
+
+
+if __name__ == '__main__':
+    main()
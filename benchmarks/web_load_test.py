@@ -0,0 +1,351 @@
+"""
+Load test of the web API with kiosk-like traffic.
+
+Closed-loop clients send requests back to back against a running
+instance for a fixed time, at each client count in turn. The report
+gives requests per second and latency percentiles per route for every
+step, so the step where throughput stops growing while latency climbs
+marks saturation. A stub vision server answers the age verification
+calls in place of OpenAI, with a configurable latency.
+
+Traffic profiles:
+    poll   staff tablets polling /api/system/status, /api/errors and
+           /api/dispensing_status
+    kiosk  polling mixed with /api/verify_age uploads and orders
+
+Start an instance against the stub and the simulator, then load it:
+    python -m benchmarks.web_load_test --start-server --clients 1,4,16,32
+
+Or load an instance that is already running; age verification then
+goes wherever that instance sends it:
+    python -m benchmarks.web_load_test --url http://127.0.0.1:5000 --profile poll
+"""
+import os
+import sys
+import json
+import time
+import base64
+import random
+import signal
+import logging
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+from urllib.parse import urlsplit
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from benchmarks.dispense_benchmark import percentile
+
+# (weight, method, route) of the requests each profile sends
+PROFILES = {
+    'poll': [
+        (4, 'GET', '/api/system/status'),
+        (2, 'GET', '/api/errors'),
+        (4, 'GET', '/api/dispensing_status')
+    ],
+    'kiosk': [
+        (4, 'GET', '/api/system/status'),
+        (1, 'GET', '/api/errors'),
+        (4, 'GET', '/api/dispensing_status'),
+        (1, 'POST', '/api/verify_age'),
+        (0.2, 'POST', '/api/start_dispensing')
+    ]
+}
+
+class StubVisionHandler(BaseHTTPRequestHandler):
+    """Answers chat completion requests like the OpenAI API after a fixed latency."""
+    
+    protocol_version = 'HTTP/1.1'
+    
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        time.sleep(self.server.latency)
+        with self.server.lock:
+            self.server.requests += 1
+        
+        content = json.dumps({'estimated_age': 30, 'confidence': 0.9, 'is_over_18': True,
+                              'is_over_21': True, 'reasoning': "Stub vision server"})
+        body = json.dumps({
+            'id': 'chatcmpl-stub',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': 'gpt-4o',
+            'choices': [{'index': 0, 'finish_reason': 'stop',
+                         'message': {'role': 'assistant', 'content': content}}],
+            'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        """Keep the report readable."""
+
+
+class StubVisionServer(ThreadingHTTPServer):
+    """Local stand-in for the vision API used by age verification."""
+    
+    daemon_threads = True
+    
+    def __init__(self, latency, port=0):
+        """
+        Initialize the server.
+        
+        Args:
+            latency (float): Seconds each answer takes
+            port (int): Port to listen on, any free port if 0
+        """
+        super().__init__(('127.0.0.1', port), StubVisionHandler)
+        self.latency = latency
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.thread = None
+    
+    @property
+    def base_url(self):
+        """str: Base URL to give the OpenAI client."""
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+    
+    def start(self):
+        """Serve in a background thread."""
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        """Stop serving."""
+        self.shutdown()
+        self.server_close()
+
+
+class LoadClient(threading.Thread):
+    """One closed-loop client sending the profile's requests back to back."""
+    
+    def __init__(self, url, routes, image_data, stop_event, rng):
+        """
+        Initialize the client.
+        
+        Args:
+            url (str): Base URL of the instance
+            routes (list): (weight, method, route) tuples to choose from
+            image_data (str): Data URL uploaded for age verification
+            stop_event (threading.Event): Set to end the run
+            rng (random.Random): Random source for the request mix
+        """
+        super().__init__(daemon=True)
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.routes = [(method, route) for _, method, route in routes]
+        self.weights = [weight for weight, _, _ in routes]
+        self.image_data = image_data
+        self.stop_event = stop_event
+        self.rng = rng
+        self.order_id = None
+        self.connection = None
+        self.samples = []  # (route, status, latency, start time); status 0 for a connection error
+    
+    def _body(self, route):
+        """Request body of a POST route."""
+        beverage = self.rng.choice(['beer', 'kofola', 'birel'])
+        if route == '/api/verify_age':
+            return {'beverage_type': beverage, 'image_data': self.image_data}
+        return {'order_items': [{'beverage': beverage}]}
+    
+    def _request(self, method, route):
+        """Send one request; returns its status and decoded JSON body."""
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        
+        path = route
+        headers = {}
+        body = None
+        if route == '/api/dispensing_status' and self.order_id:
+            path = f"{route}?order_id={self.order_id}"
+        if method == 'POST':
+            body = json.dumps(self._body(route))
+            headers['Content-Type'] = 'application/json'
+        
+        try:
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.connection = None
+            return 0, None
+        if response.getheader('Connection', '').lower() == 'close' or response.version == 10:
+            self.connection.close()
+            self.connection = None
+        try:
+            return response.status, json.loads(data)
+        except ValueError:
+            return response.status, None
+    
+    def run(self):
+        while not self.stop_event.is_set():
+            method, route = self.rng.choices(self.routes, self.weights)[0]
+            started = time.perf_counter()
+            status, data = self._request(method, route)
+            self.samples.append((route, status, time.perf_counter() - started, started))
+            if route == '/api/start_dispensing' and status == 200 and data:
+                self.order_id = data.get('order_id')
+        if self.connection is not None:
+            self.connection.close()
+
+
+def run_step(url, routes, clients, duration, warmup, image_data, seed):
+    """
+    Load the instance with a number of clients.
+    
+    Returns:
+        dict: Requests per second, errors and latency percentiles, overall and per route
+    """
+    stop_event = threading.Event()
+    workers = [LoadClient(url, routes, image_data, stop_event, random.Random(f"{seed}:{index}"))
+               for index in range(clients)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    time.sleep(warmup + duration)
+    stop_event.set()
+    for worker in workers:
+        worker.join(timeout=35)
+    
+    # Requests started during the warmup are not counted
+    window_start = started + warmup
+    samples = [sample for worker in workers for sample in worker.samples if sample[3] >= window_start]
+    
+    def summarize(selected):
+        latencies = sorted(latency for _, _, latency, _ in selected)
+        return {
+            'requests': len(selected),
+            'rps': len(selected) / duration,
+            'errors': sum(1 for _, status, _, _ in selected if status == 0 or status >= 500),
+            'p50_ms': percentile(latencies, 0.50) * 1000 if latencies else None,
+            'p95_ms': percentile(latencies, 0.95) * 1000 if latencies else None,
+            'p99_ms': percentile(latencies, 0.99) * 1000 if latencies else None
+        }
+    
+    return {
+        'clients': clients,
+        'total': summarize(samples),
+        'routes': {
+            route: summarize([sample for sample in samples if sample[0] == route])
+            for _, _, route in routes
+        }
+    }
+
+
+def wait_until_ready(url, timeout):
+    """Poll the status route until the instance answers."""
+    parts = urlsplit(url)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=2)
+            connection.request('GET', '/api/system/status')
+            if connection.getresponse().status == 200:
+                return True
+        except (OSError, http.client.HTTPException):
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def start_server(command, port, vision_url):
+    """
+    Start an instance on the simulator with age verification sent to the stub.
+    
+    Returns:
+        subprocess.Popen: The server process, in its own process group
+    """
+    data_dir = tempfile.mkdtemp(prefix='web_load_test_')
+    env = dict(os.environ,
+               PORT=str(port),
+               USE_SIMULATOR='1',
+               USE_REAL_GPIO='0',
+               OPENAI_API_KEY='stub-key-for-load-test',
+               OPENAI_BASE_URL=vision_url,
+               POUR_LEDGER_PATH=os.path.join(data_dir, 'pours.db'),
+               INVENTORY_STATE_PATH=os.path.join(data_dir, 'inventory.json'))
+    return subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                            start_new_session=True)
+
+
+def print_step(step):
+    """Print one step of the report."""
+    total = step['total']
+    print(f"{step['clients']:>3} clients: {total['rps']:8.1f} req/s, {total['errors']} errors, "
+          f"p50 {total['p50_ms'] or 0:7.1f} ms, p95 {total['p95_ms'] or 0:7.1f} ms, "
+          f"p99 {total['p99_ms'] or 0:7.1f} ms")
+    for route, stats in step['routes'].items():
+        if stats['requests']:
+            print(f"      {route:<24} {stats['rps']:8.1f} req/s  p50 {stats['p50_ms']:7.1f} ms  "
+                  f"p95 {stats['p95_ms']:7.1f} ms  p99 {stats['p99_ms']:7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help="Base URL of the instance")
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='kiosk', help="Traffic mix")
+    parser.add_argument('--clients', default='1,2,4,8,16,32', help="Comma-separated client counts to step through")
+    parser.add_argument('--duration', type=float, default=20.0, help="Measured seconds per step")
+    parser.add_argument('--warmup', type=float, default=3.0, help="Unmeasured seconds before each step")
+    parser.add_argument('--image-kb', type=int, default=40, help="Size of each age verification upload")
+    parser.add_argument('--vision-latency', type=float, default=1.5, help="Seconds the stub vision server takes")
+    parser.add_argument('--start-server', action='store_true',
+                        help="Start an instance on the simulator with the stub vision server")
+    parser.add_argument('--server-cmd', default=f"{sys.executable} main.py", help="Command starting the instance")
+    parser.add_argument('--seed', type=int, default=1, help="Seed of the request mix")
+    parser.add_argument('--output', help="Write the results to this JSON file")
+    args = parser.parse_args()
+    
+    logging.getLogger().setLevel(logging.WARNING)
+    client_counts = [int(count) for count in args.clients.split(',')]
+    routes = PROFILES[args.profile]
+    image = base64.b64encode(random.Random(args.seed).randbytes(args.image_kb * 1024)).decode()
+    image_data = f"data:image/jpeg;base64,{image}"
+    
+    vision = StubVisionServer(args.vision_latency)
+    vision.start()
+    server = None
+    try:
+        if args.start_server:
+            server = start_server(args.server_cmd.split(), urlsplit(args.url).port or 80, vision.base_url)
+        if not wait_until_ready(args.url, 60 if args.start_server else 5):
+            print(f"No instance answering at {args.url}")
+            return
+        
+        print(f"Profile {args.profile} against {args.url}, {args.duration:.0f}s per step")
+        steps = []
+        for clients in client_counts:
+            step = run_step(args.url, routes, clients, args.duration, args.warmup, image_data, args.seed)
+            steps.append(step)
+            print_step(step)
+        
+        best = max(steps, key=lambda step: step['total']['rps'])
+        print(f"Peak {best['total']['rps']:.1f} req/s at {best['clients']} clients; "
+              f"stub vision server answered {vision.requests} requests")
+        
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump({
+                    'meta': {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'url': args.url,
+                             'profile': args.profile, 'duration': args.duration,
+                             'vision_latency': args.vision_latency, 'image_kb': args.image_kb},
+                    'steps': steps
+                }, f, indent=2)
+            print(f"Results written to {args.output}")
+    finally:
+        if server is not None:
+            # The development server's reloader runs the app in a child process
+            os.killpg(server.pid, signal.SIGTERM)
+            server.wait(timeout=10)
+        vision.stop()
+
+
+if __name__ == '__main__':
+    main()
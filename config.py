@@ -22,7 +22,9 @@ GPIO_PINS = {
     'BEER_VALVE': 22,
     'KOFOLA_VALVE': 26,
     'BIREL_VALVE': 27,
-    'FLOW_SENSOR': 23,
+    'BEER_FLOW_SENSOR': 23,
+    'KOFOLA_FLOW_SENSOR': 16,
+    'BIREL_FLOW_SENSOR': 20,
     
     # Cup delivery system pins
     'DELIVERY_MOTOR_1': 24,
@@ -56,6 +58,10 @@ BEVERAGE_POUR_SETTINGS = {
         'FOAM_HEADSPACE_ML': 50,  # Space to leave for foam
         'SLOW_POUR_THRESHOLD': 0.8,  # Percentage of fill at which to slow pour
         'SLOW_POUR_RATE': 0.3,  # Slow pour rate as a fraction of normal rate
+        'LINE_SWITCH_SEC': 0.0,  # Uncalibrated placeholder: extra pour time after a different beverage, never measured
+        'POUR_MODE': 'weight',  # 'flow' (stop on flow pulses) or 'weight' (stop on net cup weight)
+        'DENSITY_G_PER_ML': 1.01,  # Converts net cup weight to volume
+        'WEIGHT_HEADSPACE_ML': 15,  # Space to leave for foam when pouring by weight
         'TEMPERATURE_MIN': 4.0,  # Minimum ideal temperature (°C)
         'TEMPERATURE_MAX': 7.0,  # Maximum ideal temperature (°C)
         'COLOR': '#FFA500',  # Amber color for beer
@@ -73,6 +79,10 @@ BEVERAGE_POUR_SETTINGS = {
         'FOAM_HEADSPACE_ML': 30,  # Space to leave for foam
         'SLOW_POUR_THRESHOLD': 0.9,  # Percentage of fill at which to slow pour
         'SLOW_POUR_RATE': 0.4,  # Slow pour rate as a fraction of normal rate
+        'LINE_SWITCH_SEC': 0.0,  # Uncalibrated placeholder: extra pour time after a different beverage, never measured
+        'POUR_MODE': 'flow',  # 'flow' (stop on flow pulses) or 'weight' (stop on net cup weight)
+        'DENSITY_G_PER_ML': 1.04,  # Converts net cup weight to volume
+        'WEIGHT_HEADSPACE_ML': 10,  # Space to leave for foam when pouring by weight
         'TEMPERATURE_MIN': 3.0,  # Minimum ideal temperature (°C)
         'TEMPERATURE_MAX': 5.0,  # Maximum ideal temperature (°C)
         'COLOR': '#4B2D1A',  # Dark brown color for Kofola
@@ -90,6 +100,10 @@ BEVERAGE_POUR_SETTINGS = {
         'FOAM_HEADSPACE_ML': 40,  # Space to leave for foam
         'SLOW_POUR_THRESHOLD': 0.85,  # Percentage of fill at which to slow pour
         'SLOW_POUR_RATE': 0.35,  # Slow pour rate as a fraction of normal rate
+        'LINE_SWITCH_SEC': 0.0,  # Uncalibrated placeholder: extra pour time after a different beverage, never measured
+        'POUR_MODE': 'flow',  # 'flow' (stop on flow pulses) or 'weight' (stop on net cup weight)
+        'DENSITY_G_PER_ML': 1.01,  # Converts net cup weight to volume
+        'WEIGHT_HEADSPACE_ML': 15,  # Space to leave for foam when pouring by weight
         'TEMPERATURE_MIN': 4.0,  # Minimum ideal temperature (°C)
         'TEMPERATURE_MAX': 6.5,  # Maximum ideal temperature (°C)
         'COLOR': '#FFC857',  # Lighter amber color for Birel
@@ -102,20 +116,189 @@ BEVERAGE_POUR_SETTINGS = {
 # For backward compatibility
 BEER_POUR_SETTINGS = BEVERAGE_POUR_SETTINGS['beer']
 
+# Valve manifold wiring: GPIO_PINS keys for each beverage tap
+# Only the main pour position has a level sensor
+BEVERAGE_TAPS = {
+    'beer': {
+        'VALVE': 'BEER_VALVE',
+        'FLOW_SENSOR': 'BEER_FLOW_SENSOR',
+        'LEVEL_SENSOR': 'LIQUID_LEVEL_SENSOR'
+    },
+    'kofola': {
+        'VALVE': 'KOFOLA_VALVE',
+        'FLOW_SENSOR': 'KOFOLA_FLOW_SENSOR',
+        'LEVEL_SENSOR': None
+    },
+    'birel': {
+        'VALVE': 'BIREL_VALVE',
+        'FLOW_SENSOR': 'BIREL_FLOW_SENSOR',
+        'LEVEL_SENSOR': None
+    }
+}
+
+VALVE_SETTINGS = {
+    'CLOSE_LATENCY_SEC': 0.05,  # Initial guess for flow continuing after close command
+    'CLOSE_LATENCY_SMOOTHING': 0.3,  # Weight of each new pour when learning latency
+    'FLOW_RATE_WINDOW_PULSES': 16,  # Pulse timestamps used for the live flow rate
+    'PWM_FREQUENCY_HZ': 50,  # PWM frequency for proportional valve control
+    'RAMP_TIME_SEC': 0.5,  # Time to ramp between fast and slow pour
+    'RAMP_STEPS': 10,  # Duty cycle steps in a ramp
+}
+
 CUP_SETTINGS = {
-    'DISPENSE_DELAY_SEC': 2,  # Time to wait for cup to drop
+    'DISPENSE_DELAY_SEC': 2,  # Longest wait for a released cup to be confirmed by a sensor
+    'RELEASE_OPEN_SEC': 0.8,  # Time the cup release stays open (servo move plus hold)
+    'DROP_WEIGHT_STEP_G': 3,  # Weight increase confirming a cup has landed on the scale
+    'DROP_HISTORY': 200,  # Recent drop times kept for the statistics
     'DETECTION_TIMEOUT_SEC': 5,  # Maximum time to wait for cup detection
+    'POSITION_CLEAR_TIMEOUT_SEC': 60,  # Longest wait for the previous cup to leave the pour position
+    'SENSOR_BOUNCE_MS': 20,  # Debounce of the cup position sensor edges
 }
 
 DELIVERY_SETTINGS = {
     'CONVEYOR_SPEED': 50,  # Speed percentage (0-100)
     'DELIVERY_TIMEOUT_SEC': 10,  # Maximum time for delivery
+    'SENSOR_BOUNCE_MS': 20,  # Debounce of the pickup position sensor edges
+}
+
+WEIGHT_SENSOR_SETTINGS = {
+    'SAMPLE_RATE_SPS': 10,  # HX711 output rate set by its RATE pin (10 or 80)
+    'BUFFER_SIZE': 256,  # Raw samples kept by the sampler
+    'FILTER_WINDOW': 5,  # Newest samples in the filtered reading
+    'FILTER_TRIM': 1,  # Highest and lowest samples dropped from the window
+    'TARE_SAMPLES': 10,  # Samples averaged when taring
+    'CUP_TARE_SAMPLES': 5,  # Samples averaged when weighing a cup that has just landed
+    'REFERENCE_UNIT': float(os.environ.get('SCALE_REFERENCE_UNIT', 1)),  # Raw counts per gram, see WeightSensor.calibrate
+}
+
+# DS18B20 1-Wire temperature sensors on the beverage lines
+TEMPERATURE_SETTINGS = {
+    'W1_DEVICES_PATH': os.environ.get('W1_DEVICES_PATH', '/sys/bus/w1/devices'),
+    'SENSOR_IDS': {  # 1-Wire device ID of each line's sensor (ls /sys/bus/w1/devices), None if absent
+        'beer': None,
+        'kofola': None,
+        'birel': None
+    },
+    'SAMPLE_INTERVAL_SEC': 10,  # Time between sampling rounds
+    'STALE_AFTER_SEC': 60,  # Age at which a cached reading is no longer trusted
+}
+
+# Sensor monitoring settings
+MONITOR_SETTINGS = {
+    'WEIGHT_CHANGE_G': 2.0,  # Weight change recorded in the status snapshot
+    'TEMPERATURE_CHANGE_C': 0.1,  # Temperature change recorded in the status snapshot
+}
+
+# Sensor history kept in memory; every channel costs a fixed ~390 KB
+TELEMETRY_SETTINGS = {
+    'CHANNELS': ['weight', 'cup_present'] + [f"{beverage}_temperature" for beverage in BEVERAGE_TYPES],
+    'RAW_SAMPLES': 4096,  # About 7 minutes of weight samples at 10 SPS
+    'TIERS': {
+        '1s': (1, 3600),  # Bucket seconds, bucket count: one hour
+        '1m': (60, 10080),  # One week
+        '1h': (3600, 720),  # 30 days
+    },
+}
+
+# Flow/weight fusion for the volume in the cup
+VOLUME_ESTIMATOR_SETTINGS = {
+    'PULSE_NOISE': 0.05,  # Relative spread of the volume of a single flow pulse
+    'SCALE_DRIFT': 0.002,  # Drift of the flow sensor calibration per pulse
+    'INITIAL_SCALE_STD': 0.1,  # Relative uncertainty of the nominal ml per pulse
+    'WEIGHT_NOISE_ML': 3.0,  # Standard deviation of a filtered weight reading, including foam
+}
+
+# Flow sensor calibration learned from weighed pours, per beverage and flow rate
+FLOW_CALIBRATION_SETTINGS = {
+    'PATH': os.environ.get('FLOW_CALIBRATION_PATH',
+                           os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'flow_calibration.json')),
+    'NOMINAL_ML_PER_PULSE': 2.25,  # Datasheet volume per pulse before any pour is weighed
+    'FREQUENCY_POINTS_HZ': (2, 5, 10, 15, 20, 25, 30, 40),  # Pulse frequencies the curve is learned at
+    'INITIAL_STD': 0.1,  # Relative uncertainty of the nominal ml per pulse
+    'POINT_CORRELATION': 0.7,  # Prior correlation of neighbouring points, keeps the curve smooth
+    'DRIFT_PER_POUR': 0.005,  # Relative drift per pour, lets the curve follow keg pressure and temperature
+    'MIN_POUR_ML': 100,  # Smaller weighed pours are not learned from
+    'MAX_ERROR_FRACTION': 0.25,  # Weighed pours further off than this are rejected as bad weighings
+    'SAVE_EVERY_POURS': 10,  # Learned pours between writes of the calibration file
+    'LEARN_FROM_FLOW_POURS': True,  # Weigh cups poured by flow count too, if a scale is present
+}
+
+# Discrete-event hardware simulator (USE_SIMULATOR=1), running on a virtual clock
+SIMULATOR_SETTINGS = {
+    'SEED': int(os.environ.get('SIM_SEED', 1)),  # Same seed, same simulated evening
+    'K_FACTOR_SPREAD': 0.03,  # Unit-to-unit spread of the real pulses per ml around FLOW_CALIBRATION_SETTINGS' nominal
+    'PRESSURE_SPREAD': 0.05,  # Pour-to-pour spread of the flow rate with keg pressure
+    'VALVE_OPEN_SEC': 0.15,  # Time for the flow to build up after the valve opens
+    'CLOSE_LATENCY_SEC': 0.08,  # Flow continuing after the close command
+    'CLOSE_LATENCY_SPREAD': 0.01,  # Standard deviation of the close latency
+    'POUR_FAILURE_PROBABILITY': 0.005,  # Valve fails to open
+    'CUP_DROP_MEDIAN_SEC': 0.6,  # Median time for a cup to fall onto the scale
+    'CUP_DROP_SIGMA': 0.25,  # Log-normal spread of the drop time
+    'CUP_JAM_PROBABILITY': 0.01,  # Nested cups stuck in the dispenser
+    'CONVEYOR_LENGTH_MM': 600,  # Travel from the pour position to pickup
+    'CONVEYOR_MAX_SPEED_MM_PER_SEC': 200,  # Belt speed at 100%
+    'CONVEYOR_SLIP': 0.05,  # Relative spread of the travel time from belt slip
+    'CONVEYOR_STALL_PROBABILITY': 0.005,  # Cup caught on the belt guide
+}
+
+# Dispense pipeline settings
+PIPELINE_SETTINGS = {
+    'ENABLED': True,  # Overlap cup, pour and delivery stages of consecutive cups
+    'ENGINE': 'asyncio',  # 'asyncio' (cancellable stages on one event loop) or 'threaded'
+    'STAGE_TIMEOUT_SEC': {  # Time after which the asyncio engine aborts a stage
+        'cup': 75,  # Includes waiting for the previous cup to leave the pour position
+        'pour': 120,
+        'deliver': 30
+    },
+}
+
+# Order queue settings
+ORDER_SETTINGS = {
+    'MAX_PENDING_JOBS': 50,  # Maximum cups waiting across all orders
+    'ORDER_HISTORY_SIZE': 200,  # Orders kept for status lookups
+    'SCHEDULING_POLICY': 'fifo',  # 'fifo' or 'grouped' (batch the same beverage back to back; only once LINE_SWITCH_SEC is measured)
+    'FAIRNESS_WINDOW': 6,  # Number of oldest pending cups the scheduler may reorder
+    'MAX_SKIPS': 3,  # Times a cup may be overtaken before it is dispensed next
+}
+
+# Pour ledger persisted to SQLite
+LEDGER_SETTINGS = {
+    'DB_PATH': os.environ.get('POUR_LEDGER_PATH',
+                              os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'pour_ledger.db')),
+    'BATCH_SIZE': 20,  # Pours that trigger a write before the interval is up
+    'FLUSH_INTERVAL_SEC': 30,  # Longest time a pour waits in memory
+    'MAX_BUFFERED': 1000,  # Pours held in memory if the disk is unavailable
+}
+
+# Consumables tracking
+INVENTORY_SETTINGS = {
+    'KEG_VOLUME_ML': {  # Volume of a full keg of each beverage
+        'beer': 50000,
+        'kofola': 50000,
+        'birel': 30000
+    },
+    'CUP_STACK_SIZE': 100,  # Cups in a full stack
+    'RATE_WINDOW_SEC': 3600,  # Recent history the consumption rate is taken from
+    'LOW_LEVEL_FRACTION': 0.1,  # Remaining fraction reported as low
+    'STATE_PATH': os.environ.get('INVENTORY_STATE_PATH',
+                                 os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'inventory.json')),
 }
 
 # Error handling settings
 ERROR_SETTINGS = {
     'MAX_RETRIES': 3,  # Maximum number of retry attempts
-    'RETRY_DELAY_SEC': 2,  # Delay between retry attempts
+    'RETRY_DELAY_SEC': 2,  # Delay before the first retry, doubled for each further one
+    'MAX_RETRY_DELAY_SEC': 10,  # Longest delay between retry attempts
+    'RETRY_JITTER': 0.5,  # Fraction of each retry delay that is randomized
+    'STAGE_BUDGET_SEC': {  # Time from a stage's first attempt after which it is not retried
+        'cup': 20,
+        'pour': 120,
+        'deliver': 40
+    },
+    'BREAKER_FAILURES': 5,  # Consecutive failures after which a component fails fast
+    'BREAKER_RESET_SEC': 60,  # Time before a failed component is tried again
+    'DEDUP_WINDOW_SEC': 300,  # Repeats of a fault within this time update its existing record
+    'RATE_WINDOW_SEC': 60,  # Window for repeat rates; suppressed repeats are logged once per window
 }
 
 # Web interface settings
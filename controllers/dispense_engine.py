@@ -0,0 +1,298 @@
+"""
+Asyncio dispense engine running the pipeline stages as cancellable coroutines.
+"""
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from controllers.dispense_pipeline import PIPELINE_STAGES
+
+logger = logging.getLogger(__name__)
+
+# Stage a job may enter from its current stage; None is a job not started yet
+STAGE_TRANSITIONS = {
+    None: 'cup',
+    'cup': 'pour',
+    'pour': 'deliver',
+    'deliver': None
+}
+
+class StageTimeout(Exception):
+    """A stage did not finish within its timeout."""
+
+
+class AsyncDispenseEngine:
+    """
+    Drives the cup, pour and deliver stages from one asyncio event loop.
+    
+    It overlaps consecutive jobs exactly like DispensePipeline: each stage
+    holds one job and keeps it until the next stage takes it. Each job's
+    stage runs as a task, which can be cancelled, so cancel_all() ends
+    every in-flight stage at once and the job never reaches the next stage.
+    
+    The stage handlers are blocking hardware calls, so they run on a small
+    thread pool with one slot per stage, never one thread per order. When
+    a stage is cancelled or times out, its abort callback stops the
+    hardware. The stage takes no new job until the abandoned call has
+    returned, so two calls never drive the same hardware at once.
+    """
+    
+    def __init__(self, stage_handlers, job_source, on_stage_change=None, on_job_finished=None,
+                 stage_timeouts=None, stage_aborts=None):
+        """
+        Initialize the engine.
+        
+        Args:
+            stage_handlers (dict): Maps each stage name to a callable taking the job.
+                                   The callable raises an exception if the stage fails.
+            job_source (callable): Called with a timeout in seconds whenever the cup
+                                   stage is free; returns the next job or None
+            on_stage_change (callable, optional): Called with no arguments whenever
+                                                  a stage picks up or releases a job
+            on_job_finished (callable, optional): Called with the job once it leaves the engine
+            stage_timeouts (dict, optional): Maps stage names to their timeout in seconds
+            stage_aborts (dict, optional): Maps stage names to a callable stopping that
+                                           stage's hardware when the stage is cancelled
+        """
+        self.stage_handlers = stage_handlers
+        self.job_source = job_source
+        self.on_stage_change = on_stage_change
+        self.on_job_finished = on_job_finished
+        self.stage_timeouts = stage_timeouts or {}
+        self.stage_aborts = stage_aborts or {}
+        
+        self.stage_jobs = {stage: None for stage in PIPELINE_STAGES}
+        self.stage_tasks = {}
+        self.hardware_calls = {}  # stage -> concurrent future of its latest handler call
+        self.lock = threading.Lock()
+        self.running = False
+        self.loop = None
+        self.thread = None
+        self.executor = None
+    
+    def start(self):
+        """Start the event loop thread."""
+        if self.running:
+            return
+        
+        self.running = True
+        # One slot per stage plus one for waiting on the job source
+        self.executor = ThreadPoolExecutor(max_workers=len(PIPELINE_STAGES) + 1,
+                                           thread_name_prefix='dispense-stage')
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run_loop, daemon=True)
+        self.thread.start()
+        logger.info("Async dispense engine started")
+    
+    def _run_loop(self):
+        """Background thread running the event loop until stop."""
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self._main())
+        finally:
+            self.loop.close()
+    
+    async def _main(self):
+        """Run one worker coroutine per stage until stopped."""
+        self.stop_event = asyncio.Event()
+        self.handoffs = [asyncio.Queue(maxsize=1) for _ in PIPELINE_STAGES[1:]]
+        workers = [asyncio.ensure_future(self._stage_worker(index)) for index in range(len(PIPELINE_STAGES))]
+        
+        await self.stop_event.wait()
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+    
+    def get_stage_states(self):
+        """
+        Get the job currently held by each stage.
+        
+        Returns:
+            dict: Maps each stage to its job ID, or None if the stage is free
+        """
+        with self.lock:
+            return {
+                stage: job.job_id if job else None
+                for stage, job in self.stage_jobs.items()
+            }
+    
+    def is_idle(self):
+        """
+        Check whether the engine has no work.
+        
+        Returns:
+            bool: True if every stage is free
+        """
+        with self.lock:
+            return not any(self.stage_jobs.values())
+    
+    def cancel_all(self, timeout=1.0):
+        """
+        Cancel every job in a stage; callable from any thread.
+        
+        Args:
+            timeout (float): Seconds to wait for the cancellations to be processed
+        
+        Returns:
+            int: Number of stages whose job was cancelled
+        """
+        if not self.running:
+            return 0
+        future = asyncio.run_coroutine_threadsafe(self._cancel_all(), self.loop)
+        try:
+            return future.result(timeout)
+        except Exception as e:
+            logger.error(f"Failed to cancel dispense stages: {e}")
+            return 0
+    
+    async def _cancel_all(self):
+        """Cancel the in-flight stage tasks and wait until they have wound up."""
+        tasks = [task for task in self.stage_tasks.values() if not task.done()]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.wait(tasks)
+        return len(tasks)
+    
+    def stop(self):
+        """Cancel in-flight stages and stop the event loop."""
+        if not self.running:
+            return
+        
+        self.running = False
+        self.loop.call_soon_threadsafe(self.stop_event.set)
+        self.thread.join(timeout=2.0)
+        self.executor.shutdown(wait=False)
+        logger.info("Async dispense engine stopped")
+    
+    def _set_stage_job(self, stage, job):
+        """Record which job a stage holds and notify the listener."""
+        with self.lock:
+            self.stage_jobs[stage] = job
+        if self.on_stage_change:
+            self.on_stage_change()
+    
+    def _job_finished(self, job):
+        """Hand a finished job to the listener."""
+        if self.on_job_finished:
+            self.on_job_finished(job)
+    
+    def _cancel_unstarted(self, job):
+        """Finish a job that was taken from the source but never started."""
+        job.finish('cancelled', "Dispense engine stopped")
+        self._job_finished(job)
+    
+    async def _next_job(self):
+        """Wait for the job source without blocking the loop."""
+        fetch = self.executor.submit(self.job_source, 0.5)
+        try:
+            return await asyncio.wrap_future(fetch)
+        except asyncio.CancelledError:
+            # A job handed out after the engine stopped must not vanish
+            def cancel_fetched(f):
+                if not f.cancelled() and not f.exception() and f.result() is not None:
+                    self._cancel_unstarted(f.result())
+            fetch.add_done_callback(cancel_fetched)
+            raise
+    
+    async def _stage_worker(self, index):
+        """Coroutine running one stage for each job in turn."""
+        stage = PIPELINE_STAGES[index]
+        in_queue = self.handoffs[index - 1] if index > 0 else None
+        out_queue = self.handoffs[index] if index < len(self.handoffs) else None
+        
+        while True:
+            # Hardware abandoned by a cancelled job finishes before the next job starts
+            abandoned = self.hardware_calls.get(stage)
+            if abandoned is not None and not abandoned.done():
+                returned = asyncio.wrap_future(abandoned)
+                await asyncio.wait([returned])
+                returned.cancelled() or returned.exception()
+            
+            if in_queue is None:
+                job = await self._next_job()
+            else:
+                job = await in_queue.get()
+                # Accepting the job frees the previous stage
+                in_queue.task_done()
+            if job is None:
+                continue
+            
+            task = asyncio.ensure_future(self._run_stage(stage, job, out_queue))
+            self.stage_tasks[stage] = task
+            try:
+                # Waiting does not raise when only the stage task is cancelled
+                await asyncio.wait([task])
+            except asyncio.CancelledError:
+                task.cancel()
+                await asyncio.wait([task])
+                raise
+    
+    def _transition(self, job, stage):
+        """Move a job into a stage, rejecting any step out of order."""
+        if STAGE_TRANSITIONS.get(job.stage) != stage:
+            raise RuntimeError(f"Job {job.job_id} cannot move from {job.stage} to {stage}")
+        job.start_stage(stage)
+        logger.debug(f"Job {job.job_id} entered {stage} stage")
+    
+    def _abort_hardware(self, stage):
+        """Stop a stage's hardware if its handler is still running."""
+        call = self.hardware_calls.get(stage)
+        abort = self.stage_aborts.get(stage)
+        if call is not None and not call.done() and abort is not None:
+            try:
+                abort()
+            except Exception as e:
+                logger.error(f"Failed to abort {stage} stage: {e}")
+    
+    async def _run_stage(self, stage, job, out_queue):
+        """Run a job through one stage and hand it to the next."""
+        self._transition(job, stage)
+        self._set_stage_job(stage, job)
+        handed_over = False
+        try:
+            call = self.executor.submit(self.stage_handlers[stage], job)
+            self.hardware_calls[stage] = call
+            result = asyncio.wrap_future(call)
+            try:
+                # Shielded so a cancel abandons the call instead of waiting for it
+                await asyncio.wait_for(asyncio.shield(result), self.stage_timeouts.get(stage))
+            except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+                # An abandoned call's failure is expected once its hardware is stopped
+                result.add_done_callback(lambda f: f.cancelled() or f.exception())
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+                self._abort_hardware(stage)
+                raise StageTimeout(f"{stage} stage timed out after {self.stage_timeouts[stage]}s")
+            job.finish_stage(stage)
+            
+            if out_queue is None:
+                job.finish('completed')
+                self._job_finished(job)
+                return
+            
+            # Hold the job here until the next stage takes it
+            await out_queue.put(job)
+            handed_over = True
+            await out_queue.join()
+        except asyncio.CancelledError:
+            if handed_over:
+                if out_queue.empty():
+                    # The next stage owns the job now
+                    return
+                out_queue.get_nowait()
+                out_queue.task_done()
+            else:
+                # The stage was interrupted, so its work is not recorded as done
+                self._abort_hardware(stage)
+            job.finish('cancelled', "Stopped")
+            logger.warning(f"Job {job.job_id} cancelled in {stage} stage")
+            self._job_finished(job)
+        except Exception as e:
+            if stage not in job.stage_durations:
+                job.finish_stage(stage)
+            job.finish('failed', str(e))
+            logger.error(f"Job {job.job_id} failed in {stage} stage: {e}")
+            self._job_finished(job)
+        finally:
+            self._set_stage_job(stage, None)
@@ -0,0 +1,222 @@
+"""
+Pipelined dispense execution that overlaps the cup, pour and delivery stages.
+"""
+import time
+import logging
+import threading
+from queue import Queue, Empty
+
+logger = logging.getLogger(__name__)
+
+# Stages every cup passes through, in order
+PIPELINE_STAGES = ('cup', 'pour', 'deliver')
+
+class DispenseJob:
+    """A single cup to be dispensed, poured and delivered."""
+    
+    def __init__(self, job_id, volume_ml=None, beverage_type=None, order_id=None):
+        """
+        Initialize the job.
+        
+        Args:
+            job_id (int): Unique job identifier
+            volume_ml (float, optional): Volume to pour in milliliters
+            beverage_type (str, optional): Type of beverage to pour
+            order_id (str, optional): Order the job belongs to
+        """
+        self.job_id = job_id
+        self.order_id = order_id
+        self.volume_ml = volume_ml
+        self.beverage_type = beverage_type
+        self.status = 'queued'  # 'queued', 'running', 'completed', 'failed' or 'cancelled'
+        self.stage = None
+        self.error = None
+        self.created_at = time.time()
+        self.completed_at = None
+        self.measured_volume_ml = None
+        self.stage_started = {}
+        self.stage_durations = {}
+    
+    def start_stage(self, stage):
+        """Record that the job entered a stage."""
+        self.status = 'running'
+        self.stage = stage
+        self.stage_started[stage] = time.time()
+    
+    def finish_stage(self, stage):
+        """Record that the job's work in a stage is done."""
+        self.stage_durations[stage] = time.time() - self.stage_started[stage]
+    
+    def finish(self, status, error=None):
+        """
+        Mark the job as finished.
+        
+        Args:
+            status (str): Final status ('completed', 'failed' or 'cancelled')
+            error (str, optional): Reason for failure
+        """
+        self.status = status
+        self.error = error
+        self.completed_at = time.time()
+    
+    def to_dict(self):
+        """
+        Get a serializable view of the job.
+        
+        Returns:
+            dict: Job information
+        """
+        return {
+            'job_id': self.job_id,
+            'order_id': self.order_id,
+            'volume_ml': self.volume_ml,
+            'beverage_type': self.beverage_type,
+            'status': self.status,
+            'stage': self.stage,
+            'error': self.error,
+            'created_at': self.created_at,
+            'completed_at': self.completed_at,
+            'measured_volume_ml': self.measured_volume_ml,
+            'stage_durations': dict(self.stage_durations)
+        }
+
+
+class DispensePipeline:
+    """
+    Runs each stage on its own worker so consecutive jobs overlap.
+    
+    Every stage holds at most one job. A finished job stays in its stage
+    until the next stage accepts it, so cup N+1 is dropped while cup N
+    pours, and cup N rides the conveyor while cup N+1 pours.
+    """
+    
+    def __init__(self, stage_handlers, job_source, on_stage_change=None, on_job_finished=None):
+        """
+        Initialize the pipeline.
+        
+        Args:
+            stage_handlers (dict): Maps each stage name to a callable taking the job.
+                                   The callable raises an exception if the stage fails.
+            job_source (callable): Called with a timeout in seconds whenever the cup
+                                   stage is free; returns the next job or None
+            on_stage_change (callable, optional): Called with no arguments whenever
+                                                  a stage picks up or releases a job
+            on_job_finished (callable, optional): Called with the job once it leaves the pipeline
+        """
+        self.stage_handlers = stage_handlers
+        self.job_source = job_source
+        self.on_stage_change = on_stage_change
+        self.on_job_finished = on_job_finished
+        
+        # Single-cup handoffs between consecutive stages
+        self.queues = [Queue(maxsize=1) for _ in PIPELINE_STAGES[1:]]
+        self.stage_jobs = {stage: None for stage in PIPELINE_STAGES}
+        self.lock = threading.Lock()
+        self.running = False
+        self.threads = []
+    
+    def start(self):
+        """Start one worker thread per stage."""
+        if self.running:
+            return
+        
+        self.running = True
+        self.threads = [
+            threading.Thread(target=self._stage_worker, args=(index,), daemon=True)
+            for index in range(len(PIPELINE_STAGES))
+        ]
+        for thread in self.threads:
+            thread.start()
+        logger.info("Dispense pipeline started")
+    
+    def get_stage_states(self):
+        """
+        Get the job currently held by each stage.
+        
+        Returns:
+            dict: Maps each stage to its job ID, or None if the stage is free
+        """
+        with self.lock:
+            return {
+                stage: job.job_id if job else None
+                for stage, job in self.stage_jobs.items()
+            }
+    
+    def is_idle(self):
+        """
+        Check whether the pipeline has no work.
+        
+        Returns:
+            bool: True if every stage is free
+        """
+        with self.lock:
+            return not any(self.stage_jobs.values())
+    
+    def stop(self):
+        """Stop the workers once their current stage is done."""
+        if not self.running:
+            return
+        
+        self.running = False
+        for thread in self.threads:
+            thread.join(timeout=2.0)
+        logger.info("Dispense pipeline stopped")
+    
+    def _set_stage_job(self, stage, job):
+        """Record which job a stage holds and notify the listener."""
+        with self.lock:
+            self.stage_jobs[stage] = job
+        if self.on_stage_change:
+            self.on_stage_change()
+    
+    def _job_finished(self, job):
+        """Hand a finished job to the listener."""
+        if self.on_job_finished:
+            self.on_job_finished(job)
+    
+    def _stage_worker(self, index):
+        """Background thread running one stage for each job in turn."""
+        stage = PIPELINE_STAGES[index]
+        handler = self.stage_handlers[stage]
+        in_queue = self.queues[index - 1] if index > 0 else None
+        out_queue = self.queues[index] if index < len(self.queues) else None
+        
+        while self.running:
+            if in_queue is None:
+                # The next job is only chosen once the cup stage is free
+                job = self.job_source(0.5)
+            else:
+                try:
+                    job = in_queue.get(timeout=0.5)
+                except Empty:
+                    continue
+                # Accepting the job frees the previous stage
+                in_queue.task_done()
+            if job is None:
+                continue
+            
+            self._set_stage_job(stage, job)
+            job.start_stage(stage)
+            
+            try:
+                handler(job)
+            except Exception as e:
+                job.finish_stage(stage)
+                job.finish('failed', str(e))
+                logger.error(f"Job {job.job_id} failed in {stage} stage: {e}")
+                self._set_stage_job(stage, None)
+                self._job_finished(job)
+                continue
+            
+            job.finish_stage(stage)
+            
+            if out_queue is None:
+                job.finish('completed')
+                self._set_stage_job(stage, None)
+                self._job_finished(job)
+                continue
+            
+            # Hold the job here until the next stage takes it
+            out_queue.put(job)
+            out_queue.join()
+            self._set_stage_job(stage, None)
@@ -2,14 +2,30 @@
 Dispense sequence module that manages the beer dispensing steps.
 """
 import logging
+from concurrent.futures import Future
+from controllers.retry_policy import RetryPolicy, CircuitBreaker, RetryExecutor
 from config import ERROR_SETTINGS
 
 logger = logging.getLogger(__name__)
 
+# Steps of the sequence: stage, description for log messages, result message on failure
+SEQUENCE_STAGES = (
+    ('cup', "Cup dispensing", "Failed to dispense cup after multiple attempts"),
+    ('pour', "Beer pouring", "Failed to pour beer after multiple attempts"),
+    ('deliver', "Cup delivery", "Failed to deliver cup after multiple attempts")
+)
+
 class DispenseSequenceManager:
-    """Manages the beer dispensing sequence with error handling and retries."""
+    """
+    Manages the beer dispensing sequence with error handling and retries.
+    
+    Each step is retried under its stage's RetryPolicy and guarded by a
+    CircuitBreaker for its component. The steps run on a RetryExecutor, so
+    while one sequence waits out a backoff the executor can run steps of
+    other sequences.
+    """
     
-    def __init__(self, cup_dispenser, beer_dispenser, cup_delivery, error_handler):
+    def __init__(self, cup_dispenser, beer_dispenser, cup_delivery, error_handler, executor=None):
         """
         Initialize the dispense sequence manager.
         
@@ -18,6 +34,8 @@ class DispenseSequenceManager:
             beer_dispenser: Beer dispenser instance
             cup_delivery: Cup delivery instance
             error_handler: Error handler instance
+            executor (RetryExecutor, optional): Executor shared with other work; a
+                                                 private one is started if None
         """
         self.cup_dispenser = cup_dispenser
         self.beer_dispenser = beer_dispenser
@@ -26,6 +44,66 @@ class DispenseSequenceManager:
         
         self.max_retries = ERROR_SETTINGS['MAX_RETRIES']
         self.retry_delay = ERROR_SETTINGS['RETRY_DELAY_SEC']
+        
+        self.policies = {
+            stage: RetryPolicy(
+                max_attempts=self.max_retries,
+                base_delay=self.retry_delay,
+                max_delay=ERROR_SETTINGS['MAX_RETRY_DELAY_SEC'],
+                jitter=ERROR_SETTINGS['RETRY_JITTER'],
+                budget=ERROR_SETTINGS['STAGE_BUDGET_SEC'][stage]
+            )
+            for stage, _, _ in SEQUENCE_STAGES
+        }
+        self.breakers = {
+            stage: CircuitBreaker(
+                stage,
+                failure_threshold=ERROR_SETTINGS['BREAKER_FAILURES'],
+                reset_timeout=ERROR_SETTINGS['BREAKER_RESET_SEC']
+            )
+            for stage, _, _ in SEQUENCE_STAGES
+        }
+        
+        self.owns_executor = executor is None
+        if executor is None:
+            executor = RetryExecutor()
+            executor.start()
+        self.executor = executor
+    
+    def _run_stage(self, stage, description, operation):
+        """
+        Submit a step to the executor under its stage's policy and breaker.
+        
+        Args:
+            stage (str): 'cup', 'pour' or 'deliver'
+            description (str): Step name used in messages
+            operation (callable): Step returning True on success
+        
+        Returns:
+            Future: Resolves to True if the step succeeded, False otherwise
+        """
+        def on_retry(attempt, delay):
+            self.error_handler.log_error(
+                f"{description} failed, retrying in {delay:.1f}s... (attempt {attempt}/{self.max_retries})")
+        
+        def on_done(outcome_future):
+            outcome = outcome_future.result()
+            if not outcome.success:
+                if outcome.reason == 'circuit_open':
+                    message = f"{description} skipped, component failing repeatedly"
+                elif outcome.reason == 'budget':
+                    message = f"{description} failed, retry time budget exhausted after {outcome.attempts} attempts"
+                else:
+                    message = f"{description} failed after maximum retries"
+                self.error_handler.handle_error(message, component=stage)
+            result.set_result(outcome.success)
+        
+        result = Future()
+        logger.info(f"{description} submitted")
+        future = self.executor.submit(operation, self.policies[stage], self.breakers[stage],
+                                      name=description, on_retry=on_retry)
+        future.add_done_callback(on_done)
+        return result
     
     def dispense_cup_with_retry(self):
         """
@@ -34,19 +112,7 @@ class DispenseSequenceManager:
         Returns:
             bool: True if successful, False if all retries failed
         """
-        for attempt in range(1, self.max_retries + 1):
-            logger.info(f"Cup dispensing attempt {attempt}/{self.max_retries}")
-            if self.cup_dispenser.dispense_cup():
-                return True
-            else:
-                if attempt < self.max_retries:
-                    error_msg = f"Cup dispensing failed, retrying... (attempt {attempt}/{self.max_retries})"
-                    self.error_handler.log_error(error_msg)
-                    import time
-                    time.sleep(self.retry_delay)
-                else:
-                    self.error_handler.handle_error("Cup dispensing failed after maximum retries")
-        return False
+        return self._run_stage('cup', "Cup dispensing", self.cup_dispenser.dispense_cup).result()
     
     def pour_beer_with_retry(self, volume_ml=None):
         """
@@ -58,19 +124,8 @@ class DispenseSequenceManager:
         Returns:
             bool: True if successful, False if all retries failed
         """
-        for attempt in range(1, self.max_retries + 1):
-            logger.info(f"Beer pouring attempt {attempt}/{self.max_retries}")
-            if self.beer_dispenser.pour_beer(volume_ml):
-                return True
-            else:
-                if attempt < self.max_retries:
-                    error_msg = f"Beer pouring failed, retrying... (attempt {attempt}/{self.max_retries})"
-                    self.error_handler.log_error(error_msg)
-                    import time
-                    time.sleep(self.retry_delay)
-                else:
-                    self.error_handler.handle_error("Beer pouring failed after maximum retries")
-        return False
+        return self._run_stage('pour', "Beer pouring",
+                               lambda: self.beer_dispenser.pour_beer(volume_ml)).result()
     
     def deliver_cup_with_retry(self):
         """
@@ -79,19 +134,48 @@ class DispenseSequenceManager:
         Returns:
             bool: True if successful, False if all retries failed
         """
-        for attempt in range(1, self.max_retries + 1):
-            logger.info(f"Cup delivery attempt {attempt}/{self.max_retries}")
-            if self.cup_delivery.deliver_cup():
-                return True
-            else:
-                if attempt < self.max_retries:
-                    error_msg = f"Cup delivery failed, retrying... (attempt {attempt}/{self.max_retries})"
-                    self.error_handler.log_error(error_msg)
-                    import time
-                    time.sleep(self.retry_delay)
+        return self._run_stage('deliver', "Cup delivery", self.cup_delivery.deliver_cup).result()
+    
+    def start_full_sequence(self, volume_ml=None):
+        """
+        Start the complete dispensing sequence without waiting for it.
+        
+        Args:
+            volume_ml (float, optional): Volume to pour in milliliters.
+        
+        Returns:
+            Future: Resolves to (success, error message or None) as execute_full_sequence returns
+        """
+        operations = {
+            'cup': self.cup_dispenser.dispense_cup,
+            'pour': lambda: self.beer_dispenser.pour_beer(volume_ml),
+            'deliver': self.cup_delivery.deliver_cup
+        }
+        sequence = Future()
+        
+        # Do not use up a cup and a pour for a sequence a later stage cannot finish
+        for stage, description, failure_message in SEQUENCE_STAGES:
+            if self.breakers[stage].is_open():
+                self.error_handler.handle_error(f"{description} skipped, component failing repeatedly",
+                                                component=stage)
+                sequence.set_result((False, failure_message))
+                return sequence
+        
+        def run_step(index):
+            stage, description, failure_message = SEQUENCE_STAGES[index]
+            
+            def on_step_done(step):
+                if not step.result():
+                    sequence.set_result((False, failure_message))
+                elif index + 1 < len(SEQUENCE_STAGES):
+                    run_step(index + 1)
                 else:
-                    self.error_handler.handle_error("Cup delivery failed after maximum retries")
-        return False
+                    sequence.set_result((True, None))
+            
+            self._run_stage(stage, description, operations[stage]).add_done_callback(on_step_done)
+        
+        run_step(0)
+        return sequence
     
     def execute_full_sequence(self, volume_ml=None):
         """
@@ -104,17 +188,18 @@ class DispenseSequenceManager:
             bool: True if all steps were successful, False otherwise
             str: Error message if a step failed, or None if successful
         """
-        # Step 1: Dispense cup
-        if not self.dispense_cup_with_retry():
-            return False, "Failed to dispense cup after multiple attempts"
-        
-        # Step 2: Pour beer
-        if not self.pour_beer_with_retry(volume_ml):
-            return False, "Failed to pour beer after multiple attempts"
-        
-        # Step 3: Deliver cup
-        if not self.deliver_cup_with_retry():
-            return False, "Failed to deliver cup after multiple attempts"
+        return self.start_full_sequence(volume_ml).result()
+    
+    def get_breaker_states(self):
+        """
+        Get the circuit breaker state of each stage.
         
-        # All steps successful
-        return True, None
+        Returns:
+            dict: Maps each stage to its breaker state
+        """
+        return {stage: breaker.get_state() for stage, breaker in self.breakers.items()}
+    
+    def stop(self):
+        """Stop a private executor; steps waiting for a retry fail."""
+        if self.owns_executor:
+            self.executor.stop()
@@ -1,26 +1,166 @@
 """
 Error handling module for the beer dispensing system.
 """
+import re
 import time
 import logging
+import itertools
 import threading
 from queue import Queue, Empty
+from collections import deque
+from config import ERROR_SETTINGS
 
 logger = logging.getLogger(__name__)
 
+# Numbers that vary between repeats of one fault: counts, pins, addresses, readings
+VARIABLE_PATTERN = re.compile(r'0x[0-9a-fA-F]+|\d+(?:\.\d+)?')
+
+def error_fingerprint(message, code=None, component=None):
+    """
+    Get the key under which repeats of an error are aggregated.
+    
+    Args:
+        message (str): Description of the error
+        code (str, optional): Error code for categorization
+        component (str, optional): Component where error occurred
+    
+    Returns:
+        tuple: (component, code, message with numbers and extra whitespace normalized)
+    """
+    normalized = ' '.join(VARIABLE_PATTERN.sub('#', str(message)).split())
+    return (component, code, normalized)
+
+
+class ErrorRecord:
+    """One fault and every repeat of it."""
+    
+    __slots__ = ('error_id', 'fingerprint', 'timestamp', 'last_seen', 'message', 'code', 'component',
+                 'count', 'processed', 'window_start', 'window_count', 'previous_count',
+                 'last_logged', 'suppressed')
+    
+    def __init__(self, error_id, fingerprint, message, code=None, component=None, timestamp=None):
+        """
+        Initialize the record.
+        
+        Args:
+            error_id (int): Monotonic error identifier
+            fingerprint (tuple): Aggregation key from error_fingerprint
+            message (str): Description of the error
+            code (str, optional): Error code for categorization
+            component (str, optional): Component where error occurred
+            timestamp (float, optional): Time of the first occurrence, defaults to now
+        """
+        self.error_id = error_id
+        self.fingerprint = fingerprint
+        self.timestamp = timestamp if timestamp is not None else time.time()
+        self.last_seen = self.timestamp
+        self.message = message
+        self.code = code
+        self.component = component
+        self.count = 1
+        self.processed = False
+        self.window_start = self.timestamp
+        self.window_count = 1
+        self.previous_count = 0
+        self.last_logged = self.timestamp
+        self.suppressed = 0
+    
+    def repeat(self, message, timestamp, rate_window):
+        """
+        Count another occurrence.
+        
+        Args:
+            message (str): Description of this occurrence
+            timestamp (float): Time of this occurrence
+            rate_window (float): Length of a rate window in seconds
+        """
+        elapsed = timestamp - self.window_start
+        if elapsed >= rate_window:
+            # Start the window this occurrence falls in
+            self.previous_count = self.window_count if elapsed < 2 * rate_window else 0
+            self.window_start += rate_window * int(elapsed // rate_window)
+            self.window_count = 0
+        
+        self.window_count += 1
+        self.count += 1
+        self.last_seen = timestamp
+        self.message = message
+    
+    def rate(self, now, rate_window):
+        """
+        Estimate the occurrences in the last rate window.
+        
+        The previous window's count is weighted by how much of it still
+        overlaps the last rate_window seconds.
+        
+        Args:
+            now (float): Current time
+            rate_window (float): Length of a rate window in seconds
+        
+        Returns:
+            float: Occurrences per rate window
+        """
+        elapsed = now - self.window_start
+        if elapsed >= 2 * rate_window:
+            return 0.0
+        if elapsed >= rate_window:
+            return self.window_count * (2 - elapsed / rate_window)
+        return self.previous_count * (1 - elapsed / rate_window) + self.window_count
+    
+    def to_dict(self, now=None, rate_window=60):
+        """
+        Get a serializable view of the record.
+        
+        Args:
+            now (float, optional): Time the rate is estimated at, defaults to now
+            rate_window (float): Length of a rate window in seconds
+        
+        Returns:
+            dict: Error information
+        """
+        now = now if now is not None else time.time()
+        return {
+            'id': self.error_id,
+            'timestamp': self.timestamp,
+            'last_seen': self.last_seen,
+            'message': self.message,
+            'code': self.code,
+            'component': self.component,
+            'count': self.count,
+            'rate_per_min': round(self.rate(now, rate_window) * 60 / rate_window, 2),
+            'processed': self.processed
+        }
+
+
 class ErrorHandler:
-    """Handles errors and provides retry and reporting functionality."""
+    """
+    Handles errors and provides retry and reporting functionality.
+    
+    Repeats of a fault, identified by component, code and message with its
+    numbers masked, update one record instead of adding new ones while they
+    keep arriving within the dedup window. A record is queued for
+    processing again only once its earlier repeats were processed, and
+    repeats are logged as one summary line per rate window.
+    """
     
-    def __init__(self, max_errors=100):
+    def __init__(self, max_errors=100, dedup_window=None, rate_window=None):
         """
         Initialize the error handler.
         
         Args:
             max_errors (int): Maximum number of errors to store in history
+            dedup_window (float, optional): Seconds since the last repeat within which
+                                            a fault is aggregated, from ERROR_SETTINGS by default
+            rate_window (float, optional): Seconds per repeat rate window, from ERROR_SETTINGS by default
         """
         self.error_queue = Queue()
-        self.error_history = []
+        self.error_history = deque(maxlen=max_errors)
+        self.errors_by_id = {}
+        self.errors_by_fingerprint = {}
+        self.error_ids = itertools.count(1)
         self.max_errors = max_errors
+        self.dedup_window = dedup_window if dedup_window is not None else ERROR_SETTINGS['DEDUP_WINDOW_SEC']
+        self.rate_window = rate_window if rate_window is not None else ERROR_SETTINGS['RATE_WINDOW_SEC']
         self.error_lock = threading.Lock()
         
         # Start error processing thread
@@ -39,31 +179,62 @@ class ErrorHandler:
             error_message (str): Description of the error
             error_code (str, optional): Error code for categorization
             component (str, optional): Component where error occurred
-        """
-        # Log the error
-        if component:
-            logger.error(f"ERROR in {component}: {error_message}")
-        else:
-            logger.error(f"ERROR: {error_message}")
-        
-        # Create error record
-        error_record = {
-            'timestamp': time.time(),
-            'message': error_message,
-            'code': error_code,
-            'component': component,
-            'processed': False
-        }
         
-        # Add to error queue for processing
-        self.error_queue.put(error_record)
+        Returns:
+            int: Identifier of the record the error was counted in
+        """
+        now = time.time()
+        fingerprint = error_fingerprint(error_message, error_code, component)
+        log_message = None
+        enqueue = False
         
         # Add to history with thread safety
         with self.error_lock:
-            self.error_history.append(error_record)
-            # Trim history if too long
-            if len(self.error_history) > self.max_errors:
-                self.error_history = self.error_history[-self.max_errors:]
+            error_record = self.errors_by_fingerprint.get(fingerprint)
+            if error_record is not None and now - error_record.last_seen <= self.dedup_window:
+                error_record.repeat(error_message, now, self.rate_window)
+                error_record.suppressed += 1
+                
+                # Summarize suppressed repeats at most once per rate window
+                if now - error_record.last_logged >= self.rate_window:
+                    since = time.strftime('%H:%M:%S', time.localtime(error_record.last_logged))
+                    log_message = f"{error_message} (repeated {error_record.suppressed} times since {since})"
+                    error_record.last_logged = now
+                    error_record.suppressed = 0
+                
+                # Already waiting in the queue if not processed yet
+                if error_record.processed:
+                    error_record.processed = False
+                    enqueue = True
+            else:
+                error_record = ErrorRecord(next(self.error_ids), fingerprint, error_message,
+                                           error_code, component, now)
+                # The full deque drops its oldest record on append
+                if len(self.error_history) == self.max_errors:
+                    self._forget(self.error_history[0])
+                self.error_history.append(error_record)
+                self.errors_by_id[error_record.error_id] = error_record
+                self.errors_by_fingerprint[fingerprint] = error_record
+                log_message = error_message
+                enqueue = True
+        
+        # Log the error
+        if log_message is not None:
+            if component:
+                logger.error(f"ERROR in {component}: {log_message}")
+            else:
+                logger.error(f"ERROR: {log_message}")
+        
+        # Add to error queue for processing
+        if enqueue:
+            self.error_queue.put(error_record.error_id)
+        return error_record.error_id
+    
+    def _forget(self, error_record):
+        """Drop the indexes of a record leaving the history; call with error_lock held."""
+        del self.errors_by_id[error_record.error_id]
+        if self.errors_by_fingerprint.get(error_record.fingerprint) is error_record:
+            del self.errors_by_fingerprint[error_record.fingerprint]
     
     def _process_errors(self):
         """Background thread for processing errors from the queue."""
@@ -71,24 +242,19 @@ class ErrorHandler:
             try:
                 # Try to get an error with a timeout to allow clean shutdown
                 try:
-                    error = self.error_queue.get(timeout=1.0)
+                    error_id = self.error_queue.get(timeout=1.0)
                 except Empty:
                     continue
                 
-                # Mark as processed
-                error['processed'] = True
-                
-                # Update in history with thread safety
+                # Mark as processed unless it has already left the history
                 with self.error_lock:
-                    for i, hist_error in enumerate(self.error_history):
-                        if (hist_error['timestamp'] == error['timestamp'] and 
-                            hist_error['message'] == error['message']):
-                            self.error_history[i] = error
-                            break
+                    error = self.errors_by_id.get(error_id)
+                    if error is not None:
+                        error.processed = True
                 
                 # Signal task done
                 self.error_queue.task_done()
-                
+            
             except Exception as e:
                 logger.error(f"Error in error processing thread: {e}")
     
@@ -105,16 +271,29 @@ class ErrorHandler:
         else:
             logger.error(message)
     
-    def get_error_history(self):
+    def get_error_history(self, since_id=None):
         """
-        Get the history of errors.
+        Get the history of errors, one record per fault.
+        
+        Args:
+            since_id (int, optional): Only return faults first seen after this id
         
         Returns:
-            list: Copy of error history list
+            list: Error records as dicts, oldest first
         """
+        now = time.time()
         with self.error_lock:
-            # Return a copy to avoid threading issues
-            return list(self.error_history)
+            if since_id is None:
+                return [error.to_dict(now, self.rate_window) for error in self.error_history]
+            
+            # Ids increase along the deque, so walk back from the newest
+            newer = []
+            for error in reversed(self.error_history):
+                if error.error_id <= since_id:
+                    break
+                newer.append(error.to_dict(now, self.rate_window))
+            newer.reverse()
+            return newer
     
     def stop(self):
         """Stop the error processing thread."""
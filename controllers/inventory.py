@@ -0,0 +1,197 @@
+"""
+Consumables tracking for the kegs and the cup stack with depletion forecasts.
+"""
+import os
+import json
+import time
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+class InventoryTracker:
+    """
+    Counts down what is left in each keg and in the cup stack.
+    
+    Each pour's measured volume and each dispensed cup are subtracted as
+    they happen. The consumption rate is taken from the last rate window
+    of history and turned into a time-to-empty. Only refills are written
+    to the state file. On startup the levels are rebuilt from the refill
+    level minus everything consumed since the refill, taken from the
+    pour ledger, so counting down never costs a disk write.
+    """
+    
+    def __init__(self, capacities, units, rate_window, low_fraction, state_path, history=1000):
+        """
+        Initialize the tracker.
+        
+        Args:
+            capacities (dict): Maps each item ('beer', ..., 'cups') to its full amount
+            units (dict): Maps each item to the unit of its amount, e.g. 'ml' or 'cups'
+            rate_window (float): Seconds of history the consumption rate is taken from
+            low_fraction (float): Remaining fraction at which an item is reported low
+            state_path (str): JSON file holding the level of each item at its last refill
+            history (int): Consumption events kept per item for the rate
+        """
+        self.capacities = dict(capacities)
+        self.units = units
+        self.rate_window = rate_window
+        self.low_fraction = low_fraction
+        self.state_path = state_path
+        
+        now = time.time()
+        self.remaining = dict(self.capacities)
+        self.refill_levels = dict(self.capacities)
+        self.refilled_at = {item: now for item in self.capacities}
+        self.events = {item: deque(maxlen=history) for item in self.capacities}
+        self.low_warned = set()
+        self.history_since = now  # Start of the time the consumption history covers
+        self.lock = threading.Lock()
+    
+    def load(self):
+        """
+        Read the refill levels from the state file.
+        
+        Returns:
+            dict: Maps each item to the time of its last refill
+        """
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            logger.info(f"No inventory state at {self.state_path}, assuming everything is full")
+            self._save()
+            return dict(self.refilled_at)
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to read inventory state {self.state_path}: {e}")
+            return dict(self.refilled_at)
+        
+        with self.lock:
+            for item, entry in state.items():
+                if item in self.capacities:
+                    self.refill_levels[item] = self.remaining[item] = entry['level']
+                    self.refilled_at[item] = entry['timestamp']
+            return dict(self.refilled_at)
+    
+    def restore(self, events, since):
+        """
+        Replay consumption recorded elsewhere since the last refills.
+        
+        Args:
+            events (list): (timestamp, item, amount) tuples in time order
+            since (float): Start of the time the events cover
+        """
+        for timestamp, item, amount in events:
+            self.consume(item, amount, timestamp)
+        with self.lock:
+            self.history_since = min(self.history_since, since)
+    
+    def _save(self):
+        """Write the refill levels, replacing the file atomically."""
+        with self.lock:
+            state = {
+                item: {'level': self.refill_levels[item], 'timestamp': self.refilled_at[item]}
+                for item in self.capacities
+            }
+        
+        try:
+            directory = os.path.dirname(self.state_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            temp_path = self.state_path + '.tmp'
+            with open(temp_path, 'w') as f:
+                json.dump(state, f, indent=2)
+            os.replace(temp_path, self.state_path)
+        except OSError as e:
+            logger.error(f"Failed to save inventory state {self.state_path}: {e}")
+    
+    def consume(self, item, amount, timestamp=None):
+        """
+        Subtract consumption from an item.
+        
+        Args:
+            item (str): Beverage type or 'cups'
+            amount (float): Amount used, in the item's unit
+            timestamp (float, optional): Time of the consumption, defaults to now
+        """
+        if item not in self.capacities or not amount:
+            return
+        timestamp = timestamp if timestamp is not None else time.time()
+        
+        with self.lock:
+            self.events[item].append((timestamp, amount))
+            
+            # Consumption from before the last refill came out of the old keg
+            if timestamp < self.refilled_at[item]:
+                return
+            self.remaining[item] = max(self.remaining[item] - amount, 0)
+            low = self.remaining[item] <= self.capacities[item] * self.low_fraction
+            warn = low and item not in self.low_warned
+            if warn:
+                self.low_warned.add(item)
+        
+        if warn:
+            logger.warning(f"{item} is running low: {self.remaining[item]:.0f} {self.units[item]} left")
+    
+    def refill(self, item, level=None):
+        """
+        Record a keg swap or a restocked cup stack.
+        
+        Args:
+            item (str): Beverage type or 'cups'
+            level (float, optional): Amount now available, defaults to the full capacity
+        
+        Returns:
+            bool: True if the item is known, False otherwise
+        """
+        if item not in self.capacities:
+            logger.error(f"Unknown inventory item: {item}")
+            return False
+        
+        with self.lock:
+            level = self.capacities[item] if level is None else min(max(level, 0), self.capacities[item])
+            self.refill_levels[item] = self.remaining[item] = level
+            self.refilled_at[item] = time.time()
+            self.low_warned.discard(item)
+        
+        self._save()
+        logger.info(f"{item} refilled to {self.remaining[item]:.0f} {self.units[item]}")
+        return True
+    
+    def _rate(self, item, now):
+        """Consumption per second over the rate window."""
+        window_start = now - self.rate_window
+        used = sum(amount for timestamp, amount in self.events[item] if timestamp >= window_start)
+        
+        # Before a full window of history exists, average over what there is
+        observed_since = max(window_start, self.history_since)
+        return used / max(now - observed_since, 60.0)
+    
+    def get_forecast(self):
+        """
+        Get the remaining amount and time-to-empty of every item.
+        
+        Returns:
+            dict: Maps each item to its remaining amount, rate per hour and the
+                  seconds and time until it runs out (None while nothing is used)
+        """
+        now = time.time()
+        forecast = {}
+        with self.lock:
+            for item, capacity in self.capacities.items():
+                remaining = self.remaining[item]
+                rate = self._rate(item, now)
+                seconds_left = remaining / rate if rate > 0 else None
+                forecast[item] = {
+                    'remaining': round(remaining, 1),
+                    'capacity': capacity,
+                    'unit': self.units[item],
+                    'fraction': round(remaining / capacity, 3),
+                    'rate_per_hour': round(rate * 3600, 1),
+                    'seconds_to_empty': round(seconds_left) if seconds_left is not None else None,
+                    'empty_at': now + seconds_left if seconds_left is not None else None,
+                    'low': remaining <= capacity * self.low_fraction,
+                    'refilled_at': self.refilled_at[item]
+                }
+        return forecast
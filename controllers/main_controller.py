@@ -4,9 +4,25 @@ Main controller module that coordinates all system components.
 import time
 import logging
 import threading
+from concurrent.futures import CancelledError
 from hardware import CupDispenser, BeerDispenser, CupDelivery, SystemMonitor
 from controllers.error_handler import ErrorHandler
-from config import SYSTEM_STATES, BEVERAGE_POUR_SETTINGS, BEVERAGE_TYPES
+from controllers.dispense_pipeline import DispensePipeline, PIPELINE_STAGES
+from controllers.dispense_engine import AsyncDispenseEngine
+from controllers.order_queue import OrderQueue
+from controllers.pour_ledger import PourLedger
+from controllers.inventory import InventoryTracker
+from controllers.retry_policy import RetryPolicy, CircuitBreaker, RetryExecutor
+from config import (
+    SYSTEM_STATES,
+    BEVERAGE_POUR_SETTINGS,
+    BEVERAGE_TYPES,
+    PIPELINE_SETTINGS,
+    CUP_SETTINGS,
+    LEDGER_SETTINGS,
+    INVENTORY_SETTINGS,
+    ERROR_SETTINGS
+)
 
 logger = logging.getLogger(__name__)
 
@@ -21,14 +37,90 @@ class MainController:
         self.cup_delivery = CupDelivery()
         self.system_monitor = SystemMonitor()
         
+        # The monitor's scale also weighs cups for taps that pour by weight
+        self.beer_dispenser.set_weight_sensor(self.system_monitor.weight_sensor)
+        
+        # React to sensor changes as they are published instead of polling
+        self.sensor_bus = self.system_monitor.sensor_bus
+        self.beer_dispenser.set_sensor_bus(self.sensor_bus)
+        self.cup_dispenser.set_sensor_bus(self.sensor_bus)
+        if hasattr(self.cup_delivery, 'set_sensor_bus'):
+            self.cup_delivery.set_sensor_bus(self.sensor_bus)
+        
+        # Cups seen arriving at the pour position, so each pour gets a fresh one
+        self.position_condition = threading.Condition()
+        self.cup_present = False
+        self.cup_arrivals = 0
+        self.poured_arrival = 0
+        self.position_job = None  # Job poured into the cup at the pour position
+        self.sensor_bus.subscribe('cup_present', self._on_cup_presence)
+        
         # Initialize error handler
         self.error_handler = ErrorHandler()
         
+        # Each stage retries its hardware under a policy and fails fast while
+        # the component keeps failing. Every stage has its own executor, so
+        # retries never overlap on one component but stages still do.
+        self.retry_policies = {
+            stage: RetryPolicy(
+                max_attempts=ERROR_SETTINGS['MAX_RETRIES'],
+                base_delay=ERROR_SETTINGS['RETRY_DELAY_SEC'],
+                max_delay=ERROR_SETTINGS['MAX_RETRY_DELAY_SEC'],
+                jitter=ERROR_SETTINGS['RETRY_JITTER'],
+                budget=ERROR_SETTINGS['STAGE_BUDGET_SEC'][stage]
+            )
+            for stage in PIPELINE_STAGES
+        }
+        self.breakers = {
+            stage: CircuitBreaker(
+                stage,
+                failure_threshold=ERROR_SETTINGS['BREAKER_FAILURES'],
+                reset_timeout=ERROR_SETTINGS['BREAKER_RESET_SEC']
+            )
+            for stage in PIPELINE_STAGES
+        }
+        self.retry_executors = {stage: RetryExecutor() for stage in PIPELINE_STAGES}
+        self.stage_attempts = {}  # Stage -> Future of the attempts in progress
+        self.attempts_lock = threading.Lock()
+        
         # System state
         self.current_state = SYSTEM_STATES['IDLE']
         self.state_lock = threading.Lock()
         self.operation_thread = None
         
+        # Orders from every kiosk are queued as one dispense job per cup
+        self.order_queue = OrderQueue()
+        self.order_worker_running = False
+        
+        # Dispense jobs, optionally overlapped across the stages of a pipeline
+        self.pipeline_enabled = PIPELINE_SETTINGS['ENABLED']
+        stage_handlers = {
+            'cup': self._cup_stage,
+            'pour': self._pour_stage,
+            'deliver': self._deliver_stage
+        }
+        if PIPELINE_SETTINGS['ENGINE'] == 'asyncio':
+            # Stages can be cancelled mid-flight by stop_operation
+            self.pipeline = AsyncDispenseEngine(
+                stage_handlers,
+                job_source=self._next_job,
+                on_stage_change=self._update_pipeline_state,
+                on_job_finished=self._on_job_finished,
+                stage_timeouts=PIPELINE_SETTINGS['STAGE_TIMEOUT_SEC'],
+                stage_aborts={
+                    'cup': lambda: self._abort_stage('cup', self.cup_dispenser.abort_dispense),
+                    'pour': lambda: self._abort_stage('pour', self.beer_dispenser.stop_pour),
+                    'deliver': lambda: self._abort_stage('deliver', self.cup_delivery.stop_conveyor)
+                }
+            )
+        else:
+            self.pipeline = DispensePipeline(
+                stage_handlers,
+                job_source=self._next_job,
+                on_stage_change=self._update_pipeline_state,
+                on_job_finished=self._on_job_finished
+            )
+        
         # Statistics
         self.stats = {
             'cups_dispensed': 0,
@@ -38,6 +130,27 @@ class MainController:
             'last_operation_time': 0
         }
         self.stats_lock = threading.Lock()
+        
+        # Every finished job is persisted off the dispense threads
+        self.pour_ledger = PourLedger(
+            LEDGER_SETTINGS['DB_PATH'],
+            batch_size=LEDGER_SETTINGS['BATCH_SIZE'],
+            flush_interval=LEDGER_SETTINGS['FLUSH_INTERVAL_SEC'],
+            max_buffered=LEDGER_SETTINGS['MAX_BUFFERED']
+        )
+        
+        # What is left in each keg and in the cup stack
+        capacities = dict(INVENTORY_SETTINGS['KEG_VOLUME_ML'])
+        capacities['cups'] = INVENTORY_SETTINGS['CUP_STACK_SIZE']
+        units = {item: 'ml' for item in INVENTORY_SETTINGS['KEG_VOLUME_ML']}
+        units['cups'] = 'cups'
+        self.inventory = InventoryTracker(
+            capacities,
+            units,
+            rate_window=INVENTORY_SETTINGS['RATE_WINDOW_SEC'],
+            low_fraction=INVENTORY_SETTINGS['LOW_LEVEL_FRACTION'],
+            state_path=INVENTORY_SETTINGS['STATE_PATH']
+        )
     
     def initialize_system(self):
         """
@@ -67,6 +180,29 @@ class MainController:
                 logger.error("System monitoring initialization failed")
                 return False
             
+            # Carry the statistics over from previous runs; dispensing works without the ledger
+            refilled_at = self.inventory.load()
+            if self.pour_ledger.start():
+                with self.stats_lock:
+                    self.stats.update(self.pour_ledger.get_totals())
+                self._restore_inventory(refilled_at)
+            else:
+                logger.warning("Pour ledger unavailable, pours will not be persisted")
+            
+            for executor in self.retry_executors.values():
+                executor.start()
+            
+            # Start consuming the order queue
+            if self.pipeline_enabled:
+                self.pipeline.start()
+            else:
+                self.order_worker_running = True
+                self.operation_thread = threading.Thread(
+                    target=self._order_worker,
+                    daemon=True
+                )
+                self.operation_thread.start()
+            
             logger.info("System initialization complete")
             return True
             
@@ -74,6 +210,23 @@ class MainController:
             logger.error(f"System initialization error: {e}")
             return False
     
+    def _restore_inventory(self, refilled_at):
+        """
+        Count the pours written since the last refills against the inventory.
+        
+        Args:
+            refilled_at (dict): Maps each inventory item to the time of its last refill
+        """
+        since = min(min(refilled_at.values()), time.time() - INVENTORY_SETTINGS['RATE_WINDOW_SEC'])
+        events = []
+        for completed_at, beverage_type, volume_ml, used_cup in self.pour_ledger.get_consumption(since):
+            if used_cup:
+                events.append((completed_at, 'cups', 1))
+            if volume_ml:
+                events.append((completed_at, beverage_type or 'beer', volume_ml))
+        self.inventory.restore(events, since)
+        logger.info(f"Inventory restored from {len(events)} ledger entries")
+    
     def get_system_state(self):
         """
         Get the current state of the system.
@@ -98,9 +251,17 @@ class MainController:
         # Combine all information
         state_info = {
             'state': state,
+            'stages': self.pipeline.get_stage_states(),
+            'pending_jobs': self.order_queue.pending_count(),
             'stats': stats_copy,
             'sensors': sensor_data,
             'beer_temp': self.beer_dispenser.get_beer_temperature(),
+            'temperatures': self.beer_dispenser.get_temperature_readings(),
+            'pour_volumes': self.beer_dispenser.get_volume_estimates(),
+            'cup_drops': self.cup_dispenser.get_drop_stats(),
+            'breakers': {stage: breaker.get_state() for stage, breaker in self.breakers.items()},
+            'ledger': self.pour_ledger.get_stats(),
+            'inventory': self.inventory.get_forecast(),
             'current_beverage': current_beverage or 'beer'
         }
         
@@ -121,79 +282,430 @@ class MainController:
     
     def dispense_beer(self, volume_ml=None, beverage_type=None):
         """
-        Start the beverage dispensing sequence in a separate thread.
+        Queue a single beverage for dispensing.
         
         Args:
             volume_ml (float, optional): Volume to pour in milliliters.
             beverage_type (str, optional): Type of beverage to pour ('beer', 'kofola', or 'birel').
         
         Returns:
-            bool: True if operation started successfully, False otherwise
+            bool: True if the beverage was queued, False otherwise
+        """
+        item = {'beverage': beverage_type or 'beer', 'size': volume_ml}
+        try:
+            return self.submit_order([item]) is not None
+        except ValueError as e:
+            logger.warning(f"Rejected dispense request: {e}")
+            return False
+    
+    def submit_order(self, order_items):
+        """
+        Queue an order, turning each item into a dispense job.
+        
+        Args:
+            order_items (list): Items with 'beverage' and optional 'size' in ml
+        
+        Returns:
+            Order: The queued order, or None if it cannot be accepted now
+        
+        Raises:
+            ValueError: If the order is empty or an item is malformed
         """
-        # Check if system is already in operation
         with self.state_lock:
-            if self.current_state != SYSTEM_STATES['IDLE']:
-                logger.warning(f"Cannot start operation while in {self.current_state} state")
-                return False
+            if self.current_state in [SYSTEM_STATES['MAINTENANCE'], SYSTEM_STATES['ERROR']]:
+                logger.warning(f"Cannot queue order while in {self.current_state} state")
+                return None
         
-        # Start operation in a separate thread
-        self.operation_thread = threading.Thread(
-            target=self._dispense_sequence,
-            args=(volume_ml, beverage_type),
-            daemon=True
-        )
-        self.operation_thread.start()
-        return True
+        return self.order_queue.submit(order_items)
     
-    def _dispense_sequence(self, volume_ml=None, beverage_type=None):
+    def get_order_status(self, order_id):
+        """
+        Get the progress of an order and each of its items.
+        
+        Args:
+            order_id (str): Order identifier
+        
+        Returns:
+            dict: Order status, or None if the order is unknown
+        """
+        order = self.order_queue.get_order(order_id)
+        if order is None:
+            return None
+        
+        status = order.get_status()
+        status['queue_position'] = self.order_queue.queue_position(order_id)
+        return status
+    
+    def get_inventory(self):
+        """
+        Get the remaining consumables and when each runs out.
+        
+        Returns:
+            dict: Maps each keg's beverage type and 'cups' to its forecast
+        """
+        return self.inventory.get_forecast()
+    
+    def refill_inventory(self, item, level=None):
+        """
+        Record a keg swap or a restocked cup stack.
+        
+        Args:
+            item (str): Beverage type or 'cups'
+            level (float, optional): Amount now available, defaults to full
+        
+        Returns:
+            bool: True if the refill was recorded, False otherwise
+        """
+        return self.inventory.refill(item, level)
+    
+    def get_recent_pours(self, limit=50):
+        """
+        Get the newest pours from the ledger.
+        
+        Args:
+            limit (int): Maximum number of pours
+        
+        Returns:
+            list: Pour records, newest first; pours still buffered are not included
+        """
+        return self.pour_ledger.get_recent(limit)
+    
+    def get_sensor_history(self, channel, resolution='raw', since=None):
+        """
+        Get the recorded history of a sensor channel.
+        
+        Args:
+            channel (str): Sensor bus channel
+            resolution (str): 'raw', '1s', '1m' or '1h'
+            since (float, optional): Only data at or after this time
+        
+        Returns:
+            dict: Parallel lists of the samples or min/max/mean buckets
+        
+        Raises:
+            ValueError: If the channel or resolution is unknown
+        """
+        return self.system_monitor.get_sensor_history(channel, resolution, since)
+    
+    def _next_job(self, timeout):
+        """
+        Take the next queued job unless the system is halted.
+        
+        Args:
+            timeout (float): Maximum time to wait in seconds
+        
+        Returns:
+            DispenseJob: Next job, or None if there is nothing to run
+        """
+        with self.state_lock:
+            halted = self.current_state in [SYSTEM_STATES['MAINTENANCE'], SYSTEM_STATES['ERROR']]
+        
+        if halted:
+            time.sleep(timeout)
+            return None
+        return self.order_queue.next_job(timeout)
+    
+    def _order_worker(self):
+        """Background thread running queued jobs one at a time when not pipelined."""
+        while self.order_worker_running:
+            job = self._next_job(0.5)
+            if job is not None:
+                self._dispense_sequence(job)
+    
+    def _cup_stage(self, job):
+        """
+        Dispense a cup for a job.
+        
+        Args:
+            job (DispenseJob): Job being dispensed
+        
+        Raises:
+            Exception: If the cup could not be dispensed
+        """
+        self._run_with_retry('cup', "Cup dispensing", self.cup_dispenser.dispense_cup)
+        
+        self.inventory.consume('cups', 1)
+        
+        # Update statistics
+        with self.stats_lock:
+            self.stats['cups_dispensed'] += 1
+    
+    def _pour_stage(self, job):
+        """
+        Pour the beverage for a job.
+        
+        Args:
+            job (DispenseJob): Job being dispensed
+        
+        Raises:
+            Exception: If the beverage could not be poured
+        """
+        current_beverage_type = job.beverage_type or 'beer'
+        
+        # When pipelined, the previous cup may only just be leaving
+        self._wait_for_fresh_cup(job)
+        self._run_with_retry('pour', f"{BEVERAGE_POUR_SETTINGS[current_beverage_type]['NAME']} pouring",
+                             lambda: self.beer_dispenser.pour_beer(job.volume_ml, job.beverage_type))
+        
+        # Record what the tap measured in the cup
+        estimate = self.beer_dispenser.get_volume_estimates().get(current_beverage_type)
+        if estimate:
+            job.measured_volume_ml = estimate['volume_ml']
+        
+        # Update statistics
+        actual_volume = job.volume_ml if job.volume_ml is not None else BEVERAGE_POUR_SETTINGS[current_beverage_type]['DEFAULT_VOLUME_ML']
+        
+        with self.stats_lock:
+            self.stats['beers_poured'] += 1
+            self.stats['total_volume_ml'] += actual_volume
+        
+        poured = job.measured_volume_ml if job.measured_volume_ml is not None else actual_volume
+        self.inventory.consume(current_beverage_type, poured)
+    
+    def _deliver_stage(self, job):
+        """
+        Deliver the filled cup for a job.
+        
+        Args:
+            job (DispenseJob): Job being dispensed
+        
+        Raises:
+            Exception: If the cup could not be delivered
+        """
+        self._run_with_retry('deliver', "Cup delivery", self.cup_delivery.deliver_cup)
+    
+    def _run_with_retry(self, stage, description, operation):
+        """
+        Run a stage's hardware operation under the stage's retry policy and breaker.
+        
+        Args:
+            stage (str): 'cup', 'pour' or 'deliver'
+            description (str): Operation name used in messages
+            operation (callable): Operation returning True on success
+        
+        Raises:
+            Exception: If the operation did not succeed or was stopped
+        """
+        policy = self.retry_policies[stage]
+        
+        def on_retry(attempt, delay):
+            self.error_handler.log_error(
+                f"{description} failed, retrying in {delay:.1f}s... (attempt {attempt}/{policy.max_attempts})")
+        
+        future = self.retry_executors[stage].submit(operation, policy, self.breakers[stage],
+                                                    name=description, on_retry=on_retry)
+        with self.attempts_lock:
+            self.stage_attempts[stage] = future
+        try:
+            outcome = future.result()
+        except CancelledError:
+            raise Exception(f"{description} stopped")
+        finally:
+            with self.attempts_lock:
+                if self.stage_attempts.get(stage) is future:
+                    del self.stage_attempts[stage]
+        
+        if outcome.success:
+            return
+        if outcome.reason == 'circuit_open':
+            raise Exception(f"{description} skipped, component failing repeatedly")
+        if outcome.reason == 'budget':
+            raise Exception(f"{description} failed, retry time budget exhausted after {outcome.attempts} attempts")
+        raise Exception(f"{description} failed after {outcome.attempts} attempts")
+    
+    def _cancel_retries(self, stage=None):
+        """
+        Stop retrying the operations of a stage, or of every stage.
+        
+        Args:
+            stage (str, optional): Stage to stop, every stage if None
+        """
+        with self.attempts_lock:
+            futures = [future for name, future in self.stage_attempts.items() if stage in (None, name)]
+        for future in futures:
+            future.cancel()
+    
+    def _abort_stage(self, stage, abort):
+        """
+        Stop a stage that timed out or was cancelled by the dispense engine.
+        
+        Args:
+            stage (str): Stage to stop
+            abort (callable): Stops the stage's hardware
+        """
+        # No retry may start once the hardware has been stopped
+        self._cancel_retries(stage)
+        abort()
+    
+    def _wait_for_fresh_cup(self, job):
+        """
+        Wait until a cup not poured into yet is at the pour position.
+        
+        The position must have been seen clear and then occupied again
+        since the last pour, so a tap never starts on the previous cup
+        and taps pouring by weight tare the scale under the new one.
+        
+        Args:
+            job (DispenseJob): Job about to pour into the cup
+        
+        Raises:
+            Exception: If no new cup arrives within DETECTION_TIMEOUT_SEC
+        """
+        with self.position_condition:
+            fresh = self.position_condition.wait_for(
+                lambda: self.cup_present and self.cup_arrivals > self.poured_arrival,
+                CUP_SETTINGS['DETECTION_TIMEOUT_SEC']
+            )
+            if not fresh:
+                raise Exception("No new cup at the pour position")
+            self.poured_arrival = self.cup_arrivals
+            self.position_job = job
+    
+    def _remove_abandoned_cup(self, job):
+        """
+        Clear the pour position of the cup of a job that did not complete.
+        
+        The cup dispenser only moves a cup in once the position is clear,
+        so a cup left behind by a failed or stopped job blocks every later
+        one until it is taken away.
+        
+        Args:
+            job (DispenseJob): Finished job
+        """
+        if job.status == 'completed' or job.stage is None:
+            return
+        
+        with self.position_condition:
+            if not self.cup_present:
+                return
+            if self.position_job is not None:
+                # A cup that has been poured into is the job's own until it leaves
+                abandoned = self.position_job is job
+            else:
+                # An unpoured cup is the failed pour's, or any stopped job's
+                abandoned = job.stage == 'pour' or job.status == 'cancelled'
+        if not abandoned:
+            return
+        
+        if hasattr(self.cup_delivery, 'clear_pour_position'):
+            self.cup_delivery.clear_pour_position()
+        else:
+            logger.warning(f"Cup of job {job.job_id} left at the pour position, remove it to continue")
+    
+    def _on_cup_presence(self, channel, present, timestamp):
+        """
+        Count cups arriving at the pour position and stop pouring as soon
+        as the cup leaves it.
+        
+        Args:
+            channel (str): Sensor bus channel ('cup_present')
+            present (bool): Whether a cup is at the pour position
+            timestamp (float): Time of the reading
+        """
+        with self.position_condition:
+            if present and not self.cup_present:
+                self.cup_arrivals += 1
+            self.cup_present = present
+            if not present:
+                self.position_job = None
+            self.position_condition.notify_all()
+        
+        if not present and self.beer_dispenser.pouring:
+            logger.warning("Cup removed during pour, closing valves")
+            self.beer_dispenser.stop_pour()
+    
+    def _update_pipeline_state(self):
+        """Derive the legacy system state from the busiest pipeline stage."""
+        stages = self.pipeline.get_stage_states()
+        
+        if stages['pour']:
+            new_state = SYSTEM_STATES['POURING_BEER']
+        elif stages['cup']:
+            new_state = SYSTEM_STATES['DISPENSING_CUP']
+        elif stages['deliver']:
+            new_state = SYSTEM_STATES['DELIVERING_CUP']
+        else:
+            new_state = SYSTEM_STATES['IDLE']
+        
+        with self.state_lock:
+            if self.current_state in [SYSTEM_STATES['MAINTENANCE'], SYSTEM_STATES['ERROR']]:
+                return
+            if self.current_state == new_state:
+                return
+        
+        self._set_state(new_state)
+    
+    def _record_pour(self, job):
+        """
+        Add a finished job to the pour ledger.
+        
+        Args:
+            job (DispenseJob): Finished job
+        """
+        beverage_type = job.beverage_type or 'beer'
+        target = job.volume_ml if job.volume_ml is not None else BEVERAGE_POUR_SETTINGS[beverage_type]['DEFAULT_VOLUME_ML']
+        self.pour_ledger.record(job, target, job.measured_volume_ml)
+    
+    def _on_job_finished(self, job):
+        """
+        Record the outcome of a job leaving the pipeline.
+        
+        Args:
+            job (DispenseJob): Finished job
+        """
+        self._record_pour(job)
+        self._remove_abandoned_cup(job)
+        
+        if job.status == 'failed':
+            self.error_handler.handle_error(job.error, component=f"{job.stage}_stage")
+            with self.stats_lock:
+                self.stats['errors'] += 1
+        
+        operation_time = (job.completed_at or time.time()) - job.created_at
+        with self.stats_lock:
+            self.stats['last_operation_time'] = int(operation_time)
+        
+        logger.info(f"Job {job.job_id} {job.status} in {operation_time:.2f}s")
+    
+    def _dispense_sequence(self, job):
         """
         Execute the complete beverage dispensing sequence.
         
         Args:
-            volume_ml (float, optional): Volume to pour in milliliters.
-            beverage_type (str, optional): Type of beverage to pour ('beer', 'kofola', or 'birel').
+            job (DispenseJob): Job to run through every stage in turn
         """
         start_time = time.time()
         success = False
+        stage_states = {
+            'cup': SYSTEM_STATES['DISPENSING_CUP'],
+            'pour': SYSTEM_STATES['POURING_BEER'],  # 'POURING_BEER' is mapped to 'pouring_beverage' in config
+            'deliver': SYSTEM_STATES['DELIVERING_CUP']
+        }
+        handlers = {
+            'cup': self._cup_stage,
+            'pour': self._pour_stage,
+            'deliver': self._deliver_stage
+        }
         
         # If beverage type is provided, set it in the beer dispenser
-        if beverage_type and hasattr(self.beer_dispenser, 'set_beverage_type'):
-            self.beer_dispenser.set_beverage_type(beverage_type)
+        if job.beverage_type and hasattr(self.beer_dispenser, 'set_beverage_type'):
+            self.beer_dispenser.set_beverage_type(job.beverage_type)
         
         try:
-            # 1. Dispense cup
-            self._set_state(SYSTEM_STATES['DISPENSING_CUP'])
-            if not self.cup_dispenser.dispense_cup():
-                raise Exception("Cup dispensing failed")
-            
-            # Update statistics
-            with self.stats_lock:
-                self.stats['cups_dispensed'] += 1
-            
-            # 2. Pour beverage
-            self._set_state(SYSTEM_STATES['POURING_BEER'])  # 'POURING_BEER' is mapped to 'pouring_beverage' in config
-            if not self.beer_dispenser.pour_beer(volume_ml, beverage_type):
-                current_beverage_type = beverage_type or 'beer'
-                raise Exception(f"{BEVERAGE_POUR_SETTINGS[current_beverage_type]['NAME']} pouring failed")
-            
-            # Update statistics
-            current_beverage_type = beverage_type or 'beer'
-            actual_volume = volume_ml if volume_ml is not None else BEVERAGE_POUR_SETTINGS[current_beverage_type]['DEFAULT_VOLUME_ML']
-            
-            with self.stats_lock:
-                self.stats['beers_poured'] += 1
-                self.stats['total_volume_ml'] += actual_volume
-            
-            # 3. Deliver cup
-            self._set_state(SYSTEM_STATES['DELIVERING_CUP'])
-            if not self.cup_delivery.deliver_cup():
-                raise Exception("Cup delivery failed")
+            # Dispense cup, pour beverage and deliver cup
+            for stage in PIPELINE_STAGES:
+                self._set_state(stage_states[stage])
+                job.start_stage(stage)
+                handlers[stage](job)
+                job.finish_stage(stage)
             
             # Sequence completed successfully
+            job.finish('completed')
             success = True
             
         except Exception as e:
             logger.error(f"Error in dispensing sequence: {e}")
+            job.finish('failed', str(e))
             self._set_state(SYSTEM_STATES['ERROR'])
             
             # Handle the error
@@ -208,6 +720,9 @@ class MainController:
             if self.current_state != SYSTEM_STATES['ERROR']:
                 self._set_state(SYSTEM_STATES['IDLE'])
             
+            self._record_pour(job)
+            self._remove_abandoned_cup(job)
+            
             # Update operation time
             operation_time = time.time() - start_time
             with self.stats_lock:
@@ -225,6 +740,24 @@ class MainController:
         try:
             logger.warning("Emergency stop triggered")
             
+            # Drop cups that have not been started yet, so freed stages find no work
+            cancelled = self.order_queue.cancel_pending()
+            if cancelled:
+                logger.warning(f"Cancelled {len(cancelled)} queued jobs")
+            
+            # Cancel stages in flight so their jobs do not move on to the next stage;
+            # first, so their jobs are reported cancelled rather than failed
+            if hasattr(self.pipeline, 'cancel_all'):
+                stopped = self.pipeline.cancel_all()
+                if stopped:
+                    logger.warning(f"Cancelled {stopped} dispense stages in progress")
+            
+            # Running operations fail once their hardware stops; do not retry them
+            self._cancel_retries()
+            
+            # Stop cup dispensing
+            self.cup_dispenser.abort_dispense()
+            
             # Stop beer dispensing
             self.beer_dispenser.stop_pour()
             
@@ -282,8 +815,13 @@ class MainController:
             # Stop any ongoing operations
             self.stop_operation()
             
-            # Stop monitoring
+            # Stop consuming orders, then stop monitoring
+            self.order_worker_running = False
+            self.pipeline.stop()
+            for executor in self.retry_executors.values():
+                executor.stop()
             self.system_monitor.stop_monitoring()
+            self.pour_ledger.stop()
             
             # Clean up hardware resources
             self.cup_dispenser.cleanup()
@@ -0,0 +1,289 @@
+"""
+Order queue that turns customer orders into dispense jobs.
+"""
+import time
+import uuid
+import logging
+import itertools
+import threading
+from collections import OrderedDict, deque
+from controllers.dispense_pipeline import DispenseJob
+from controllers.scheduler import create_scheduler
+from config import BEVERAGE_TYPES, ORDER_SETTINGS
+
+logger = logging.getLogger(__name__)
+
+# Progress reported for a job in each stage (percent)
+STAGE_PROGRESS = {
+    'cup': 25,
+    'pour': 50,
+    'deliver': 85
+}
+
+# Order status reported to the customer UI for each stage
+STAGE_STATUS = {
+    'cup': 'dispensing_cup',
+    'pour': 'pouring',
+    'deliver': 'delivering'
+}
+
+class Order:
+    """A customer order made of one or more cups."""
+    
+    def __init__(self, order_id, items, jobs):
+        """
+        Initialize the order.
+        
+        Args:
+            order_id (str): Unique order identifier
+            items (list): Order items as submitted by the client
+            jobs (list): One DispenseJob per item, in the same order
+        """
+        self.order_id = order_id
+        self.items = items
+        self.jobs = jobs
+        self.created_at = time.time()
+    
+    def is_finished(self):
+        """
+        Check whether every item has left the dispenser.
+        
+        Returns:
+            bool: True if no job is queued or running
+        """
+        return all(job.status not in ['queued', 'running'] for job in self.jobs)
+    
+    def get_status(self):
+        """
+        Get the progress of the order and each of its items.
+        
+        Returns:
+            dict: Order status in the format used by /api/dispensing_status
+        """
+        item_status = []
+        for item, job in zip(self.items, self.jobs):
+            if job.status == 'completed':
+                progress = 100
+            elif job.status == 'running':
+                progress = STAGE_PROGRESS.get(job.stage, 0)
+            else:
+                progress = 0
+            item_status.append({
+                'item': item,
+                'job_id': job.job_id,
+                'status': job.status,
+                'stage': job.stage,
+                'progress': progress,
+                'error': job.error
+            })
+        
+        total_items = len(self.jobs)
+        progress = int(sum(entry['progress'] for entry in item_status) / total_items)
+        failed = [entry for entry in item_status if entry['status'] in ['failed', 'cancelled']]
+        running = [entry for entry in item_status if entry['status'] == 'running']
+        done = sum(1 for entry in item_status if entry['status'] not in ['queued', 'running'])
+        
+        if failed and self.is_finished():
+            status = 'error'
+            message = failed[0]['error']
+        elif self.is_finished():
+            status = 'complete'
+            progress = 100
+            message = f"Processed {total_items} of {total_items}"
+        elif running:
+            status = STAGE_STATUS.get(running[-1]['stage'], 'preparing')
+            message = f"Processing {done + 1} of {total_items}"
+        else:
+            status = 'preparing'
+            message = f"Waiting to start {total_items} items"
+        
+        current = running[-1] if running else None
+        return {
+            'order_id': self.order_id,
+            'status': status,
+            'progress': progress,
+            'message': message,
+            'current_item': current['item'] if current else None,
+            'order_items': self.items,
+            'items': item_status
+        }
+
+
+class OrderQueue:
+    """Holds pending dispense jobs from many orders until a stage takes them."""
+    
+    def __init__(self, max_pending_jobs=None, history_size=None, scheduler=None):
+        """
+        Initialize the order queue.
+        
+        Args:
+            max_pending_jobs (int, optional): Maximum number of cups waiting to be dispensed
+            history_size (int, optional): Number of orders kept for status lookups
+            scheduler (object, optional): Policy choosing the next job; defaults to ORDER_SETTINGS
+        """
+        self.max_pending_jobs = max_pending_jobs or ORDER_SETTINGS['MAX_PENDING_JOBS']
+        self.history_size = history_size or ORDER_SETTINGS['ORDER_HISTORY_SIZE']
+        self.orders = OrderedDict()
+        self.pending = deque()
+        self.job_ids = itertools.count(1)
+        self.scheduler = scheduler or create_scheduler()
+        self.last_beverage = None
+        self.condition = threading.Condition()
+    
+    def _parse_item(self, item):
+        """
+        Validate an order item and get its dispense parameters.
+        
+        Args:
+            item (dict): Order item with 'beverage' and optional 'size' in ml
+        
+        Returns:
+            tuple: (beverage_type, volume_ml)
+        
+        Raises:
+            ValueError: If the item is malformed
+        """
+        if not isinstance(item, dict):
+            raise ValueError("Order item must be an object")
+        
+        beverage = item.get('beverage')
+        if beverage not in BEVERAGE_TYPES:
+            raise ValueError(f"Unknown beverage: {beverage}")
+        
+        size = item.get('size')
+        if size is None:
+            return beverage, None
+        
+        try:
+            volume = float(size)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid size: {size}")
+        if volume <= 0:
+            raise ValueError(f"Invalid size: {size}")
+        return beverage, volume
+    
+    def submit(self, items):
+        """
+        Queue an order with one dispense job per item.
+        
+        Args:
+            items (list): Order items with 'beverage' and optional 'size' in ml
+        
+        Returns:
+            Order: The queued order, or None if the queue has no room for it
+        
+        Raises:
+            ValueError: If the order is empty or an item is malformed
+        """
+        if not items:
+            raise ValueError("No items in order")
+        
+        parsed = [self._parse_item(item) for item in items]
+        
+        with self.condition:
+            if len(self.pending) + len(parsed) > self.max_pending_jobs:
+                logger.warning(f"Order queue full, rejecting order of {len(parsed)} items")
+                return None
+            
+            jobs = [
+                DispenseJob(next(self.job_ids), volume, beverage)
+                for beverage, volume in parsed
+            ]
+            order = Order(uuid.uuid4().hex[:12], list(items), jobs)
+            for job in jobs:
+                job.order_id = order.order_id
+            
+            self.orders[order.order_id] = order
+            self._trim_history()
+            self.pending.extend(jobs)
+            self.condition.notify_all()
+        
+        logger.info(f"Queued order {order.order_id} with {len(jobs)} items")
+        return order
+    
+    def _trim_history(self):
+        """Forget the oldest finished orders; must be called with the condition held."""
+        while len(self.orders) > self.history_size:
+            oldest_id, oldest = next(iter(self.orders.items()))
+            if not oldest.is_finished():
+                break
+            del self.orders[oldest_id]
+    
+    def next_job(self, timeout=None):
+        """
+        Take the next job to dispense, waiting for one if necessary.
+        
+        Args:
+            timeout (float, optional): Maximum time to wait in seconds
+        
+        Returns:
+            DispenseJob: Next job, or None if none arrived in time
+        """
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.pending, timeout=timeout):
+                return None
+            
+            index = self.scheduler.select(self.pending, self.last_beverage)
+            job = self.pending[index]
+            del self.pending[index]
+            self.last_beverage = job.beverage_type
+            return job
+    
+    def cancel_pending(self):
+        """
+        Cancel every job that has not been started.
+        
+        Returns:
+            list: Cancelled jobs
+        """
+        with self.condition:
+            cancelled = list(self.pending)
+            self.pending.clear()
+            self.scheduler.reset()
+        
+        for job in cancelled:
+            job.finish('cancelled', "Cancelled before dispensing")
+        return cancelled
+    
+    def pending_count(self):
+        """
+        Get the number of jobs waiting to be dispensed.
+        
+        Returns:
+            int: Number of pending jobs
+        """
+        with self.condition:
+            return len(self.pending)
+    
+    def queue_position(self, order_id):
+        """
+        Get how many jobs are queued ahead of an order.
+        
+        The grouping scheduler may still let a cup of the beverage being
+        poured overtake the order within its fairness window.
+        
+        Args:
+            order_id (str): Order identifier
+        
+        Returns:
+            int: Pending jobs ahead of the order's first pending job, 0 if it
+                 is next, or None if none of its jobs is pending
+        """
+        with self.condition:
+            for index, job in enumerate(self.pending):
+                if job.order_id == order_id:
+                    return index
+            return None
+    
+    def get_order(self, order_id):
+        """
+        Look up an order.
+        
+        Args:
+            order_id (str): Order identifier
+        
+        Returns:
+            Order: The order, or None if unknown
+        """
+        with self.condition:
+            return self.orders.get(order_id)
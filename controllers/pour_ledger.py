@@ -0,0 +1,257 @@
+"""
+Append-only pour ledger persisted to SQLite in batches.
+"""
+import os
+import queue
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pours (
+    id INTEGER PRIMARY KEY,
+    job_id INTEGER,
+    order_id TEXT,
+    beverage_type TEXT,
+    target_ml REAL,
+    measured_ml REAL,
+    status TEXT NOT NULL,
+    failed_stage TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    completed_at REAL,
+    cup_sec REAL,
+    pour_sec REAL,
+    deliver_sec REAL
+)
+"""
+
+COLUMNS = ('job_id', 'order_id', 'beverage_type', 'target_ml', 'measured_ml', 'status',
+           'failed_stage', 'error', 'created_at', 'completed_at', 'cup_sec', 'pour_sec', 'deliver_sec')
+
+INSERT = f"INSERT INTO pours ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+
+class PourLedger:
+    """
+    Records one row per finished dispense job.
+    
+    record() only puts the row on an in-memory queue, so the pour thread
+    never touches the disk. A writer thread commits the queued rows in one
+    transaction once a batch is full or the flush interval has passed. The
+    database runs in WAL mode with synchronous=NORMAL, where commits append
+    to the log without an fsync and only checkpoints sync the card.
+    """
+    
+    def __init__(self, db_path, batch_size=20, flush_interval=30.0, max_buffered=1000):
+        """
+        Initialize the ledger.
+        
+        Args:
+            db_path (str): SQLite database file, created if missing
+            batch_size (int): Rows that trigger a write before the interval is up
+            flush_interval (float): Longest time in seconds a row waits to be written
+            max_buffered (int): Rows held in memory before new ones are dropped
+        """
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pending = queue.Queue(maxsize=max_buffered)
+        self.dropped = 0
+        self.written = 0
+        self.stop_event = threading.Event()
+        self.flush_event = threading.Event()
+        self.thread = None
+    
+    def _connect(self):
+        """Open a connection with the ledger's journal settings."""
+        connection = sqlite3.connect(self.db_path, timeout=5.0)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+    
+    def start(self):
+        """
+        Create the database if needed and start the writer thread.
+        
+        Returns:
+            bool: True if the ledger is ready, False otherwise
+        """
+        if self.thread and self.thread.is_alive():
+            return True
+        
+        try:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = self._connect()
+            with connection:
+                connection.execute(SCHEMA)
+            connection.close()
+        except (OSError, sqlite3.Error) as e:
+            logger.error(f"Failed to open pour ledger {self.db_path}: {e}")
+            return False
+        
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._writer_loop, daemon=True)
+        self.thread.start()
+        logger.info(f"Pour ledger opened at {self.db_path}")
+        return True
+    
+    def record(self, job, target_ml, measured_ml=None):
+        """
+        Queue a finished job for writing; never blocks.
+        
+        Args:
+            job (DispenseJob): Finished job
+            target_ml (float): Volume the job asked for
+            measured_ml (float, optional): Volume measured in the cup
+        """
+        durations = job.stage_durations
+        # A stopped job only failed its stage if it was cut short there, not
+        # if it was waiting for the next stage
+        stopped = job.status == 'failed' or (job.status == 'cancelled' and job.stage not in durations)
+        row = (job.job_id, job.order_id, job.beverage_type, target_ml, measured_ml,
+               job.status, job.stage if stopped else None, job.error,
+               job.created_at, job.completed_at,
+               durations.get('cup'), durations.get('pour'), durations.get('deliver'))
+        try:
+            self.pending.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+            logger.warning(f"Pour ledger buffer full, dropped job {job.job_id}")
+            return
+        
+        if self.pending.qsize() >= self.batch_size:
+            self.flush_event.set()
+    
+    def flush(self):
+        """Ask the writer to write the queued rows now."""
+        self.flush_event.set()
+    
+    def _take_pending(self):
+        """Remove every queued row."""
+        rows = []
+        while True:
+            try:
+                rows.append(self.pending.get_nowait())
+            except queue.Empty:
+                return rows
+    
+    def _write(self, connection, rows):
+        """Write rows in a single transaction."""
+        try:
+            with connection:
+                connection.executemany(INSERT, rows)
+            self.written += len(rows)
+            logger.debug(f"Pour ledger wrote {len(rows)} rows")
+        except sqlite3.Error as e:
+            self.dropped += len(rows)
+            logger.error(f"Pour ledger write of {len(rows)} rows failed: {e}")
+    
+    def _writer_loop(self):
+        """Background thread committing queued rows in batches."""
+        connection = self._connect()
+        try:
+            while not self.stop_event.is_set():
+                self.flush_event.wait(self.flush_interval)
+                self.flush_event.clear()
+                rows = self._take_pending()
+                if rows:
+                    self._write(connection, rows)
+            
+            # Write whatever is left on shutdown
+            rows = self._take_pending()
+            if rows:
+                self._write(connection, rows)
+        finally:
+            connection.close()
+    
+    def get_recent(self, limit=50):
+        """
+        Get the newest written pours.
+        
+        Args:
+            limit (int): Maximum number of rows
+        
+        Returns:
+            list: Pour records, newest first
+        """
+        connection = self._connect()
+        try:
+            cursor = connection.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM pours ORDER BY id DESC LIMIT ?", (limit,))
+            return [dict(zip(COLUMNS, row)) for row in cursor.fetchall()]
+        finally:
+            connection.close()
+    
+    def get_consumption(self, since):
+        """
+        Get the cups and beverage used by the pours written since a time.
+        
+        Args:
+            since (float): Only pours completed at or after this time
+        
+        Returns:
+            list: (completed_at, beverage_type, volume_ml, used_cup) tuples in time order
+        """
+        connection = self._connect()
+        try:
+            cursor = connection.execute(
+                "SELECT completed_at, beverage_type, "
+                "CASE WHEN pour_sec IS NOT NULL AND failed_stage IS NOT 'pour' "
+                "THEN COALESCE(measured_ml, target_ml) ELSE 0 END, "
+                "cup_sec IS NOT NULL AND failed_stage IS NOT 'cup' "
+                "FROM pours WHERE completed_at >= ? ORDER BY completed_at", (since,))
+            return [(completed_at, beverage, volume, bool(cup))
+                    for completed_at, beverage, volume, cup in cursor.fetchall()]
+        finally:
+            connection.close()
+    
+    def get_totals(self):
+        """
+        Get lifetime totals over the written pours.
+        
+        Returns:
+            dict: Cups dispensed, beverages poured, volume poured in ml and failed jobs
+        """
+        connection = self._connect()
+        try:
+            # A stage counts once it ran and was not the one that failed
+            cups, poured, volume, failed = connection.execute(
+                "SELECT "
+                "COUNT(CASE WHEN cup_sec IS NOT NULL AND failed_stage IS NOT 'cup' THEN 1 END), "
+                "COUNT(CASE WHEN pour_sec IS NOT NULL AND failed_stage IS NOT 'pour' THEN 1 END), "
+                "COALESCE(SUM(CASE WHEN pour_sec IS NOT NULL AND failed_stage IS NOT 'pour' "
+                "THEN target_ml END), 0), "
+                "COUNT(CASE WHEN status = 'failed' THEN 1 END) "
+                "FROM pours").fetchone()
+        finally:
+            connection.close()
+        return {
+            'cups_dispensed': cups,
+            'beers_poured': poured,
+            'total_volume_ml': volume,
+            'errors': failed
+        }
+    
+    def get_stats(self):
+        """
+        Get the state of the write buffer.
+        
+        Returns:
+            dict: Rows waiting, written and dropped since start
+        """
+        return {
+            'buffered': self.pending.qsize(),
+            'written': self.written,
+            'dropped': self.dropped
+        }
+    
+    def stop(self):
+        """Write the queued rows and stop the writer thread."""
+        self.stop_event.set()
+        self.flush_event.set()
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=5.0)
@@ -0,0 +1,328 @@
+"""
+Retry policies, circuit breakers and a retry executor that waits without blocking.
+"""
+import time
+import heapq
+import random
+import logging
+import itertools
+import threading
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+class RetryPolicy:
+    """Exponential backoff with jitter, bounded by attempts and a time budget."""
+    
+    def __init__(self, max_attempts=3, base_delay=2.0, max_delay=10.0, multiplier=2.0,
+                 jitter=0.5, budget=None, rng=None):
+        """
+        Initialize the policy.
+        
+        Args:
+            max_attempts (int): Attempts including the first one
+            base_delay (float): Wait in seconds before the first retry
+            max_delay (float): Longest wait in seconds between attempts
+            multiplier (float): Growth of the wait after each failed attempt
+            jitter (float): Fraction of each wait that is randomized, 0 to 1
+            budget (float, optional): Seconds from the first attempt after which
+                                      no retry is started; unlimited if None
+            rng (random.Random, optional): Random source for the jitter
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.budget = budget
+        self.rng = rng or random.Random()
+    
+    def next_delay(self, attempt):
+        """
+        Get the wait before the next attempt.
+        
+        Args:
+            attempt (int): Number of the attempt that just failed, starting at 1
+        
+        Returns:
+            float: Seconds to wait
+        """
+        delay = min(self.base_delay * self.multiplier ** (attempt - 1), self.max_delay)
+        # Spread retries of components that failed together
+        return delay * (1 - self.jitter * self.rng.random())
+
+
+class CircuitBreaker:
+    """
+    Fails fast after repeated failures of a component.
+    
+    After failure_threshold consecutive failures the breaker opens and
+    rejects attempts. Once reset_timeout has passed it lets a single trial
+    attempt through; success closes it again, failure reopens it.
+    """
+    
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+    
+    def __init__(self, name, failure_threshold=5, reset_timeout=60.0):
+        """
+        Initialize the breaker.
+        
+        Args:
+            name (str): Component the breaker protects
+            failure_threshold (int): Consecutive failures that open the breaker
+            reset_timeout (float): Seconds the breaker stays open before a trial attempt
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+    
+    def allow(self):
+        """
+        Check whether an attempt may run now.
+        
+        Returns:
+            bool: True if the attempt may run, False to fail fast
+        """
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self.trial_running = False
+            if self.state == self.HALF_OPEN and not self.trial_running:
+                self.trial_running = True
+                return True
+            return False
+    
+    def is_open(self):
+        """
+        Check whether attempts are being rejected, without using up a trial attempt.
+        
+        Returns:
+            bool: True while the breaker is open and its reset timeout has not passed
+        """
+        with self.lock:
+            return self.state == self.OPEN and time.monotonic() - self.opened_at < self.reset_timeout
+    
+    def record_success(self):
+        """Close the breaker after a successful attempt."""
+        with self.lock:
+            if self.state != self.CLOSED:
+                logger.info(f"Circuit for {self.name} closed")
+            self.state = self.CLOSED
+            self.failures = 0
+            self.trial_running = False
+    
+    def record_failure(self):
+        """Count a failed attempt, opening the breaker when the threshold is reached."""
+        with self.lock:
+            self.failures += 1
+            self.trial_running = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"Circuit for {self.name} opened after {self.failures} failures")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+    
+    def release_trial(self):
+        """Let another trial attempt through after one ended without a result."""
+        with self.lock:
+            self.trial_running = False
+    
+    def get_state(self):
+        """
+        Get the breaker state.
+        
+        Returns:
+            dict: State, consecutive failures and seconds until a trial attempt
+        """
+        with self.lock:
+            retry_in = None
+            if self.state == self.OPEN:
+                retry_in = max(self.reset_timeout - (time.monotonic() - self.opened_at), 0.0)
+            return {
+                'state': self.state,
+                'failures': self.failures,
+                'retry_in_sec': retry_in
+            }
+
+
+class RetryOutcome:
+    """Result of an operation run under a retry policy."""
+    
+    __slots__ = ('success', 'attempts', 'reason', 'elapsed')
+    
+    def __init__(self, success, attempts, reason, elapsed):
+        """
+        Initialize the outcome.
+        
+        Args:
+            success (bool): Whether an attempt succeeded
+            attempts (int): Attempts made
+            reason (str): 'succeeded', 'exhausted', 'budget' or 'circuit_open'
+            elapsed (float): Seconds from submission to the outcome
+        """
+        self.success = success
+        self.attempts = attempts
+        self.reason = reason
+        self.elapsed = elapsed
+
+
+class _RetryTask:
+    """An operation waiting for its next attempt."""
+    
+    __slots__ = ('name', 'operation', 'policy', 'breaker', 'on_retry', 'future', 'attempts', 'started')
+    
+    def __init__(self, name, operation, policy, breaker, on_retry):
+        self.name = name
+        self.operation = operation
+        self.policy = policy
+        self.breaker = breaker
+        self.on_retry = on_retry
+        self.future = Future()
+        self.attempts = 0
+        self.started = time.monotonic()
+
+
+class RetryExecutor:
+    """
+    Runs operations and their retries on one worker thread.
+    
+    A failed operation is not slept on. It goes back on a timer heap until
+    its backoff has passed, and the worker runs other submitted operations
+    in the meantime. Operations therefore still never overlap, which suits
+    hardware that can do one thing at a time.
+    """
+    
+    def __init__(self):
+        """Initialize the executor."""
+        self.heap = []  # (due time, sequence, task)
+        self.sequence = itertools.count()
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread = None
+    
+    def start(self):
+        """Start the worker thread."""
+        with self.condition:
+            if self.running:
+                return
+            self.running = True
+        self.thread = threading.Thread(target=self._worker, daemon=True)
+        self.thread.start()
+    
+    def submit(self, operation, policy, breaker=None, name=None, on_retry=None):
+        """
+        Run an operation until it succeeds or the policy gives up.
+        
+        Args:
+            operation (callable): Called with no arguments; returns True on success.
+                                  An exception counts as a failure.
+            policy (RetryPolicy): Attempts, backoff and budget
+            breaker (CircuitBreaker, optional): Breaker of the component the operation uses
+            name (str, optional): Name used in log messages
+            on_retry (callable, optional): Called as on_retry(attempt, delay) after a failed
+                                           attempt that will be retried
+        
+        Returns:
+            Future: Resolves to a RetryOutcome. Cancelling it stops further
+                    attempts; an attempt already running is left to finish.
+        """
+        task = _RetryTask(name or getattr(operation, '__name__', 'operation'),
+                          operation, policy, breaker, on_retry)
+        self._schedule(task, time.monotonic())
+        return task.future
+    
+    def _schedule(self, task, due):
+        """Queue a task's next attempt."""
+        with self.condition:
+            heapq.heappush(self.heap, (due, next(self.sequence), task))
+            self.condition.notify()
+    
+    def _finish(self, task, success, reason):
+        """Resolve a task's future unless it was cancelled."""
+        if not task.future.done():
+            task.future.set_result(RetryOutcome(success, task.attempts, reason,
+                                                time.monotonic() - task.started))
+    
+    def _attempt(self, task):
+        """Run one attempt of a task and decide what comes next."""
+        if task.future.cancelled():
+            return
+        if task.breaker is not None and not task.breaker.allow():
+            logger.warning(f"{task.name}: circuit open, not attempting")
+            self._finish(task, False, 'circuit_open')
+            return
+        
+        task.attempts += 1
+        try:
+            success = bool(task.operation())
+        except Exception as e:
+            logger.error(f"{task.name} attempt {task.attempts} raised: {e}")
+            success = False
+        
+        # An attempt cut short by its caller says nothing about the component
+        if task.future.cancelled():
+            if task.breaker is not None:
+                task.breaker.release_trial()
+            return
+        
+        if task.breaker is not None:
+            if success:
+                task.breaker.record_success()
+            else:
+                task.breaker.record_failure()
+        
+        if success:
+            self._finish(task, True, 'succeeded')
+            return
+        if task.attempts >= task.policy.max_attempts:
+            self._finish(task, False, 'exhausted')
+            return
+        
+        delay = task.policy.next_delay(task.attempts)
+        now = time.monotonic()
+        if task.policy.budget is not None and now + delay - task.started > task.policy.budget:
+            self._finish(task, False, 'budget')
+            return
+        
+        if task.on_retry is not None:
+            task.on_retry(task.attempts, delay)
+        self._schedule(task, now + delay)
+    
+    def _worker(self):
+        """Background thread running attempts as they fall due."""
+        while True:
+            with self.condition:
+                while self.running and (not self.heap or self.heap[0][0] > time.monotonic()):
+                    timeout = self.heap[0][0] - time.monotonic() if self.heap else None
+                    self.condition.wait(timeout)
+                if not self.running:
+                    break
+                _, _, task = heapq.heappop(self.heap)
+            
+            try:
+                self._attempt(task)
+            except Exception as e:
+                logger.error(f"Error in retry executor: {e}")
+                if not task.future.done():
+                    self._finish(task, False, 'exhausted')
+    
+    def stop(self):
+        """Stop the worker; operations still waiting for a retry are failed."""
+        with self.condition:
+            self.running = False
+            pending = [task for _, _, task in self.heap]
+            self.heap = []
+            self.condition.notify()
+        for task in pending:
+            self._finish(task, False, 'exhausted')
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=2.0)
@@ -7,6 +7,8 @@ import os
 
 # Determine whether to use real hardware or mock implementation
 USE_REAL_HARDWARE = os.environ.get('USE_REAL_GPIO', '0') == '1'
+# Discrete-event simulator on a virtual clock instead of the real-time mocks
+USE_SIMULATOR = os.environ.get('USE_SIMULATOR', '0') == '1'
 
 if USE_REAL_HARDWARE:
     try:
@@ -26,6 +28,18 @@ if USE_REAL_HARDWARE:
             MockWeightSensor as WeightSensor
         )
         print("Cannot use real hardware, using mock implementations")
+elif USE_SIMULATOR:
+    # Use the simulator; the monitor and scale stay the mocks, they do not time any stage
+    from hardware.simulator import (
+        SimCupDispenser as CupDispenser,
+        SimBeerDispenser as BeerDispenser,
+        SimCupDelivery as CupDelivery
+    )
+    from hardware.mock_hardware import (
+        MockSystemMonitor as SystemMonitor,
+        MockWeightSensor as WeightSensor
+    )
+    print("Using discrete-event hardware simulator with a virtual clock")
 else:
     # Use mock implementations
     from hardware.mock_hardware import (
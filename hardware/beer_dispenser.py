@@ -1,214 +1,558 @@
 """
-Beer dispensing control module that manages flow control and beer pouring.
+Beverage dispensing control module that manages the valve manifold and pouring.
 """
 import time
 import threading
 import logging
 import RPi.GPIO as GPIO
-from config import GPIO_PINS, BEER_POUR_SETTINGS
+from config import (
+    GPIO_PINS,
+    BEVERAGE_TYPES,
+    BEVERAGE_POUR_SETTINGS,
+    BEVERAGE_TAPS,
+    FLOW_CALIBRATION_SETTINGS,
+    TEMPERATURE_SETTINGS
+)
+from hardware.flow_calibration import FlowCalibration
+from hardware.pour_control import PourControl, SLOW, CLOSE
+from hardware.valve import ValveDriver
+from hardware.temperature import TemperatureSampler
 
 logger = logging.getLogger(__name__)
 
-class BeerDispenser:
-    """Controls the mechanisms for dispensing beer."""
+class TapChannel:
+    """One line of the manifold: a valve with its own flow sensor."""
     
-    def __init__(self):
-        """Initialize the beer dispenser hardware components."""
-        self.valve_pin = GPIO_PINS['BEER_VALVE']
-        self.flow_sensor_pin = GPIO_PINS['BEER_FLOW_SENSOR']
-        self.level_sensor_pin = GPIO_PINS['BEER_LEVEL_SENSOR']
-        self.temperature_sensor_pin = GPIO_PINS['TEMPERATURE_SENSOR']
-        
-        self.default_volume = BEER_POUR_SETTINGS['DEFAULT_VOLUME_ML']
-        self.flow_rate = BEER_POUR_SETTINGS['FLOW_RATE_ML_PER_SEC']
-        self.foam_headspace = BEER_POUR_SETTINGS['FOAM_HEADSPACE_ML']
-        self.slow_pour_threshold = BEER_POUR_SETTINGS['SLOW_POUR_THRESHOLD']
-        self.slow_pour_rate = BEER_POUR_SETTINGS['SLOW_POUR_RATE']
+    def __init__(self, beverage_type, calibration):
+        """
+        Initialize the tap channel for a beverage.
+        
+        Args:
+            beverage_type (str): Beverage served by this tap ('beer', 'kofola' or 'birel')
+            calibration (FlowCalibration): Flow sensor calibration shared by the manifold
+        """
+        tap = BEVERAGE_TAPS[beverage_type]
+        settings = BEVERAGE_POUR_SETTINGS[beverage_type]
+        
+        self.beverage_type = beverage_type
+        self.valve_pin = GPIO_PINS[tap['VALVE']]
+        self.valve = ValveDriver(self.valve_pin, GPIO)
+        self.flow_sensor_pin = GPIO_PINS[tap['FLOW_SENSOR']]
+        self.level_sensor_pin = GPIO_PINS[tap['LEVEL_SENSOR']] if tap['LEVEL_SENSOR'] else None
+        
+        self.default_volume = settings['DEFAULT_VOLUME_ML']
+        self.flow_rate = settings['FLOW_RATE_ML_PER_SEC']
+        self.foam_headspace = settings['FOAM_HEADSPACE_ML']
+        self.slow_pour_rate = settings['SLOW_POUR_RATE']
+        self.pour_mode = settings['POUR_MODE']
+        self.density = settings['DENSITY_G_PER_ML']
+        self.weight_headspace = settings['WEIGHT_HEADSPACE_ML']
+        
+        # Scale under the pour position, required for pouring by weight
+        self.weight_sensor = None
+        # Bus to publish level sensor changes on
+        self.sensor_bus = None
         
         self.initialized = False
         self.pouring = False
-        self.flow_count = 0
         self.flow_lock = threading.Lock()
+        # Held for the whole pour so a tap never runs two pours at once
+        self.pour_lock = threading.Lock()
         
+        # Pour thresholds are evaluated in the sensor callbacks so the valve
+        # closes on the threshold pulse instead of on the next loop iteration
+        self.control = PourControl(beverage_type, calibration)
+        self.stop_reason = None
+        self.slow_pour_event = threading.Event()
+        self.pour_complete_event = threading.Event()
+    
     def initialize(self):
-        """Set up GPIO for the beer dispenser."""
-        try:
-            # Setup GPIO mode if not already set
-            if GPIO.getmode() != GPIO.BCM:
-                GPIO.setmode(GPIO.BCM)
-            
-            # Setup valve pin as output
-            GPIO.setup(self.valve_pin, GPIO.OUT)
-            GPIO.output(self.valve_pin, GPIO.LOW)  # Ensure valve is closed
-            
-            # Setup flow sensor as input with pull-up and interrupt
-            GPIO.setup(self.flow_sensor_pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-            GPIO.add_event_detect(self.flow_sensor_pin, GPIO.FALLING, 
-                                 callback=self._flow_sensor_callback, bouncetime=1)
-            
-            # Setup level sensor as input
+        """Set up GPIO for the tap's valve and sensors."""
+        # Setup valve pin as PWM output, starting closed
+        self.valve.initialize()
+        
+        # Setup flow sensor as input with pull-up and interrupt
+        GPIO.setup(self.flow_sensor_pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+        GPIO.add_event_detect(self.flow_sensor_pin, GPIO.FALLING,
+                             callback=self._flow_sensor_callback, bouncetime=1)
+        
+        # Setup level sensor as input with interrupt as backup stop
+        if self.level_sensor_pin is not None:
             GPIO.setup(self.level_sensor_pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-            
-            # Setup temperature sensor (assuming it's a digital sensor using GPIO)
-            GPIO.setup(self.temperature_sensor_pin, GPIO.IN)
-            
-            self.initialized = True
-            logger.info("Beer dispenser initialized successfully")
-            return True
-        except Exception as e:
-            logger.error(f"Failed to initialize beer dispenser: {e}")
-            return False
+            GPIO.add_event_detect(self.level_sensor_pin, GPIO.FALLING,
+                                 callback=self._level_sensor_callback, bouncetime=50)
+        
+        self.initialized = True
     
     def _flow_sensor_callback(self, channel):
-        """Callback for flow sensor pulses."""
+        """
+        Callback for flow sensor pulses.
+        
+        Advances the volume estimate and compares it against the pour
+        thresholds as each pulse arrives.
+        """
+        now = time.monotonic()
         with self.flow_lock:
-            self.flow_count += 1
+            action = self.control.add_pulse(now)
+            if self.pouring:
+                self._apply_locked(action)
+    
+    def _apply_locked(self, action):
+        """
+        Close or slow the valve as the pour control decided.
+        
+        Must be called with flow_lock held.
+        
+        Args:
+            action (str): CLOSE, SLOW or None
+        """
+        if action == CLOSE:
+            self._complete_pour_locked('target')
+        elif action == SLOW:
+            self.slow_pour_event.set()
+    
+    def _level_sensor_callback(self, channel):
+        """Callback for the level sensor detecting a nearly full cup."""
+        with self.flow_lock:
+            if self.pouring:
+                self._complete_pour_locked('level')
+        self._publish_level(True)
     
-    def pour_beer(self, volume_ml=None):
+    def _publish_level(self, reached):
+        """Publish whether liquid is at the level sensor."""
+        if self.sensor_bus is not None:
+            self.sensor_bus.publish(f"level:{self.beverage_type}", reached)
+    
+    def _complete_pour_locked(self, reason):
         """
-        Pour a specified volume of beer.
+        Close the valve and wake the pour loop.
+        
+        Must be called with flow_lock held.
+        
+        Args:
+            reason (str): Why the pour ended ('target', 'level', 'timeout' or 'stopped')
+        """
+        if self.pour_complete_event.is_set():
+            return
+        
+        self.valve.close()
+        self.stop_reason = reason
+        self.control.closed(time.monotonic())
+        self.pour_complete_event.set()
+        # Release a pour loop still waiting for the slow pour phase
+        self.slow_pour_event.set()
+    
+    def pour(self, volume_ml=None):
+        """
+        Pour a specified volume from this tap.
+        
+        Blocks until the pour has finished. Other taps can pour at the same time.
         
         Args:
             volume_ml (float, optional): Volume to pour in milliliters.
                                          Uses default if None.
         
         Returns:
-            bool: True if beer was successfully poured, False otherwise
+            bool: True if the beverage was successfully poured, False otherwise
         """
-        if not self.initialized:
-            if not self.initialize():
-                return False
+        if not self.pour_lock.acquire(blocking=False):
+            logger.error(f"Tap {self.beverage_type} is already pouring")
+            return False
         
+        try:
+            return self._pour(volume_ml)
+        finally:
+            self.pour_lock.release()
+    
+    def _tare_cup(self):
+        """
+        Weigh the cup that has just landed under the tap.
+        
+        Returns:
+            float: Gross weight in grams, or None if the pour cannot be weighed
+        """
+        if self.weight_sensor is None:
+            logger.warning(f"No scale for {self.beverage_type} tap, pouring by flow count")
+            return None
+        
+        cup_weight = self.weight_sensor.get_settled_weight()
+        if cup_weight is None:
+            logger.warning(f"Cannot weigh cup on {self.beverage_type} tap, pouring by flow count")
+        return cup_weight
+    
+    def _pour(self, volume_ml):
+        """Run a single pour; must be called with pour_lock held."""
         volume = volume_ml if volume_ml is not None else self.default_volume
-        target_volume = volume - self.foam_headspace
+        
+        # Weighing the fill needs far less foam margin than counting pulses.
+        # Pours by flow count are weighed too, if possible, to calibrate the flow sensor.
+        weigh = self.pour_mode == 'weight' or (FLOW_CALIBRATION_SETTINGS['LEARN_FROM_FLOW_POURS'] and
+                                               self.weight_sensor is not None)
+        cup_weight = self._tare_cup() if weigh else None
+        by_weight = cup_weight is not None and self.pour_mode == 'weight'
+        target_volume = volume - (self.weight_headspace if by_weight else self.foam_headspace)
         
         try:
-            logger.info(f"Starting beer pour: {volume}ml (target: {target_volume}ml)")
+            logger.info(f"Starting {self.beverage_type} pour by {'weight' if by_weight else 'flow'}: "
+                        f"{volume}ml (target: {target_volume}ml)")
             
-            # Reset flow counter
+            # Reset flow counter and arm the callback thresholds
             with self.flow_lock:
-                self.flow_count = 0
-            
-            self.pouring = True
+                self.control.start(target_volume)
+                self.stop_reason = None
+                self.slow_pour_event.clear()
+                self.pour_complete_event.clear()
+                self.pouring = True
+                
+                # Open valve to start pouring
+                self.valve.open()
             
-            # Open valve to start pouring
-            GPIO.output(self.valve_pin, GPIO.HIGH)
+            # Level sensor edges only fire on change, so check it once up front
+            if self.level_sensor_pin is not None:
+                level_reached = GPIO.input(self.level_sensor_pin) == GPIO.LOW
+                self._publish_level(level_reached)
+                if level_reached:
+                    with self.flow_lock:
+                        self._complete_pour_locked('level')
             
-            # Monitor the pour
+            # Wait for the callbacks; no polling interval is involved
             start_time = time.time()
-            slow_pour_started = False
-            
-            # Calculate the approximate number of pulses for the target volume
-            # This would need calibration for the actual flow sensor
-            # Assuming 2.25ml per pulse (common in many flow sensors)
-            ml_per_pulse = 2.25
-            target_pulses = target_volume / ml_per_pulse
-            slow_pour_pulses = target_pulses * self.slow_pour_threshold
+            deadline = start_time + volume / (self.flow_rate * 0.5)
             
-            while self.pouring:
-                current_pulses = 0
-                with self.flow_lock:
-                    current_pulses = self.flow_count
-                
-                # Calculate current volume
-                current_volume = current_pulses * ml_per_pulse
-                
-                # Check if we should switch to slow pour
-                if not slow_pour_started and current_pulses >= slow_pour_pulses:
-                    logger.debug("Switching to slow pour")
-                    # Implement PWM or pulse the valve for slower flow
+            if by_weight:
+                self._watch_weight(cup_weight, deadline)
+            else:
+                slow_pour_reached = self.slow_pour_event.wait(timeout=deadline - start_time)
+                if slow_pour_reached and not self.pour_complete_event.is_set():
+                    logger.debug(f"Switching {self.beverage_type} tap to slow pour")
                     self._start_slow_pour()
-                    slow_pour_started = True
-                
-                # Check if we've reached the target
-                if current_volume >= target_volume:
-                    logger.info(f"Target volume reached: {current_volume}ml")
-                    break
-                
-                # Check for level sensor trigger (backup mechanism)
-                if GPIO.input(self.level_sensor_pin) == GPIO.LOW:
-                    logger.info("Level sensor triggered - cup near full")
-                    break
-                
-                # Check for timeout or flow issues
-                if (time.time() - start_time) > (volume / (self.flow_rate * 0.5)):
-                    logger.error("Pour timeout - flow might be impeded")
-                    break
-                
-                # Small delay to prevent CPU hogging
-                time.sleep(0.1)
             
-            # Close valve
-            GPIO.output(self.valve_pin, GPIO.LOW)
-            self.pouring = False
+            if not self.pour_complete_event.wait(timeout=max(0, deadline - time.time())):
+                with self.flow_lock:
+                    self._complete_pour_locked('timeout')
             
-            # Final volume calculation
-            final_volume = 0
             with self.flow_lock:
-                final_volume = self.flow_count * ml_per_pulse
+                self.pouring = False
+                stop_reason = self.stop_reason
             
-            logger.info(f"Pour completed: approximately {final_volume}ml dispensed")
+            if stop_reason == 'target':
+                logger.info(f"Target volume reached: {target_volume}ml")
+            elif stop_reason == 'level':
+                logger.info("Level sensor triggered - cup near full")
+            elif stop_reason == 'timeout':
+                logger.error("Pour timeout - flow might be impeded")
+            elif stop_reason == 'stopped':
+                logger.info(f"{self.beverage_type} pour stopped manually")
+                return False
             
-            # Allow time for foam to settle
+            # Allow time for foam to settle and in-flight pulses to arrive
             time.sleep(1)
             
-            return True
+            # Final volume calculation, corrected by the settled weight if available
+            final_weight = self.weight_sensor.get_settled_weight() if cup_weight is not None else None
+            weighed_volume = (final_weight - cup_weight) / self.density if final_weight is not None else None
+            with self.flow_lock:
+                final_volume, uncertainty = self.control.finish(weighed_volume, time.monotonic())
+            self.control.learn(weighed_volume, stop_reason == 'target')
+            
+            logger.info(f"Pour completed: approximately {final_volume:.0f}ml "
+                        f"(±{uncertainty:.0f}ml) dispensed")
             
+            return True
+        
         except Exception as e:
-            logger.error(f"Error during beer pouring: {e}")
+            logger.error(f"Error during {self.beverage_type} pouring: {e}")
             # Safety: ensure valve is closed
-            GPIO.output(self.valve_pin, GPIO.LOW)
-            self.pouring = False
+            self.valve.close()
+            with self.flow_lock:
+                self.pouring = False
+                self.control.abandon()
             return False
     
+    def _watch_weight(self, cup_weight, deadline):
+        """
+        Feed scale readings into the volume estimate until the pour ends.
+        
+        Every new sample corrects the estimate, which the flow callback
+        also advances pulse by pulse, and is checked against the pour
+        thresholds in case the flow sensor has stalled.
+        
+        Args:
+            cup_weight (float): Weight of the empty cup in grams
+            deadline (float): Time at which the pour times out
+        """
+        slow_pour_started = False
+        sample_count = self.weight_sensor.sample_count
+        
+        while not self.pour_complete_event.is_set():
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return
+            
+            sample_count = self.weight_sensor.wait_for_sample(sample_count, timeout=min(remaining, 1.0))
+            weight = self.weight_sensor.get_weight()
+            if weight is not None:
+                with self.flow_lock:
+                    if not self.pouring:
+                        return
+                    self._apply_locked(self.control.add_weight(
+                        (weight - cup_weight) / self.density,
+                        self.weight_sensor.filter_delay,
+                        time.monotonic()
+                    ))
+            
+            if (not slow_pour_started and self.slow_pour_event.is_set() and
+                    not self.pour_complete_event.is_set()):
+                logger.debug(f"Switching {self.beverage_type} tap to slow pour")
+                self._start_slow_pour()
+                slow_pour_started = True
+    
+    def get_volume_estimate(self):
+        """
+        Get the estimated volume in the cup under this tap.
+        
+        Returns:
+            dict: Volume and one standard deviation of uncertainty in ml
+        """
+        with self.flow_lock:
+            estimate = self.control.get_estimate()
+            estimate['pouring'] = self.pouring
+            return estimate
+    
     def _start_slow_pour(self):
-        """Switch to slow pour mode using PWM."""
-        # This would ideally be implemented with proper PWM
-        # For simplicity, we'll use a simple on/off pattern
-        GPIO.output(self.valve_pin, GPIO.LOW)
-        time.sleep(0.1)
-        GPIO.output(self.valve_pin, GPIO.HIGH)
+        """Ramp the valve down to the slow pour duty cycle."""
+        # The driver ignores the ramp if the callbacks already closed the valve
+        self.valve.ramp_to(self.slow_pour_rate * 100)
     
     def stop_pour(self):
-        """Emergency stop for pouring."""
-        if self.pouring:
-            GPIO.output(self.valve_pin, GPIO.LOW)
+        """
+        Emergency stop for this tap.
+        
+        Returns:
+            bool: True if a pour was stopped, False if the tap was idle
+        """
+        with self.flow_lock:
+            if not self.pouring:
+                return False
+            self._complete_pour_locked('stopped')
             self.pouring = False
-            logger.info("Pour stopped manually")
+            return True
+    
+    def cleanup(self):
+        """Release the tap's GPIO resources."""
+        if self.initialized:
+            self.stop_pour()
+            
+            # Remove event detection
+            GPIO.remove_event_detect(self.flow_sensor_pin)
+            pins = [self.valve_pin, self.flow_sensor_pin]
+            if self.level_sensor_pin is not None:
+                GPIO.remove_event_detect(self.level_sensor_pin)
+                pins.append(self.level_sensor_pin)
+            
+            # Stop valve PWM and clean up pins
+            self.valve.cleanup()
+            GPIO.cleanup(pins)
+            
+            self.initialized = False
+
+
+class BeerDispenser:
+    """Controls the valve manifold dispensing beer, kofola and birel."""
     
-    def get_beer_temperature(self):
+    def __init__(self):
+        """Initialize the manifold with one tap channel per beverage."""
+        self.calibration = FlowCalibration(BEVERAGE_TYPES, FLOW_CALIBRATION_SETTINGS['PATH'],
+                                           FLOW_CALIBRATION_SETTINGS)
+        self.taps = {beverage: TapChannel(beverage, self.calibration) for beverage in BEVERAGE_TYPES}
+        # Line temperatures are read in the background; 1-Wire reads take ~750ms each
+        self.temperature_sampler = TemperatureSampler(
+            TEMPERATURE_SETTINGS['SENSOR_IDS'],
+            TEMPERATURE_SETTINGS['W1_DEVICES_PATH'],
+            TEMPERATURE_SETTINGS['SAMPLE_INTERVAL_SEC'],
+            TEMPERATURE_SETTINGS['STALE_AFTER_SEC']
+        )
+        self.current_beverage = 'beer'  # Default beverage type
+        self.initialized = False
+    
+    @property
+    def pouring(self):
+        """bool: True while any tap is pouring."""
+        return any(tap.pouring for tap in self.taps.values())
+    
+    def set_weight_sensor(self, weight_sensor):
         """
-        Read the current beer temperature.
+        Use a scale under the pour position for taps that pour by weight.
         
-        Returns:
-            float: Temperature in Celsius or None if error
+        Args:
+            weight_sensor (WeightSensor): Sampling weight sensor
         """
-        # This is a simplified implementation
-        # In reality, this would use a proper temperature sensor library
+        for tap in self.taps.values():
+            tap.weight_sensor = weight_sensor
+    
+    def set_sensor_bus(self, sensor_bus):
+        """
+        Publish level sensor changes on a sensor bus.
+        
+        Args:
+            sensor_bus (SensorBus): Bus shared with the system monitor
+        """
+        for tap in self.taps.values():
+            tap.sensor_bus = sensor_bus
+        self.temperature_sampler.sensor_bus = sensor_bus
+    
+    def initialize(self):
+        """Set up GPIO for every tap in the manifold."""
         try:
-            # Simulated temperature reading between 2-8°C
-            # In real implementation, this would read actual sensor data
-            import random
-            temp = round(random.uniform(2, 8), 1)
-            logger.debug(f"Current beer temperature: {temp}°C")
-            return temp
+            # Setup GPIO mode if not already set
+            if GPIO.getmode() != GPIO.BCM:
+                GPIO.setmode(GPIO.BCM)
+            
+            self.calibration.load()
+            for tap in self.taps.values():
+                tap.initialize()
+            
+            # The 1-Wire kernel driver owns the temperature sensor pin
+            self.temperature_sampler.start()
+            
+            self.initialized = True
+            logger.info(f"Beverage manifold initialized with taps: {', '.join(self.taps)}")
+            return True
         except Exception as e:
-            logger.error(f"Error reading beer temperature: {e}")
+            logger.error(f"Failed to initialize beverage manifold: {e}")
+            return False
+    
+    def pour_beer(self, volume_ml=None, beverage_type=None):
+        """
+        Pour a specified volume of a beverage on its tap.
+        
+        Blocks until the pour has finished. Pours on different taps may be
+        run concurrently from separate threads.
+        
+        Args:
+            volume_ml (float, optional): Volume to pour in milliliters.
+                                         Uses default if None.
+            beverage_type (str, optional): Type of beverage to pour ('beer', 'kofola', or 'birel').
+                                           Uses the current beverage if None.
+        
+        Returns:
+            bool: True if the beverage was successfully poured, False otherwise
+        """
+        if not self.initialized:
+            if not self.initialize():
+                return False
+        
+        beverage = beverage_type or self.current_beverage
+        if beverage not in self.taps:
+            logger.error(f"Unknown beverage type: {beverage}")
+            return False
+        
+        return self.taps[beverage].pour(volume_ml)
+    
+    def stop_pour(self, beverage_type=None):
+        """
+        Emergency stop for pouring.
+        
+        Args:
+            beverage_type (str, optional): Tap to stop, or every tap if None
+        
+        Returns:
+            bool: True if any pour was stopped, False otherwise
+        """
+        taps = [self.taps[beverage_type]] if beverage_type else self.taps.values()
+        stopped = [tap.beverage_type for tap in taps if tap.stop_pour()]
+        if stopped:
+            logger.info(f"Pour stopped manually on: {', '.join(stopped)}")
+        return bool(stopped)
+    
+    def get_volume_estimates(self):
+        """
+        Get the estimated volume in the cup for every tap.
+        
+        Returns:
+            dict: Maps each beverage type to its tap's volume estimate
+        """
+        return {beverage: tap.get_volume_estimate() for beverage, tap in self.taps.items()}
+    
+    def get_flow_calibration(self):
+        """
+        Get the flow sensor calibration learned for every tap.
+        
+        Returns:
+            dict: Maps each beverage type to its learned pour count and ml per pulse by frequency
+        """
+        return self.calibration.get_status()
+    
+    def get_active_taps(self):
+        """
+        Get the taps that are currently pouring.
+        
+        Returns:
+            list: Beverage types with an open pour
+        """
+        return [beverage for beverage, tap in self.taps.items() if tap.pouring]
+    
+    def set_beverage_type(self, beverage_type):
+        """
+        Set the current beverage type.
+        
+        Args:
+            beverage_type (str): Type of beverage ('beer', 'kofola', or 'birel')
+        
+        Returns:
+            bool: True if successfully set, False otherwise
+        """
+        if beverage_type in self.taps:
+            self.current_beverage = beverage_type
+            return True
+        return False
+    
+    def get_current_beverage(self):
+        """
+        Get the current beverage type.
+        
+        Returns:
+            str: Current beverage type
+        """
+        return self.current_beverage
+    
+    def get_beer_temperature(self, beverage_type=None):
+        """
+        Get the latest temperature of a beverage line.
+        
+        Returns the background sampler's cached value, so it never waits
+        for the sensor.
+        
+        Args:
+            beverage_type (str, optional): Beverage line, the current beverage if None
+        
+        Returns:
+            float: Temperature in Celsius or None if no recent reading
+        """
+        reading = self.temperature_sampler.get_reading(beverage_type or self.current_beverage)
+        if reading['stale']:
             return None
+        return reading['temperature']
+    
+    def get_temperature_readings(self):
+        """
+        Get the cached temperature of every line with a sensor.
+        
+        Returns:
+            dict: Maps each beverage type to its temperature, timestamp and stale flag
+        """
+        return self.temperature_sampler.get_readings()
     
     def cleanup(self):
         """Release resources and clean up GPIO pins."""
         if self.initialized:
-            # Stop any ongoing pour
-            if self.pouring:
-                self.stop_pour()
-            
-            # Remove event detection
-            GPIO.remove_event_detect(self.flow_sensor_pin)
+            # Stop any ongoing pours and release every tap
+            for tap in self.taps.values():
+                tap.cleanup()
             
-            # Clean up pins
-            GPIO.cleanup([self.valve_pin, self.flow_sensor_pin, 
-                          self.level_sensor_pin, self.temperature_sensor_pin])
+            self.temperature_sampler.stop()
+            if self.calibration.unsaved:
+                self.calibration.save()
             
             self.initialized = False
-            logger.info("Beer dispenser resources cleaned up")
+            logger.info("Beverage manifold resources cleaned up")
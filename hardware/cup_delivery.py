@@ -3,8 +3,10 @@ Cup delivery control module for moving filled cups to the delivery station.
 """
 import time
 import logging
+import threading
 import RPi.GPIO as GPIO
 from config import GPIO_PINS, DELIVERY_SETTINGS
+from hardware.position_sensor import PositionSensor
 
 logger = logging.getLogger(__name__)
 
@@ -16,6 +18,8 @@ class CupDelivery:
         self.motor1_pin = GPIO_PINS['DELIVERY_MOTOR_1']
         self.motor2_pin = GPIO_PINS['DELIVERY_MOTOR_2']
         self.position_sensor_pin = GPIO_PINS['DELIVERY_POSITION_SENSOR']
+        self.position_sensor = PositionSensor(self.position_sensor_pin, GPIO, 'Pickup position',
+                                              bouncetime=DELIVERY_SETTINGS['SENSOR_BOUNCE_MS'])
         
         self.conveyor_speed = DELIVERY_SETTINGS['CONVEYOR_SPEED']
         self.delivery_timeout = DELIVERY_SETTINGS['DELIVERY_TIMEOUT_SEC']
@@ -23,6 +27,8 @@ class CupDelivery:
         self.initialized = False
         self.motor_pwm1 = None
         self.motor_pwm2 = None
+        # Set by stop_conveyor to end a delivery in progress
+        self.abort_event = threading.Event()
         
     def initialize(self):
         """Set up GPIO for the cup delivery system."""
@@ -43,8 +49,8 @@ class CupDelivery:
             self.motor_pwm1.start(0)
             self.motor_pwm2.start(0)
             
-            # Setup position sensor as input
-            GPIO.setup(self.position_sensor_pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+            # Setup position sensor as input, reporting its edges
+            self.position_sensor.initialize()
             
             self.initialized = True
             logger.info("Cup delivery system initialized successfully")
@@ -66,20 +72,24 @@ class CupDelivery:
         
         try:
             logger.info("Starting cup delivery sequence")
+            self.abort_event.clear()
+            
+            # A previous cup may still be at the pickup location, so the
+            # delivered cup is the sensor's next arrival
+            arrivals = self.position_sensor.arrivals
             
             # Start the conveyor motors at specified speed
             self.motor_pwm1.ChangeDutyCycle(self.conveyor_speed)
             self.motor_pwm2.ChangeDutyCycle(self.conveyor_speed)
             
-            # Wait for position sensor to detect cup at delivery position or timeout
-            start_time = time.time()
-            cup_delivered = False
+            # Wait for the sensor edge of the cup reaching the pickup location, or timeout
+            cup_delivered = self.position_sensor.wait_for_arrival(arrivals, self.delivery_timeout,
+                                                                  cancel=self.abort_event)
             
-            while (time.time() - start_time) < self.delivery_timeout:
-                if GPIO.input(self.position_sensor_pin) == GPIO.LOW:  # Cup detected at delivery position
-                    cup_delivered = True
-                    break
-                time.sleep(0.1)
+            if self.abort_event.is_set():
+                # stop_conveyor has stopped the motors; a later delivery may have restarted them
+                logger.warning("Cup delivery aborted")
+                return False
             
             # Stop the motors
             self.motor_pwm1.ChangeDutyCycle(0)
@@ -141,7 +151,13 @@ class CupDelivery:
             return False
     
     def stop_conveyor(self):
-        """Stop the conveyor motors."""
+        """
+        Stop the conveyor motors; callable from any thread.
+        
+        A delivery in progress stops waiting for its cup and returns False.
+        """
+        self.abort_event.set()
+        self.position_sensor.wake()
         if self.initialized:
             try:
                 self.motor_pwm1.ChangeDutyCycle(0)
@@ -159,6 +175,8 @@ class CupDelivery:
             # Stop the conveyor
             self.stop_conveyor()
             
+            self.position_sensor.cleanup()
+            
             # Clean up PWM resources
             if self.motor_pwm1:
                 self.motor_pwm1.stop()
@@ -3,23 +3,123 @@ Cup dispenser control module that manages cup storage and retrieval.
 """
 import time
 import logging
+import threading
 import RPi.GPIO as GPIO
-from config import GPIO_PINS, CUP_SETTINGS
+from config import GPIO_PINS, CUP_SETTINGS, WEIGHT_SENSOR_SETTINGS
+from hardware.cup_drop import DropStatistics
+from hardware.position_sensor import PositionSensor
+from hardware.ring_buffer import RingBuffer
 
 logger = logging.getLogger(__name__)
 
 class CupDispenser:
-    """Controls the mechanisms for dispensing cups."""
+    """
+    Controls the mechanisms for dispensing cups.
+    
+    A released cup is confirmed by the position sensor or by a weight step
+    on the scale, whichever comes first, so the dispenser moves on as soon
+    as the cup has landed. The release itself closes after RELEASE_OPEN_SEC
+    and DISPENSE_DELAY_SEC is only the fallback when neither sensor
+    confirms the drop.
+    
+    When dispensing is pipelined, a cup may be released while the previous
+    one is still being poured. It is only moved to the pour position once
+    the position sensor has seen that cup leave.
+    """
     
     def __init__(self):
         """Initialize the cup dispenser hardware components."""
         self.motor_pin = GPIO_PINS['CUP_DISPENSER_MOTOR']
         self.servo_pin = GPIO_PINS['CUP_DISPENSER_SERVO']
         self.position_sensor_pin = GPIO_PINS['CUP_POSITION_SENSOR']
+        self.position_sensor = PositionSensor(self.position_sensor_pin, GPIO, 'Cup position',
+                                              bouncetime=CUP_SETTINGS['SENSOR_BOUNCE_MS'],
+                                              on_change=self._on_position_change)
         self.initialized = False
         self.dispense_delay = CUP_SETTINGS['DISPENSE_DELAY_SEC']
+        self.release_open_time = CUP_SETTINGS['RELEASE_OPEN_SEC']
         self.detection_timeout = CUP_SETTINGS['DETECTION_TIMEOUT_SEC']
+        self.position_clear_timeout = CUP_SETTINGS['POSITION_CLEAR_TIMEOUT_SEC']
+        
+        # Drop confirmation, armed from the release until the cup is confirmed
+        self.sensor_bus = None
+        self.drop_weight_step = CUP_SETTINGS['DROP_WEIGHT_STEP_G']
+        self.recent_weights = RingBuffer(WEIGHT_SENSOR_SETTINGS['FILTER_WINDOW'])
+        self.drop_lock = threading.Lock()
+        self.drop_armed = False
+        self.drop_baseline = None
+        self.drop_source = None
+        self.drop_event = threading.Event()
+        self.drop_stats = DropStatistics(CUP_SETTINGS['DROP_HISTORY'])
+        # Set by abort_dispense to end a dispense in progress
+        self.abort_event = threading.Event()
+    
+    def set_sensor_bus(self, sensor_bus):
+        """
+        Confirm cup drops by the weight step on a sensor bus.
+        
+        Args:
+            sensor_bus (SensorBus): Bus the scale publishes its weight on
+        """
+        self.sensor_bus = sensor_bus
+        # Every reading, unchanged ones too, so a steady scale fills the baseline window
+        sensor_bus.subscribe('weight', self._on_weight, min_change=0)
+    
+    def _on_weight(self, channel, value, timestamp):
+        """Bus subscriber confirming an armed drop once the weight steps up."""
+        with self.drop_lock:
+            if not self.drop_armed:
+                self.recent_weights.append(value)
+            elif self.drop_baseline is not None and value - self.drop_baseline >= self.drop_weight_step:
+                self._confirm_drop_locked('weight')
+    
+    def _on_position_change(self, active):
+        """Position sensor listener confirming an armed drop when a cup arrives."""
+        if active:
+            with self.drop_lock:
+                if self.drop_armed:
+                    self._confirm_drop_locked('position')
+    
+    def _confirm_drop_locked(self, source):
+        """Mark the armed drop as confirmed; must be called with drop_lock held."""
+        if not self.drop_event.is_set():
+            self.drop_source = source
+            self.drop_event.set()
+    
+    def _arm_drop(self):
+        """Start watching the sensors for a released cup."""
+        with self.drop_lock:
+            # A weight step only means a cup if the scale was steady before the release
+            weights = self.recent_weights.values()
+            steady = (len(weights) == self.recent_weights.capacity and
+                      max(weights) - min(weights) < self.drop_weight_step / 2)
+            self.drop_baseline = sum(weights) / len(weights) if steady else None
+            self.drop_source = None
+            self.drop_event.clear()
+            self.drop_armed = True
+    
+    def _disarm_drop(self):
+        """
+        Stop watching the sensors for the released cup.
+        
+        Returns:
+            str: Sensor that confirmed the drop, or None if none did
+        """
+        with self.drop_lock:
+            self.drop_armed = False
+            # Readings taken while the cup landed are no baseline for the next one
+            self.recent_weights.clear()
+            return self.drop_source
+    
+    def get_drop_stats(self):
+        """
+        Get the distribution of recent cup drop times.
         
+        Returns:
+            dict: Drop counts by confirming sensor and drop time statistics
+        """
+        return self.drop_stats.summary()
+    
     def initialize(self):
         """Set up GPIO for the cup dispenser."""
         try:
@@ -35,8 +135,8 @@ class CupDispenser:
             self.servo_pwm = GPIO.PWM(self.servo_pin, 50)  # 50Hz frequency
             self.servo_pwm.start(0)  # Start with 0% duty cycle
             
-            # Setup position sensor as input with pull-up
-            GPIO.setup(self.position_sensor_pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+            # Setup position sensor as input with pull-up, reporting its edges
+            self.position_sensor.initialize()
             
             self.initialized = True
             logger.info("Cup dispenser initialized successfully")
@@ -58,31 +158,65 @@ class CupDispenser:
         
         try:
             logger.info("Starting cup dispensing sequence")
+            self.abort_event.clear()
+            
+            # When pipelined, the previous cup may still be at the pour position
+            occupied = self.position_sensor.is_active()
+            # This cup is in position on the sensor's next arrival, which may
+            # already be the edge that confirms its drop
+            arrivals = self.position_sensor.arrivals
+            
+            # Open the cup release mechanism and wait until a sensor sees the cup land
+            self._arm_drop()
+            released = time.monotonic()
+            self._set_servo_angle(90, settle=False)
             
-            # Activate the cup release mechanism (servo)
-            self._set_servo_angle(90)  # Open the cup release mechanism
-            time.sleep(0.5)
-            self._set_servo_angle(0)   # Close the cup release mechanism
+            # Only hold the release open as long as a cup needs to pass, so a
+            # slow or jammed stack cannot let further cups go while we wait
+            self.drop_event.wait(min(self.release_open_time, self.dispense_delay))
+            self._set_servo_angle(0, settle=False)
+            self.drop_event.wait(max(self.dispense_delay - (time.monotonic() - released), 0))
+            drop_time = time.monotonic() - released
+            source = self._disarm_drop()
+            
+            if self.abort_event.is_set():
+                logger.warning("Cup dispensing aborted")
+                return False
+            
+            self.drop_stats.record(drop_time, source or 'timeout')
+            if source:
+                logger.debug(f"Cup drop confirmed by {source} sensor after {drop_time * 1000:.0f}ms")
+            elif occupied:
+                # Both sensors are busy with the cup being poured
+                logger.debug("Cup drop not confirmed while the pour position is occupied")
+            else:
+                logger.warning(f"Cup drop not confirmed within {self.dispense_delay}s")
             
-            # Wait for cup to drop
-            time.sleep(self.dispense_delay)
+            # The cup can only be moved in once the previous one has left
+            if occupied:
+                logger.debug("Waiting for the previous cup to leave the pour position")
+                cleared = self.position_sensor.wait_for(False, self.position_clear_timeout,
+                                                        cancel=self.abort_event)
+                if self.abort_event.is_set():
+                    logger.warning("Cup dispensing aborted")
+                    return False
+                if not cleared:
+                    logger.error(f"Pour position still occupied after {self.position_clear_timeout}s")
+                    return False
             
             # Activate motor to move cup to position
             GPIO.output(self.motor_pin, GPIO.HIGH)
             
-            # Wait for position sensor to detect cup or timeout
-            start_time = time.time()
-            cup_detected = False
-            
-            while (time.time() - start_time) < self.detection_timeout:
-                if GPIO.input(self.position_sensor_pin) == GPIO.LOW:  # Cup detected (sensor triggered)
-                    cup_detected = True
-                    break
-                time.sleep(0.1)
+            # Wait for the sensor edge that puts the cup in position, or timeout
+            cup_detected = self.position_sensor.wait_for_arrival(arrivals, self.detection_timeout,
+                                                                 cancel=self.abort_event)
             
             # Stop the motor
             GPIO.output(self.motor_pin, GPIO.LOW)
             
+            if self.abort_event.is_set():
+                logger.warning("Cup dispensing aborted")
+                return False
             if cup_detected:
                 logger.info("Cup successfully dispensed and positioned")
                 return True
@@ -92,25 +226,47 @@ class CupDispenser:
                 
         except Exception as e:
             logger.error(f"Error during cup dispensing: {e}")
+            self._disarm_drop()
             # Safety: ensure motor is stopped
             GPIO.output(self.motor_pin, GPIO.LOW)
             return False
     
-    def _set_servo_angle(self, angle):
+    def abort_dispense(self):
+        """
+        Stop a dispense in progress; callable from any thread.
+        
+        Closes the release, stops the motor and stops watching for the
+        drop. The interrupted dispense_cup returns False.
+        """
+        self.abort_event.set()
+        self._disarm_drop()
+        # Wake the waits; an unconfirmed drop stays unconfirmed
+        self.drop_event.set()
+        self.position_sensor.wake()
+        
+        if self.initialized:
+            self._set_servo_angle(0, settle=False)
+            GPIO.output(self.motor_pin, GPIO.LOW)
+            logger.warning("Cup dispenser stopped")
+    
+    def _set_servo_angle(self, angle, settle=True):
         """
         Set the servo to a specific angle.
         
         Args:
             angle (int): The angle to set (0-180 degrees)
+            settle (bool): Wait for the servo to reach the angle
         """
         # Convert angle to duty cycle (typically 2.5% - 12.5%)
         duty_cycle = 2.5 + (angle / 180.0) * 10.0
         self.servo_pwm.ChangeDutyCycle(duty_cycle)
-        time.sleep(0.3)  # Allow time for servo to move
+        if settle:
+            time.sleep(0.3)  # Allow time for servo to move
         
     def cleanup(self):
         """Release resources and clean up GPIO pins."""
         if self.initialized:
+            self.position_sensor.cleanup()
             self.servo_pwm.stop()
             GPIO.cleanup([self.motor_pin, self.servo_pin, self.position_sensor_pin])
             self.initialized = False
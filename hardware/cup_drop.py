@@ -0,0 +1,64 @@
+"""
+Statistics of cup drop times for tuning the cup dispenser.
+"""
+import threading
+from hardware.ring_buffer import RingBuffer
+
+# How a drop can end
+DROP_SOURCES = ('position', 'weight', 'timeout')
+
+class DropStatistics:
+    """
+    Distribution of the time from releasing a cup to its drop being confirmed.
+    
+    Drops that were never confirmed are counted separately, so a wait that
+    runs into its timeout does not skew the distribution.
+    """
+    
+    def __init__(self, history=200):
+        """
+        Initialize the statistics.
+        
+        Args:
+            history (int): Number of most recent confirmed drop times kept
+        """
+        self.times = RingBuffer(history)
+        self.counts = {source: 0 for source in DROP_SOURCES}
+        self.lock = threading.Lock()
+    
+    def record(self, duration, source):
+        """
+        Record one drop.
+        
+        Args:
+            duration (float): Seconds from the release to the end of the wait
+            source (str): What ended the wait ('position', 'weight' or 'timeout')
+        """
+        with self.lock:
+            self.counts[source] += 1
+            if source != 'timeout':
+                self.times.append(duration)
+    
+    def summary(self):
+        """
+        Summarize the recorded drops.
+        
+        Returns:
+            dict: Drop counts by source and the mean, p50, p95 and maximum
+                  of the recent confirmed drop times in seconds
+        """
+        with self.lock:
+            times = sorted(self.times.values())
+            counts = dict(self.counts)
+        
+        def percentile(fraction):
+            return round(times[min(int(len(times) * fraction), len(times) - 1)], 3) if times else None
+        
+        return {
+            'drops': sum(counts.values()),
+            'confirmed_by': counts,
+            'mean_sec': round(sum(times) / len(times), 3) if times else None,
+            'p50_sec': percentile(0.50),
+            'p95_sec': percentile(0.95),
+            'max_sec': round(times[-1], 3) if times else None
+        }
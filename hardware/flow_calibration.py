@@ -0,0 +1,343 @@
+"""
+Flow sensor calibration learned from weighed pours.
+"""
+import os
+import json
+import math
+import bisect
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+class FlowCalibrationCurve:
+    """
+    Volume per flow sensor pulse as a function of the pulse frequency.
+    
+    Paddle flow sensors slip at low flow and over-spin at high flow, so
+    the volume of a pulse depends on how fast the pulses come. The curve
+    holds the volume per pulse at fixed frequencies and interpolates
+    linearly between them, clamping outside the range.
+    
+    A pour's pulses are binned onto the neighbouring points with the
+    interpolation weights, which makes the pour's volume a linear function
+    of the point values. Each weighed pour then corrects the points with a
+    Kalman update, so every point learns from the pulses counted at and
+    around its frequency. A small drift added before each update lets the
+    curve follow slow changes such as keg pressure and line temperature.
+    """
+    
+    def __init__(self, frequencies, nominal_ml_per_pulse, initial_std=0.1, correlation=0.7,
+                 drift_per_pour=0.005):
+        """
+        Initialize an uncalibrated curve.
+        
+        Args:
+            frequencies (sequence): Ascending pulse frequencies in Hz the curve is learned at
+            nominal_ml_per_pulse (float): Datasheet volume per pulse
+            initial_std (float): Relative uncertainty of the nominal volume per pulse
+            correlation (float): Prior correlation of neighbouring points (0-1)
+            drift_per_pour (float): Relative random walk of each point per pour
+        """
+        self.frequencies = [float(f) for f in frequencies]
+        self.nominal_ml_per_pulse = nominal_ml_per_pulse
+        self.drift_var = (drift_per_pour * nominal_ml_per_pulse) ** 2
+        
+        size = len(self.frequencies)
+        variance = (initial_std * nominal_ml_per_pulse) ** 2
+        self.values = [nominal_ml_per_pulse] * size
+        self.covariance = [[variance * correlation ** abs(i - j) for j in range(size)] for i in range(size)]
+        self.pours = 0
+    
+    def _weights(self, frequency):
+        """
+        Get the interpolation weights of a frequency.
+        
+        Returns:
+            tuple: (index, fraction) with the weight 1 - fraction on the point
+                   at index and fraction on the point after it
+        """
+        if frequency <= self.frequencies[0]:
+            return 0, 0.0
+        if frequency >= self.frequencies[-1]:
+            return len(self.frequencies) - 1, 0.0
+        index = bisect.bisect_right(self.frequencies, frequency) - 1
+        low, high = self.frequencies[index], self.frequencies[index + 1]
+        return index, (frequency - low) / (high - low)
+    
+    def ml_per_pulse(self, frequency):
+        """
+        Get the calibrated volume of a pulse.
+        
+        Args:
+            frequency (float): Current pulse frequency in Hz
+        
+        Returns:
+            float: Volume per pulse in ml
+        """
+        index, fraction = self._weights(frequency)
+        values = self.values
+        if fraction == 0.0:
+            return values[index]
+        return values[index] + fraction * (values[index + 1] - values[index])
+    
+    def relative_std(self, frequency):
+        """
+        Get the relative uncertainty of the volume per pulse at a frequency.
+        
+        Args:
+            frequency (float): Pulse frequency in Hz
+        
+        Returns:
+            float: One standard deviation as a fraction of the volume per pulse
+        """
+        index, fraction = self._weights(frequency)
+        weights = {index: 1.0 - fraction}
+        if fraction:
+            weights[index + 1] = fraction
+        variance = sum(wi * wj * self.covariance[i][j]
+                       for i, wi in weights.items() for j, wj in weights.items())
+        return math.sqrt(max(variance, 0.0)) / self.ml_per_pulse(frequency)
+    
+    def new_features(self):
+        """
+        Start collecting the pulses of a pour.
+        
+        Returns:
+            list: Pulse count binned onto each point, all zero
+        """
+        return [0.0] * len(self.frequencies)
+    
+    def add_pulse(self, features, frequency, count=1):
+        """
+        Bin pulses onto the points around their frequency.
+        
+        Args:
+            features (list): Pulse counts of the pour from new_features()
+            frequency (float): Pulse frequency when the pulses arrived
+            count (int): Number of pulses
+        """
+        index, fraction = self._weights(frequency)
+        features[index] += count * (1.0 - fraction)
+        if fraction:
+            features[index + 1] += count * fraction
+    
+    def predict(self, features):
+        """
+        Get the volume of a pour's pulses according to the curve.
+        
+        Args:
+            features (list): Pulse counts of the pour
+        
+        Returns:
+            float: Volume in ml
+        """
+        return sum(f * v for f, v in zip(features, self.values))
+    
+    def update(self, features, measured_ml, noise_ml):
+        """
+        Correct the curve with a weighed pour.
+        
+        Args:
+            features (list): Pulse counts of the pour
+            measured_ml (float): Volume weighed in the cup
+            noise_ml (float): Standard deviation of the weighed volume
+        
+        Returns:
+            float: Weighed minus predicted volume before the update, in ml
+        """
+        size = len(self.values)
+        covariance = [row[:] for row in self.covariance]
+        for i in range(size):
+            covariance[i][i] += self.drift_var
+        
+        # Kalman update for the measurement model features . values
+        pf = [sum(covariance[i][j] * features[j] for j in range(size)) for i in range(size)]
+        innovation_var = sum(features[i] * pf[i] for i in range(size)) + noise_ml ** 2
+        innovation = measured_ml - self.predict(features)
+        gain = [p / innovation_var for p in pf]
+        
+        low, high = 0.5 * self.nominal_ml_per_pulse, 2.0 * self.nominal_ml_per_pulse
+        values = [min(max(v + g * innovation, low), high) for v, g in zip(self.values, gain)]
+        for i in range(size):
+            for j in range(size):
+                covariance[i][j] -= gain[i] * pf[j]
+        
+        # Replaced whole so the flow callbacks never see a half-updated curve
+        self.values = values
+        self.covariance = covariance
+        self.pours += 1
+        return innovation
+    
+    def to_dict(self):
+        """
+        Get the learned state for saving.
+        
+        Returns:
+            dict: Frequencies, point values, covariance and learned pour count
+        """
+        return {
+            'frequencies_hz': self.frequencies,
+            'ml_per_pulse': self.values,
+            'covariance': self.covariance,
+            'pours': self.pours
+        }
+    
+    def restore(self, state):
+        """
+        Take over a saved state learned at the same frequencies.
+        
+        Args:
+            state (dict): Output of to_dict()
+        
+        Returns:
+            bool: True if the state was restored
+        """
+        if [float(f) for f in state['frequencies_hz']] != self.frequencies:
+            return False
+        self.covariance = [list(row) for row in state['covariance']]
+        self.values = list(state['ml_per_pulse'])
+        self.pours = state['pours']
+        return True
+
+
+class FlowCalibration:
+    """
+    Flow calibration curves of every tap, persisted to a JSON file.
+    
+    The file is read once at startup and written every few learned pours
+    and on cleanup, so learning does not cost a disk write per pour.
+    """
+    
+    def __init__(self, beverages, path, settings):
+        """
+        Initialize uncalibrated curves.
+        
+        Args:
+            beverages (iterable): Beverage types with their own tap and flow sensor
+            path (str): JSON file holding the learned curves, or None to keep them in memory
+            settings (dict): FLOW_CALIBRATION_SETTINGS
+        """
+        self.path = path
+        self.min_pour_ml = settings['MIN_POUR_ML']
+        self.max_error_fraction = settings['MAX_ERROR_FRACTION']
+        self.save_every = settings['SAVE_EVERY_POURS']
+        self.curves = {
+            beverage: FlowCalibrationCurve(
+                settings['FREQUENCY_POINTS_HZ'],
+                settings['NOMINAL_ML_PER_PULSE'],
+                initial_std=settings['INITIAL_STD'],
+                correlation=settings['POINT_CORRELATION'],
+                drift_per_pour=settings['DRIFT_PER_POUR']
+            )
+            for beverage in beverages
+        }
+        self.unsaved = 0
+        self.lock = threading.Lock()
+    
+    def curve(self, beverage):
+        """
+        Get a tap's calibration curve.
+        
+        Args:
+            beverage (str): Beverage type of the tap
+        
+        Returns:
+            FlowCalibrationCurve: The curve, updated in place as pours are learned
+        """
+        return self.curves[beverage]
+    
+    def load(self):
+        """Read the learned curves from the calibration file."""
+        if self.path is None:
+            return
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            logger.info(f"No flow calibration at {self.path}, using the nominal ml per pulse")
+            return
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to read flow calibration {self.path}: {e}")
+            return
+        
+        with self.lock:
+            for beverage, curve_state in state.items():
+                if beverage not in self.curves:
+                    continue
+                try:
+                    restored = self.curves[beverage].restore(curve_state)
+                except (KeyError, TypeError) as e:
+                    logger.error(f"Invalid {beverage} flow calibration in {self.path}: {e}")
+                    continue
+                if not restored:
+                    logger.warning(f"{beverage} flow calibration was learned at other frequencies, starting over")
+        logger.info(f"Flow calibration loaded from {self.path}")
+    
+    def save(self):
+        """Write the learned curves, replacing the file atomically."""
+        with self.lock:
+            state = {beverage: curve.to_dict() for beverage, curve in self.curves.items()}
+            self.unsaved = 0
+        if self.path is None:
+            return
+        
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            temp_path = self.path + '.tmp'
+            with open(temp_path, 'w') as f:
+                json.dump(state, f)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.error(f"Failed to save flow calibration {self.path}: {e}")
+    
+    def record_pour(self, beverage, features, measured_ml, noise_ml):
+        """
+        Learn from a weighed pour.
+        
+        Args:
+            beverage (str): Beverage type of the tap
+            features (list): The pour's pulse counts binned by the tap's curve
+            measured_ml (float): Volume weighed in the cup
+            noise_ml (float): Standard deviation of the weighed volume
+        
+        Returns:
+            bool: True if the pour was learned from
+        """
+        curve = self.curves[beverage]
+        if measured_ml < self.min_pour_ml or not any(features):
+            return False
+        
+        with self.lock:
+            predicted = curve.predict(features)
+            if abs(measured_ml - predicted) > self.max_error_fraction * predicted:
+                logger.warning(f"Ignoring {beverage} pour for flow calibration: weighed {measured_ml:.0f}ml, "
+                               f"pulses say {predicted:.0f}ml")
+                return False
+            error = curve.update(features, measured_ml, noise_ml)
+            self.unsaved += 1
+            save = self.unsaved >= self.save_every
+        
+        logger.debug(f"{beverage} flow calibration learned a pour {error:+.1f}ml off")
+        if save:
+            self.save()
+        return True
+    
+    def get_status(self):
+        """
+        Get the learned curves.
+        
+        Returns:
+            dict: Maps each beverage to its learned pour count and ml per pulse at each frequency
+        """
+        with self.lock:
+            return {
+                beverage: {
+                    'pours': curve.pours,
+                    'ml_per_pulse': {f"{frequency:g}": round(value, 4)
+                                     for frequency, value in zip(curve.frequencies, curve.values)}
+                }
+                for beverage, curve in self.curves.items()
+            }
@@ -0,0 +1,97 @@
+"""
+Live flow-rate estimation and valve close compensation for pours.
+"""
+from hardware.ring_buffer import RingBuffer
+
+
+class FlowRateEstimator:
+    """Estimates the current flow rate from recent flow sensor pulse times."""
+    
+    def __init__(self, window=16):
+        """
+        Initialize the estimator.
+        
+        Args:
+            window (int): Number of most recent pulse timestamps to keep
+        """
+        self.timestamps = RingBuffer(window)
+    
+    def add_pulse(self, timestamp):
+        """
+        Record a flow sensor pulse.
+        
+        Args:
+            timestamp (float): Monotonic time of the pulse in seconds
+        """
+        self.timestamps.append(timestamp)
+    
+    def pulses_per_second(self, now=None):
+        """
+        Get the current flow rate.
+        
+        The rate decays towards zero when pulses stop arriving because the
+        window is measured up to ``now`` rather than to the newest pulse.
+        
+        Args:
+            now (float, optional): Current monotonic time, defaults to the newest pulse
+        
+        Returns:
+            float: Flow rate in pulses per second, 0 if not enough pulses yet
+        """
+        if len(self.timestamps) < 2:
+            return 0.0
+        
+        oldest = self.timestamps.oldest()
+        end = self.timestamps.newest() if now is None else max(now, self.timestamps.newest())
+        if end <= oldest:
+            return 0.0
+        return (len(self.timestamps) - 1) / (end - oldest)
+    
+    def reset(self):
+        """Forget all recorded pulses."""
+        self.timestamps.clear()
+
+
+class ValveCloseModel:
+    """Learns how long a valve keeps flowing after it is commanded shut."""
+    
+    def __init__(self, initial_latency=0.05, smoothing=0.3, max_latency=0.5):
+        """
+        Initialize the close model.
+        
+        Args:
+            initial_latency (float): Close latency in seconds before any pour is observed
+            smoothing (float): Weight of the newest observation (0-1)
+            max_latency (float): Upper bound for the learned latency in seconds
+        """
+        self.latency = initial_latency
+        self.smoothing = smoothing
+        self.max_latency = max_latency
+        self.observations = 0
+    
+    def lead_pulses(self, pulses_per_second):
+        """
+        Get how many pulses will still arrive if the valve is closed now.
+        
+        Args:
+            pulses_per_second (float): Current flow rate
+        
+        Returns:
+            float: Expected pulses after the close command
+        """
+        return pulses_per_second * self.latency
+    
+    def record_close(self, pulses_per_second, overshoot_pulses):
+        """
+        Update the latency from an observed close.
+        
+        Args:
+            pulses_per_second (float): Flow rate when the close was commanded
+            overshoot_pulses (int): Pulses counted after the close command
+        """
+        if pulses_per_second <= 0:
+            return
+        
+        observed = min(max(overshoot_pulses / pulses_per_second, 0.0), self.max_latency)
+        self.latency += self.smoothing * (observed - self.latency)
+        self.observations += 1
@@ -3,16 +3,32 @@ Mock implementations of hardware components for simulation purposes.
 This module provides mock versions of hardware interfaces
 that can be used without actual Raspberry Pi hardware.
 """
+import os
 import time
 import random
+import shutil
 import logging
+import tempfile
 import threading
+import mock_gpio
+from hardware.valve import ValveDriver
+from hardware.cup_drop import DropStatistics
+from hardware.ring_buffer import RingBuffer
+from hardware.volume_estimator import VolumeEstimator
+from hardware.sensor_bus import SensorBus
+from hardware.temperature import TemperatureSampler
+from hardware.timeseries import TelemetryStore
 from config import (
+    GPIO_PINS,
     BEVERAGE_TYPES,
     BEVERAGE_POUR_SETTINGS,
-    BEER_POUR_SETTINGS,
+    BEVERAGE_TAPS,
     CUP_SETTINGS,
-    DELIVERY_SETTINGS
+    DELIVERY_SETTINGS,
+    WEIGHT_SENSOR_SETTINGS,
+    MONITOR_SETTINGS,
+    TEMPERATURE_SETTINGS,
+    TELEMETRY_SETTINGS
 )
 
 logger = logging.getLogger(__name__)
@@ -24,6 +40,12 @@ class MockCupDispenser:
         """Initialize the mock cup dispenser."""
         self.initialized = False
         self.servo_angle = 0
+        self.sensor_bus = None
+        self.drop_stats = DropStatistics(CUP_SETTINGS['DROP_HISTORY'])
+        self.abort_event = threading.Event()
+        # Pour position as reported on the bus
+        self.position_occupied = False
+        self.position_condition = threading.Condition()
         logger.debug("Mock cup dispenser initialized")
     
     def initialize(self):
@@ -31,23 +53,70 @@ class MockCupDispenser:
         self.initialized = True
         return True
     
+    def set_sensor_bus(self, sensor_bus):
+        """
+        Report cups reaching the pour position on the system sensor bus.
+        
+        The mock confirms its drops itself, but publishes 'cup_present' for
+        the cups it positions as the real position sensor would.
+        """
+        self.sensor_bus = sensor_bus
+        sensor_bus.subscribe('cup_present', self._on_cup_presence)
+    
+    def _on_cup_presence(self, channel, present, timestamp):
+        """Bus subscriber tracking whether the pour position is occupied."""
+        with self.position_condition:
+            self.position_occupied = present
+            self.position_condition.notify_all()
+    
+    def get_drop_stats(self):
+        """Get the distribution of recent cup drop times."""
+        return self.drop_stats.summary()
+    
     def dispense_cup(self):
-        """Simulate dispensing a cup."""
+        """Simulate dispensing a cup, done as soon as the drop is confirmed."""
         if not self.initialized:
             logger.error("Cup dispenser not initialized")
             return False
         
-        # Simulate dispensing time
-        time.sleep(CUP_SETTINGS['DISPENSE_DELAY_SEC'])
-        
-        # Simulate success rate (90% success)
+        # Simulate success rate (90% success); a jammed cup waits out the timeout
+        self.abort_event.clear()
         success = random.random() < 0.9
-        if success:
-            logger.debug("Cup dispensed successfully")
-        else:
+        delay = CUP_SETTINGS['DISPENSE_DELAY_SEC']
+        drop_time = random.uniform(0.3, 1.0) if success else delay
+        if self.abort_event.wait(drop_time):
+            logger.warning("Cup dispensing aborted")
+            return False
+        self.drop_stats.record(drop_time, 'position' if success else 'timeout')
+        
+        if not success:
             logger.error("Failed to dispense cup")
+            return False
         
-        return success
+        # Like the driver, move the cup in only once the previous one has left
+        with self.position_condition:
+            cleared = self.position_condition.wait_for(
+                lambda: not self.position_occupied or self.abort_event.is_set(),
+                CUP_SETTINGS['POSITION_CLEAR_TIMEOUT_SEC']
+            )
+        if self.abort_event.is_set():
+            logger.warning("Cup dispensing aborted")
+            return False
+        if not cleared:
+            logger.error("Pour position still occupied")
+            return False
+        
+        if self.sensor_bus is not None:
+            self.sensor_bus.publish('cup_present', True)
+        logger.debug("Cup dispensed successfully")
+        return True
+    
+    def abort_dispense(self):
+        """Simulate stopping a dispense in progress; it returns False."""
+        self.abort_event.set()
+        with self.position_condition:
+            self.position_condition.notify_all()
+        self._set_servo_angle(0)
     
     def _set_servo_angle(self, angle):
         """Simulate setting servo angle."""
@@ -61,158 +130,295 @@ class MockCupDispenser:
         return True
 
 
-class MockBeerDispenser:
-    """Mock implementation of beverage dispenser hardware."""
+class MockTapChannel:
+    """Mock implementation of one line of the valve manifold."""
     
-    def __init__(self):
-        """Initialize the mock beverage dispenser."""
-        self.initialized = False
-        self.valve_open = {
-            'beer': False,
-            'kofola': False,
-            'birel': False
-        }
+    def __init__(self, beverage_type):
+        """
+        Initialize the mock tap channel.
+        
+        Args:
+            beverage_type (str): Beverage served by this tap ('beer', 'kofola' or 'birel')
+        """
+        self.beverage_type = beverage_type
+        self.settings = BEVERAGE_POUR_SETTINGS[beverage_type]
+        # PWM valve driver on the simulated GPIO
+        self.valve = ValveDriver(GPIO_PINS[BEVERAGE_TAPS[beverage_type]['VALVE']], mock_gpio)
         self.pouring = False
         self.flow_count = 0
-        self.current_beverage = 'beer'  # Default beverage type
-        self.pour_thread = None
         self.stop_pouring = False
-        logger.debug("Mock beer dispenser initialized")
+        self.pour_lock = threading.Lock()
+        self.weight_sensor = None
+        # Simulated pulses come at about 1.1 per ml
+        self.volume_estimator = VolumeEstimator(1 / 1.1)
     
     def initialize(self):
-        """Set up the mock beverage dispenser."""
-        self.initialized = True
-        return True
+        """Set up the mock tap."""
+        self.valve.initialize()
     
     def _flow_sensor_callback(self, channel):
         """Simulate flow sensor pulse."""
         self.flow_count += 1
     
-    def pour_beer(self, volume_ml=None, beverage_type=None):
+    def pour(self, volume_ml=None):
         """
-        Simulate pouring a beverage.
+        Simulate pouring from this tap, blocking until the pour is done.
         
         Args:
             volume_ml (float, optional): Volume to pour in milliliters.
-            beverage_type (str, optional): Type of beverage to pour ('beer', 'kofola', or 'birel').
         
         Returns:
-            bool: True if pouring started successfully, False otherwise
+            bool: True if the beverage was poured, False otherwise
         """
-        if not self.initialized:
-            logger.error("Beverage dispenser not initialized")
-            return False
-        
-        if self.pouring:
-            logger.error("Already pouring a beverage")
+        if not self.pour_lock.acquire(blocking=False):
+            logger.error(f"Tap {self.beverage_type} is already pouring")
             return False
         
-        # Set current beverage type
-        if beverage_type and beverage_type in BEVERAGE_TYPES:
-            self.current_beverage = beverage_type
-        
-        # Get settings for the current beverage
-        settings = BEVERAGE_POUR_SETTINGS[self.current_beverage]
-        
-        # Use specified volume or default
-        volume = volume_ml if volume_ml is not None else settings['DEFAULT_VOLUME_ML']
-        
-        # Reset flow count and set pouring state
-        self.flow_count = 0
-        self.pouring = True
-        self.stop_pouring = False
-        
-        # Create thread to simulate pouring
-        self.pour_thread = threading.Thread(target=self._pour_simulation, args=(volume,))
-        self.pour_thread.daemon = True
-        self.pour_thread.start()
-        
-        # Simulate success rate (95% success)
-        success = random.random() < 0.95
-        
-        if not success:
-            self.stop_pour()
-            logger.error(f"Failed to start {settings['NAME']} pour")
-        else:
-            logger.debug(f"Pouring {volume}ml of {settings['NAME']}")
-        
-        return success
+        try:
+            # Use specified volume or default
+            volume = volume_ml if volume_ml is not None else self.settings['DEFAULT_VOLUME_ML']
+            
+            # Simulate success rate (95% success)
+            if random.random() >= 0.95:
+                logger.error(f"Failed to start {self.settings['NAME']} pour")
+                return False
+            
+            # Pouring by weight stops at the net cup weight, leaving less foam margin
+            if self.settings['POUR_MODE'] == 'weight' and self.weight_sensor is not None:
+                volume -= self.settings['WEIGHT_HEADSPACE_ML']
+            
+            # Reset flow count and set pouring state
+            self.flow_count = 0
+            self.volume_estimator.reset()
+            self.pouring = True
+            self.stop_pouring = False
+            logger.debug(f"Pouring {volume}ml of {self.settings['NAME']}")
+            
+            return self._pour_simulation(volume)
+        finally:
+            self.pour_lock.release()
     
     def _pour_simulation(self, volume):
-        """Simulate the pouring process in a separate thread."""
-        # Get settings for the current beverage
-        settings = BEVERAGE_POUR_SETTINGS[self.current_beverage]
-        
+        """Simulate the pouring process."""
         # Simulate valve opening
-        self.valve_open[self.current_beverage] = True
+        self.valve.open()
         
-        # Calculate pour time based on volume and flow rate
-        flow_rate = settings['FLOW_RATE_ML_PER_SEC']
-        pour_time = volume / flow_rate
-        
-        # Simulate slow pour for foam control
-        slow_threshold = volume * settings['SLOW_POUR_THRESHOLD']
-        slow_rate = settings['SLOW_POUR_RATE']
+        # Flow follows the valve duty cycle, so the slow pour uses the real PWM ramp
+        flow_rate = self.settings['FLOW_RATE_ML_PER_SEC']
+        slow_threshold = volume * self.settings['SLOW_POUR_THRESHOLD']
+        slow_pour_started = False
         
         start_time = time.time()
+        last_time = start_time
         elapsed = 0
         poured = 0
         
         # Simulation loop
         while poured < volume and not self.stop_pouring:
-            elapsed = time.time() - start_time
+            now = time.time()
+            elapsed = now - start_time
+            poured += (now - last_time) * flow_rate * self.valve.duty_cycle / 100.0
+            last_time = now
             
-            # Calculate amount poured so far
-            if poured < slow_threshold:
-                # Normal flow rate
-                poured = elapsed * flow_rate
-            else:
-                # Slow pour rate for foam control
-                normal_pour_time = slow_threshold / flow_rate
-                slow_pour_elapsed = elapsed - normal_pour_time
-                poured = slow_threshold + (slow_pour_elapsed * flow_rate * slow_rate)
+            # Switch to slow pour for foam control
+            if not slow_pour_started and poured >= slow_threshold:
+                self._start_slow_pour()
+                slow_pour_started = True
             
             # Simulate flow sensor pulses
             pulses_per_ml = random.uniform(1.0, 1.2)  # Simulate some variability
-            self.flow_count = int(poured * pulses_per_ml)
+            new_pulses = max(int(poured * pulses_per_ml) - self.flow_count, 0)
+            self.flow_count += new_pulses
+            self.volume_estimator.add_pulses(new_pulses, time.monotonic())
+            if self.weight_sensor is not None and self.settings['POUR_MODE'] == 'weight':
+                self.volume_estimator.add_weight(poured, 0.0, time.monotonic())
             
             # Sleep a short time to reduce CPU usage
             time.sleep(0.1)
         
         # Pouring complete or stopped
-        self.valve_open[self.current_beverage] = False
+        self.valve.close()
         self.pouring = False
         
         if not self.stop_pouring:
             logger.debug(f"Pour complete: {poured:.1f}ml in {elapsed:.1f} seconds")
-        else:
-            logger.debug(f"Pour stopped: {poured:.1f}ml in {elapsed:.1f} seconds")
+            return True
+        
+        logger.debug(f"Pour stopped: {poured:.1f}ml in {elapsed:.1f} seconds")
+        return False
+    
+    def get_volume_estimate(self):
+        """Get the estimated volume in the cup under this tap."""
+        volume, uncertainty = self.volume_estimator.estimate()
+        return {
+            'pouring': self.pouring,
+            'volume_ml': round(volume, 1),
+            'uncertainty_ml': round(uncertainty, 1),
+            'ml_per_pulse': round(self.volume_estimator.ml_per_pulse, 3)
+        }
     
     def _start_slow_pour(self):
         """Simulate switching to slow pour mode."""
-        logger.debug("Switching to slow pour mode")
+        self.valve.ramp_to(self.settings['SLOW_POUR_RATE'] * 100)
+        logger.debug(f"Switching {self.beverage_type} tap to slow pour mode")
     
     def stop_pour(self):
-        """Simulate emergency stop for pouring."""
-        if self.pouring:
-            self.stop_pouring = True
-            logger.debug(f"{BEVERAGE_POUR_SETTINGS[self.current_beverage]['NAME']} pour stopped")
-            if self.pour_thread and self.pour_thread.is_alive():
-                self.pour_thread.join(1.0)  # Wait for pour thread to finish
-            self.valve_open[self.current_beverage] = False
-            self.pouring = False
-            return True
-        return False
+        """
+        Simulate emergency stop for this tap.
+        
+        Returns:
+            bool: True if a pour was stopped, False if the tap was idle
+        """
+        if not self.pouring:
+            return False
+        
+        self.stop_pouring = True
+        self.valve.close()
+        return True
+    
+    def cleanup(self):
+        """Release mock resources."""
+        self.stop_pour()
+        self.valve.cleanup()
+
+
+class MockBeerDispenser:
+    """Mock implementation of the beverage valve manifold."""
+    
+    def __init__(self):
+        """Initialize the mock beverage dispenser."""
+        self.initialized = False
+        self.taps = {beverage: MockTapChannel(beverage) for beverage in BEVERAGE_TYPES}
+        self.current_beverage = 'beer'  # Default beverage type
+        self.sensor_bus = None
+        self.w1_path = None
+        self.temperature_sampler = None
+        logger.debug("Mock beer dispenser initialized")
+    
+    @property
+    def pouring(self):
+        """bool: True while any tap is pouring."""
+        return any(tap.pouring for tap in self.taps.values())
+    
+    def set_weight_sensor(self, weight_sensor):
+        """Use a scale under the pour position for taps that pour by weight."""
+        for tap in self.taps.values():
+            tap.weight_sensor = weight_sensor
+    
+    def set_sensor_bus(self, sensor_bus):
+        """Accept the system sensor bus; the mock taps have no level sensors to publish."""
+        self.sensor_bus = sensor_bus
+        if self.temperature_sampler is not None:
+            self.temperature_sampler.sensor_bus = sensor_bus
+    
+    def get_volume_estimates(self):
+        """Get the estimated volume in the cup for every tap."""
+        return {beverage: tap.get_volume_estimate() for beverage, tap in self.taps.items()}
+    
+    @property
+    def valve_open(self):
+        """dict: Whether each beverage valve is currently open."""
+        return {beverage: tap.valve.is_open for beverage, tap in self.taps.items()}
+    
+    def initialize(self):
+        """Set up the mock beverage dispenser."""
+        for tap in self.taps.values():
+            tap.initialize()
+        self._start_temperature_simulation()
+        self.initialized = True
+        return True
+    
+    def _start_temperature_simulation(self):
+        """Sample line temperatures from a fake 1-Wire sysfs tree."""
+        if self.temperature_sampler is not None:
+            return
+        
+        self.w1_path = tempfile.mkdtemp(prefix='mock_w1_')
+        sensor_ids = {}
+        for beverage in BEVERAGE_TYPES:
+            settings = BEVERAGE_POUR_SETTINGS[beverage]
+            device = f"28-mock{beverage}"
+            os.makedirs(os.path.join(self.w1_path, device))
+            temp = random.uniform(settings['TEMPERATURE_MIN'], settings['TEMPERATURE_MAX'])
+            with open(os.path.join(self.w1_path, device, 'w1_slave'), 'w') as f:
+                f.write("72 01 4b 46 7f ff 0e 10 57 : crc=57 YES\n")
+                f.write(f"72 01 4b 46 7f ff 0e 10 57 t={int(temp * 1000)}\n")
+            sensor_ids[beverage] = device
+        
+        self.temperature_sampler = TemperatureSampler(
+            sensor_ids,
+            self.w1_path,
+            TEMPERATURE_SETTINGS['SAMPLE_INTERVAL_SEC'],
+            TEMPERATURE_SETTINGS['STALE_AFTER_SEC'],
+            self.sensor_bus
+        )
+        self.temperature_sampler.start()
     
-    def get_beer_temperature(self):
-        """Simulate reading the beverage temperature."""
-        # Get settings for the current beverage
-        settings = BEVERAGE_POUR_SETTINGS[self.current_beverage]
+    def pour_beer(self, volume_ml=None, beverage_type=None):
+        """
+        Simulate pouring a beverage on its tap.
+        
+        Blocks until the pour has finished, like the real manifold. Pours on
+        different taps may run concurrently from separate threads.
         
-        # Generate random temperature between min and max for this beverage
-        temp = random.uniform(settings['TEMPERATURE_MIN'], settings['TEMPERATURE_MAX'])
-        logger.debug(f"Beer temperature: {temp:.1f}°C")
-        return temp
+        Args:
+            volume_ml (float, optional): Volume to pour in milliliters.
+            beverage_type (str, optional): Type of beverage to pour ('beer', 'kofola', or 'birel').
+        
+        Returns:
+            bool: True if the beverage was poured successfully, False otherwise
+        """
+        if not self.initialized:
+            logger.error("Beverage dispenser not initialized")
+            return False
+        
+        beverage = beverage_type or self.current_beverage
+        if beverage not in self.taps:
+            logger.error(f"Unknown beverage type: {beverage}")
+            return False
+        
+        return self.taps[beverage].pour(volume_ml)
+    
+    def stop_pour(self, beverage_type=None):
+        """
+        Simulate emergency stop for pouring.
+        
+        Args:
+            beverage_type (str, optional): Tap to stop, or every tap if None
+        
+        Returns:
+            bool: True if any pour was stopped, False otherwise
+        """
+        taps = [self.taps[beverage_type]] if beverage_type else self.taps.values()
+        stopped = [tap.beverage_type for tap in taps if tap.stop_pour()]
+        if stopped:
+            logger.debug(f"Pour stopped on: {', '.join(stopped)}")
+        return bool(stopped)
+    
+    def get_active_taps(self):
+        """
+        Get the taps that are currently pouring.
+        
+        Returns:
+            list: Beverage types with an open pour
+        """
+        return [beverage for beverage, tap in self.taps.items() if tap.pouring]
+    
+    def get_beer_temperature(self, beverage_type=None):
+        """Get the cached simulated temperature of a beverage line."""
+        if self.temperature_sampler is None:
+            return None
+        
+        reading = self.temperature_sampler.get_reading(beverage_type or self.current_beverage)
+        if reading['stale']:
+            return None
+        return reading['temperature']
+    
+    def get_temperature_readings(self):
+        """Get the cached simulated temperature of every line."""
+        if self.temperature_sampler is None:
+            return {}
+        return self.temperature_sampler.get_readings()
     
     def set_beverage_type(self, beverage_type):
         """
@@ -240,7 +446,12 @@ class MockBeerDispenser:
     
     def cleanup(self):
         """Release mock resources."""
-        self.stop_pour()
+        for tap in self.taps.values():
+            tap.cleanup()
+        if self.temperature_sampler is not None:
+            self.temperature_sampler.stop()
+            self.temperature_sampler = None
+            shutil.rmtree(self.w1_path, ignore_errors=True)
         self.initialized = False
         logger.debug("Beverage dispenser cleaned up")
         return True
@@ -256,6 +467,8 @@ class MockCupDelivery:
         self.conveyor_speed = 0
         self.delivery_thread = None
         self.stop_conveyor_flag = False
+        self.stop_event = threading.Event()
+        self.sensor_bus = None
         logger.debug("Mock cup delivery initialized")
     
     def initialize(self):
@@ -263,6 +476,32 @@ class MockCupDelivery:
         self.initialized = True
         return True
     
+    def set_sensor_bus(self, sensor_bus):
+        """
+        Report cups leaving the pour position on the system sensor bus.
+        
+        On the real machine the cup position sensor sees this by itself.
+        
+        Args:
+            sensor_bus (SensorBus): Bus the system monitor publishes on
+        """
+        self.sensor_bus = sensor_bus
+    
+    def _cup_left_pour_position(self):
+        """Publish that the conveyor has taken the cup off the pour position."""
+        if self.sensor_bus is not None:
+            self.sensor_bus.publish('cup_present', False)
+    
+    def clear_pour_position(self):
+        """
+        Simulate an attendant taking an abandoned cup off the pour position.
+        
+        The controller calls this when a job fails or is stopped with its
+        cup still in place, which on the real machine needs a person.
+        """
+        logger.debug("Abandoned cup removed from the pour position")
+        self._cup_left_pour_position()
+    
     def deliver_cup(self):
         """Simulate moving a filled cup to the pickup location."""
         if not self.initialized:
@@ -277,8 +516,12 @@ class MockCupDelivery:
         speed = DELIVERY_SETTINGS['CONVEYOR_SPEED']
         timeout = DELIVERY_SETTINGS['DELIVERY_TIMEOUT_SEC']
         
-        # Start simulated delivery
+        # Start simulated delivery and wait for the cup to arrive, like the real conveyor
         result = self.move_conveyor(speed, timeout)
+        if result:
+            self._cup_left_pour_position()
+            self.delivery_thread.join()
+            result = not self.stop_conveyor_flag
         
         if result:
             logger.debug("Cup delivered successfully")
@@ -302,6 +545,7 @@ class MockCupDelivery:
         
         # Reset stop flag
         self.stop_conveyor_flag = False
+        self.stop_event = threading.Event()
         self.conveyor_running = True
         self.conveyor_speed = actual_speed
         
@@ -327,8 +571,7 @@ class MockCupDelivery:
     
     def _timed_conveyor_run(self, duration):
         """Simulate running the conveyor for a specific duration."""
-        time.sleep(duration)
-        if not self.stop_conveyor_flag:
+        if not self.stop_event.wait(duration):
             self.conveyor_running = False
             self.conveyor_speed = 0
             logger.debug(f"Conveyor stopped after {duration} seconds")
@@ -337,6 +580,7 @@ class MockCupDelivery:
         """Simulate stopping the conveyor."""
         if self.conveyor_running:
             self.stop_conveyor_flag = True
+            self.stop_event.set()
             self.conveyor_running = False
             self.conveyor_speed = 0
             logger.debug("Conveyor stopped")
@@ -352,20 +596,38 @@ class MockCupDelivery:
 
 
 class MockWeightSensor:
-    """Mock implementation of weight sensor hardware."""
+    """Mock implementation of weight sensor hardware with a background sampler."""
     
-    def __init__(self):
+    def __init__(self, sensor_bus=None):
         """Initialize the mock weight sensor."""
+        self.sensor_bus = sensor_bus
         self.initialized = False
         self.tare_value = 0.0
         self.simulated_weight = 0.0
+        self.sample_rate = WEIGHT_SENSOR_SETTINGS['SAMPLE_RATE_SPS']
+        self.filter_window = WEIGHT_SENSOR_SETTINGS['FILTER_WINDOW']
+        self.filter_trim = WEIGHT_SENSOR_SETTINGS['FILTER_TRIM']
+        self.samples = RingBuffer(WEIGHT_SENSOR_SETTINGS['BUFFER_SIZE'])
+        self.sample_count = 0
+        self.filtered_value = None
+        self.last_sample_time = 0
+        self.sample_condition = threading.Condition()
+        self.stop_event = threading.Event()
+        self.sampler_thread = None
         logger.debug("Mock weight sensor initialized")
     
     def initialize(self):
-        """Set up the mock weight sensor."""
+        """Set up the mock weight sensor and start sampling."""
+        if self.initialized:
+            return True
+        
         self.initialized = True
         # Set a random small tare value
         self.tare_value = random.uniform(0, 5)
+        
+        self.stop_event.clear()
+        self.sampler_thread = threading.Thread(target=self._sampler_loop, daemon=True)
+        self.sampler_thread.start()
         return True
     
     def _read_raw_value(self):
@@ -374,18 +636,62 @@ class MockWeightSensor:
         noise = random.uniform(-2, 2)
         return self.simulated_weight + self.tare_value + noise
     
+    def _sampler_loop(self):
+        """Simulate conversions arriving at the configured sample rate."""
+        while not self.stop_event.wait(1.0 / self.sample_rate):
+            raw = self._read_raw_value()
+            with self.sample_condition:
+                self.samples.append(raw)
+                self.sample_count += 1
+                self.filtered_value = self.samples.trimmed_mean(self.filter_window, self.filter_trim)
+                self.last_sample_time = time.time()
+                self.sample_condition.notify_all()
+            
+            if self.sensor_bus is not None:
+                self.sensor_bus.publish('weight', self.filtered_value * 0.1, self.last_sample_time)
+    
     def get_weight(self):
-        """Simulate getting the current weight reading in grams."""
+        """Simulate getting the current filtered weight reading in grams."""
         if not self.initialized:
             logger.error("Weight sensor not initialized")
             return None
         
-        raw = self._read_raw_value()
+        value = self.filtered_value
+        if value is None:
+            return None
+        
         # Simulate calibration factor
-        weight = raw * 0.1
+        return value * 0.1
+    
+    @property
+    def filter_delay(self):
+        """float: Seconds the filtered weight lags behind the load on the scale."""
+        return (0.5 + (self.filter_window - 1) / 2.0) / self.sample_rate
+    
+    def wait_for_sample(self, last_count, timeout=None):
+        """Block until a sample newer than last_count arrives; returns the sample count."""
+        with self.sample_condition:
+            self.sample_condition.wait_for(lambda: self.sample_count > last_count, timeout=timeout)
+            return self.sample_count
+    
+    def get_settled_weight(self, samples=None):
+        """Simulate weighing the load using samples taken after the call."""
+        if not self.initialized:
+            logger.error("Weight sensor not initialized")
+            return None
         
-        logger.debug(f"Weight reading: {weight:.1f}g")
-        return weight
+        samples = samples or WEIGHT_SENSOR_SETTINGS['CUP_TARE_SAMPLES']
+        with self.sample_condition:
+            target = self.sample_count + samples
+            if not self.sample_condition.wait_for(lambda: self.sample_count >= target,
+                                                  timeout=2.0 * samples / self.sample_rate + 1.0):
+                return None
+            return self.samples.trimmed_mean(samples) * 0.1
+    
+    def get_raw_samples(self, n=None):
+        """Get the newest simulated raw samples, oldest first."""
+        with self.sample_condition:
+            return self.samples.values(n)
     
     def tare(self):
         """Simulate taring the scale."""
@@ -399,26 +705,47 @@ class MockWeightSensor:
         return True
     
     def cleanup(self):
-        """Release mock resources."""
+        """Stop sampling and release mock resources."""
+        self.stop_event.set()
+        if self.sampler_thread and self.sampler_thread.is_alive():
+            self.sampler_thread.join(timeout=2.0)
         self.initialized = False
         logger.debug("Weight sensor cleaned up")
         return True
 
 
 class MockSystemMonitor:
-    """Mock implementation of system monitoring."""
+    """Mock implementation of system monitoring with a sensor bus."""
     
     def __init__(self):
         """Initialize the mock system monitoring."""
         self.monitoring = False
         self.monitor_thread = None
         self.stop_monitoring_flag = False
+        self.sensor_bus = SensorBus()
         self.sensor_data = {
             'cup_present': False,
             'weight': 0,
+            'beer_temperature': 0,
             'last_update': time.time()
         }
-        self.weight_sensor = MockWeightSensor()
+        self.data_lock = threading.Lock()
+        self.simulated_cup_present = False
+        self.weight_sensor = MockWeightSensor(self.sensor_bus)
+        
+        # Keep the snapshot for get_sensor_data current from the bus
+        self.sensor_bus.subscribe('weight', self._record_reading,
+                                  min_change=MONITOR_SETTINGS['WEIGHT_CHANGE_G'])
+        self.sensor_bus.subscribe('cup_present', self._record_reading)
+        self.sensor_bus.subscribe('beer_temperature', self._record_reading,
+                                  min_change=MONITOR_SETTINGS['TEMPERATURE_CHANGE_C'])
+        
+        # Keep every reading in the history, not just the snapshot
+        self.telemetry = TelemetryStore(TELEMETRY_SETTINGS['CHANNELS'],
+                                        TELEMETRY_SETTINGS['RAW_SAMPLES'],
+                                        TELEMETRY_SETTINGS['TIERS'])
+        for channel in self.telemetry.channels:
+            self.sensor_bus.subscribe(channel, self._record_history)
         logger.debug("Mock system monitor initialized")
     
     def start_monitoring(self, interval=1.0):
@@ -434,6 +761,7 @@ class MockSystemMonitor:
         # Reset stop flag
         self.stop_monitoring_flag = False
         self.monitoring = True
+        self.sensor_bus.publish('cup_present', self.simulated_cup_present)
         
         # Start monitoring thread
         self.monitor_thread = threading.Thread(
@@ -446,32 +774,48 @@ class MockSystemMonitor:
         logger.debug(f"System monitoring started with interval {interval}s")
         return True
     
+    def set_cup_present(self, present):
+        """
+        Simulate a cup arriving at or leaving the pour position.
+        
+        Args:
+            present (bool): Whether the position sensor sees a cup
+        """
+        self.sensor_bus.publish('cup_present', present)
+    
+    def _record_reading(self, channel, value, timestamp):
+        """Bus subscriber keeping the sensor snapshot up to date."""
+        with self.data_lock:
+            self.sensor_data[channel] = value
+            self.sensor_data['last_update'] = timestamp
+        # The simulated scale follows cups moved by the mock hardware too
+        if channel == 'cup_present':
+            self.simulated_cup_present = value
+    
+    def _record_history(self, channel, value, timestamp):
+        """Bus subscriber adding readings to the telemetry store."""
+        self.telemetry.record(channel, value, timestamp)
+    
+    def get_sensor_history(self, channel, resolution='raw', since=None):
+        """Get the recorded history of a sensor channel."""
+        return self.telemetry.query(channel, resolution, since)
+    
     def _monitoring_loop(self, interval):
-        """Simulate background thread for continuous sensor monitoring."""
+        """Simulate the load on the scale following the cup."""
+        simulated_weight = 0.0
         while not self.stop_monitoring_flag:
-            # Simulate cup presence (change occasionally)
-            if random.random() < 0.1:
-                self.sensor_data['cup_present'] = random.choice([True, False])
-            
-            # Simulate weight changes
-            if self.sensor_data['cup_present']:
+            if self.simulated_cup_present:
                 # If cup present, simulate filled or filling cup
                 if random.random() < 0.3:
                     # Gradually increase weight to simulate filling
                     target_weight = random.uniform(400, 550)
-                    current_weight = self.sensor_data['weight']
-                    
-                    # Move towards target weight
-                    self.sensor_data['weight'] += (target_weight - current_weight) * 0.2
+                    simulated_weight += (target_weight - simulated_weight) * 0.2
             else:
                 # If no cup, weight should be near zero
-                self.sensor_data['weight'] = random.uniform(0, 5)
-            
-            # Update the weight sensor's simulated weight
-            self.weight_sensor.simulated_weight = self.sensor_data['weight']
+                simulated_weight = random.uniform(0, 5)
             
-            # Update last update timestamp
-            self.sensor_data['last_update'] = time.time()
+            # The weight sensor samples this and publishes it on the bus
+            self.weight_sensor.simulated_weight = simulated_weight
             
             # Sleep for the specified interval
             time.sleep(interval)
@@ -483,7 +827,8 @@ class MockSystemMonitor:
     def get_sensor_data(self):
         """Simulate getting the latest sensor readings."""
         # Return a copy of the sensor data
-        return dict(self.sensor_data)
+        with self.data_lock:
+            return dict(self.sensor_data)
     
     def stop_monitoring(self):
         """Simulate stopping the monitoring thread."""
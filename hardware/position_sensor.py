@@ -0,0 +1,160 @@
+"""
+Edge-triggered position sensor that can be waited on instead of polled.
+"""
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+def watch_edges(gpio, pin, callback, bouncetime=None):
+    """
+    Call back on both edges of an input pin.
+    
+    Only one add_event_detect is allowed per pin, so a pin already watched
+    by another component gets the callback added to its detection instead.
+    
+    Args:
+        gpio: GPIO module to use (RPi.GPIO or mock_gpio)
+        pin (int): Input pin to watch
+        callback (callable): Called with the pin on every edge
+        bouncetime (int, optional): Debounce time in milliseconds
+    
+    Returns:
+        bool: True if this call enabled the edge detection, so it is the
+              caller's to remove
+    """
+    try:
+        if bouncetime:
+            gpio.add_event_detect(pin, gpio.BOTH, callback=callback, bouncetime=bouncetime)
+        else:
+            gpio.add_event_detect(pin, gpio.BOTH, callback=callback)
+        return True
+    except RuntimeError:
+        gpio.add_event_callback(pin, callback)
+        return False
+
+
+class PositionSensor:
+    """
+    Digital sensor reporting whether a cup is at a position.
+    
+    The GPIO edge callback records each change and wakes any waiting
+    thread, so a change is seen as soon as the callback runs rather than
+    on the next iteration of a polling loop.
+    """
+    
+    def __init__(self, pin, gpio, name, active_level=None, bouncetime=None, on_change=None):
+        """
+        Initialize the position sensor.
+        
+        Args:
+            pin (int): GPIO input pin of the sensor
+            gpio: GPIO module to use (RPi.GPIO or mock_gpio)
+            name (str): Name used in log messages
+            active_level (int, optional): Pin level when a cup is detected, LOW if None
+            bouncetime (int, optional): Debounce time in milliseconds
+            on_change (callable, optional): Called with the new state from the edge callback
+        """
+        self.pin = pin
+        self.gpio = gpio
+        self.name = name
+        self.active_level = gpio.LOW if active_level is None else active_level
+        self.bouncetime = bouncetime
+        self.on_change = on_change
+        
+        self.active = False
+        self.changes = 0
+        self.arrivals = 0
+        self.condition = threading.Condition()
+        self.owns_detection = False
+        self.initialized = False
+    
+    def initialize(self):
+        """Set up the input pin and start watching its edges."""
+        self.gpio.setup(self.pin, self.gpio.IN, pull_up_down=self.gpio.PUD_UP)
+        self.owns_detection = watch_edges(self.gpio, self.pin, self._edge_callback, self.bouncetime)
+        # Edges only report changes, so take the level the sensor starts at
+        self._edge_callback(self.pin)
+        self.initialized = True
+    
+    def _edge_callback(self, channel):
+        """Record the sensor level after an edge and wake waiting threads."""
+        active = self.gpio.input(self.pin) == self.active_level
+        with self.condition:
+            if active == self.active:
+                return
+            self.active = active
+            self.changes += 1
+            if active:
+                self.arrivals += 1
+            self.condition.notify_all()
+        logger.debug(f"{self.name} sensor {'detects a cup' if active else 'is clear'}")
+        if self.on_change is not None:
+            self.on_change(active)
+    
+    def is_active(self):
+        """
+        Check whether a cup is at the sensor.
+        
+        Returns:
+            bool: True if the sensor detects a cup
+        """
+        with self.condition:
+            return self.active
+    
+    def wait_for(self, active=True, timeout=None, cancel=None):
+        """
+        Block until the sensor reaches a state.
+        
+        Returns immediately if the sensor is already in that state.
+        
+        Args:
+            active (bool): State to wait for, True for a detected cup
+            timeout (float, optional): Maximum time to wait in seconds
+            cancel (threading.Event, optional): Ends the wait early once set and wake() is called
+        
+        Returns:
+            bool: True if the state was reached, False on timeout or cancellation
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.active == active or (cancel is not None and cancel.is_set()),
+                                    timeout)
+            return self.active == active
+    
+    def wait_for_arrival(self, after, timeout=None, cancel=None):
+        """
+        Block until a cup arrives at the sensor after a known arrival.
+        
+        Unlike wait_for this needs a new edge, so a cup that was already
+        at the sensor does not count.
+        
+        Args:
+            after (int): Value of arrivals before the awaited cup
+            timeout (float, optional): Maximum time to wait in seconds
+            cancel (threading.Event, optional): Ends the wait early once set and wake() is called
+        
+        Returns:
+            bool: True if a cup arrived, False on timeout or cancellation
+        """
+        def arrived():
+            return self.arrivals > after and self.active
+        
+        with self.condition:
+            self.condition.wait_for(lambda: arrived() or (cancel is not None and cancel.is_set()), timeout)
+            return arrived()
+    
+    def wake(self):
+        """Make waiting threads re-check their cancel events."""
+        with self.condition:
+            self.condition.notify_all()
+    
+    def cleanup(self):
+        """Stop watching the sensor's edges."""
+        if self.initialized:
+            if self.owns_detection:
+                self.gpio.remove_event_detect(self.pin)
+                self.owns_detection = False
+            # Release any thread still waiting for the sensor
+            with self.condition:
+                self.condition.notify_all()
+            self.initialized = False
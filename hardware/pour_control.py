@@ -0,0 +1,225 @@
+"""
+Pour threshold logic deciding when a tap slows down and when its valve closes.
+"""
+import logging
+from config import (
+    BEVERAGE_POUR_SETTINGS,
+    VALVE_SETTINGS,
+    VOLUME_ESTIMATOR_SETTINGS,
+    FLOW_CALIBRATION_SETTINGS
+)
+from hardware.flow_rate import FlowRateEstimator, ValveCloseModel
+from hardware.volume_estimator import VolumeEstimator
+
+logger = logging.getLogger(__name__)
+
+# Valve actions returned to the caller
+SLOW = 'slow'
+CLOSE = 'close'
+
+
+class PourControl:
+    """
+    Turns a tap's flow pulses and scale readings into valve actions.
+    
+    Every pulse advances the volume estimate through the tap's flow
+    calibration curve, and every scale reading corrects it. The valve is
+    closed early by the volume expected to flow during its learned close
+    latency at the current flow rate, so in-flight flow lands on the
+    target. Finished pours teach the curve and the latency.
+    
+    No hardware and no lock of its own: TapChannel calls it from its GPIO
+    callbacks under its flow lock, and the simulator from its event queue.
+    """
+    
+    def __init__(self, beverage_type, calibration):
+        """
+        Initialize the pour control of a tap.
+        
+        Args:
+            beverage_type (str): Beverage served by the tap
+            calibration (FlowCalibration): Flow sensor calibration shared by the manifold
+        """
+        settings = BEVERAGE_POUR_SETTINGS[beverage_type]
+        
+        self.beverage_type = beverage_type
+        self.flow_rate = settings['FLOW_RATE_ML_PER_SEC']
+        self.slow_pour_threshold = settings['SLOW_POUR_THRESHOLD']
+        
+        # Nominal flow sensor calibration; weighed pours learn a curve over flow rate
+        self.ml_per_pulse = FLOW_CALIBRATION_SETTINGS['NOMINAL_ML_PER_PULSE']
+        self.calibration = calibration
+        self.flow_curve = calibration.curve(beverage_type)
+        # Pulses of the current pour binned by frequency, for learning from its weight
+        self.pour_features = None
+        
+        self.flow_count = 0
+        self.target_volume = None
+        self.slow_pour_volume = None
+        
+        # Live flow rate and learned close latency
+        self.flow_estimator = FlowRateEstimator(VALVE_SETTINGS['FLOW_RATE_WINDOW_PULSES'])
+        self.close_model = ValveCloseModel(
+            initial_latency=VALVE_SETTINGS['CLOSE_LATENCY_SEC'],
+            smoothing=VALVE_SETTINGS['CLOSE_LATENCY_SMOOTHING']
+        )
+        self.close_pulse_count = None
+        self.close_flow_rate = 0.0
+        self.overshoot_pulses = None
+        self.finished_features = None
+        
+        # Volume in the cup from pulses, corrected by the scale when pouring by weight
+        self.volume_estimator = VolumeEstimator(
+            self.ml_per_pulse,
+            pulse_noise=VOLUME_ESTIMATOR_SETTINGS['PULSE_NOISE'],
+            scale_drift=VOLUME_ESTIMATOR_SETTINGS['SCALE_DRIFT'],
+            initial_scale_std=VOLUME_ESTIMATOR_SETTINGS['INITIAL_SCALE_STD'],
+            weight_noise_ml=VOLUME_ESTIMATOR_SETTINGS['WEIGHT_NOISE_ML']
+        )
+    
+    def start(self, target_volume):
+        """
+        Start a pour with an empty cup and arm the thresholds.
+        
+        Args:
+            target_volume (float): Volume in ml at which the valve closes
+        """
+        self.flow_count = 0
+        self.target_volume = target_volume
+        self.slow_pour_volume = target_volume * self.slow_pour_threshold
+        self.close_pulse_count = None
+        self.overshoot_pulses = None
+        self.finished_features = None
+        self.flow_estimator.reset()
+        self.volume_estimator.reset()
+        # The curve carries the calibration between pours; the scale only corrects this one
+        self.volume_estimator.reset_scale(self.flow_curve.relative_std(self.flow_rate / self.ml_per_pulse))
+        self.pour_features = self.flow_curve.new_features()
+    
+    def add_pulse(self, now):
+        """
+        Count a flow sensor pulse.
+        
+        Args:
+            now (float): Monotonic time of the pulse in seconds
+        
+        Returns:
+            str: CLOSE or SLOW if a threshold has been reached, None otherwise
+        """
+        self.flow_count += 1
+        self.flow_estimator.add_pulse(now)
+        frequency = self.flow_estimator.pulses_per_second()
+        self.volume_estimator.add_pulses(1, now, self.flow_curve.ml_per_pulse(frequency))
+        if self.pour_features is not None:
+            self.flow_curve.add_pulse(self.pour_features, frequency)
+        return self.check()
+    
+    def add_weight(self, volume_ml, lag, now):
+        """
+        Correct the volume with a scale reading.
+        
+        Args:
+            volume_ml (float): Net cup weight converted to volume
+            lag (float): Seconds the reading lags behind the cup
+            now (float): Current monotonic time in seconds
+        
+        Returns:
+            str: CLOSE or SLOW if a threshold has been reached, None otherwise
+        """
+        self.volume_estimator.add_weight(volume_ml, lag, now)
+        return self.check()
+    
+    def check(self):
+        """
+        Compare the estimated volume with the armed thresholds.
+        
+        Returns:
+            str: CLOSE or SLOW if a threshold has been reached, None if
+                 not or once the valve has been closed
+        """
+        if self.target_volume is None:
+            return None
+        
+        volume, _ = self.volume_estimator.estimate()
+        frequency = self.flow_estimator.pulses_per_second()
+        lead_volume = (self.close_model.lead_pulses(frequency) * self.flow_curve.ml_per_pulse(frequency) *
+                       self.volume_estimator.scale)
+        if volume + lead_volume >= self.target_volume:
+            return CLOSE
+        if volume >= self.slow_pour_volume:
+            return SLOW
+        return None
+    
+    def closed(self, now):
+        """
+        Note that the valve has been commanded shut and disarm the thresholds.
+        
+        Pulses still arriving are counted as the close overshoot.
+        
+        Args:
+            now (float): Monotonic time of the close command in seconds
+        """
+        if self.close_pulse_count is None:
+            self.close_pulse_count = self.flow_count
+            self.close_flow_rate = self.flow_estimator.pulses_per_second(now)
+        self.target_volume = None
+    
+    def finish(self, weighed_volume, now):
+        """
+        End the pour once the flow has settled.
+        
+        Args:
+            weighed_volume (float): Volume weighed in the cup, or None if not weighed
+            now (float): Current monotonic time in seconds
+        
+        Returns:
+            tuple: (volume_ml, uncertainty_ml) of the final estimate
+        """
+        if weighed_volume is not None:
+            self.volume_estimator.add_weight(weighed_volume, 0.0, now)
+        self.target_volume = None
+        self.overshoot_pulses = self.flow_count - self.close_pulse_count
+        self.finished_features, self.pour_features = self.pour_features, None
+        return self.volume_estimator.estimate()
+    
+    def learn(self, weighed_volume, closed_on_target):
+        """
+        Learn the flow calibration and valve latency from the finished pour.
+        
+        May write the calibration file, so callers should not hold a lock
+        the flow sensor needs.
+        
+        Args:
+            weighed_volume (float): Volume weighed in the cup, or None if not weighed
+            closed_on_target (bool): Whether the valve was closed on the target volume
+        """
+        if weighed_volume is not None:
+            self.calibration.record_pour(self.beverage_type, self.finished_features, weighed_volume,
+                                         VOLUME_ESTIMATOR_SETTINGS['WEIGHT_NOISE_ML'])
+        
+        # Level, timeout and manual stops say nothing about the valve itself
+        if closed_on_target:
+            self.close_model.record_close(self.close_flow_rate, self.overshoot_pulses)
+            logger.debug(f"{self.beverage_type} valve close latency now "
+                         f"{self.close_model.latency * 1000:.0f}ms")
+    
+    def abandon(self):
+        """Disarm the thresholds of a pour that failed, learning nothing from it."""
+        self.target_volume = None
+        self.pour_features = None
+    
+    def get_estimate(self):
+        """
+        Get the estimated volume in the cup.
+        
+        Returns:
+            dict: Volume, one standard deviation of uncertainty and calibrated ml per pulse
+        """
+        volume, uncertainty = self.volume_estimator.estimate()
+        ml_per_pulse = (self.flow_curve.ml_per_pulse(self.flow_estimator.pulses_per_second()) *
+                        self.volume_estimator.scale)
+        return {
+            'volume_ml': round(volume, 1),
+            'uncertainty_ml': round(uncertainty, 1),
+            'ml_per_pulse': round(ml_per_pulse, 3)
+        }
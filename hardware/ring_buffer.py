@@ -0,0 +1,100 @@
+"""
+Fixed-capacity numeric ring buffer backed by a preallocated typed array.
+"""
+from array import array
+
+
+class RingBuffer:
+    """Ring buffer of numbers that never reallocates after construction."""
+    
+    def __init__(self, capacity, typecode='d'):
+        """
+        Initialize the ring buffer.
+        
+        Args:
+            capacity (int): Maximum number of values held
+            typecode (str): array module type code for the storage
+        """
+        if capacity < 1:
+            raise ValueError("Ring buffer capacity must be at least 1")
+        
+        self.capacity = capacity
+        self.data = array(typecode, [0]) * capacity
+        self.index = 0  # Next write position
+        self.count = 0
+    
+    def __len__(self):
+        return self.count
+    
+    def append(self, value):
+        """
+        Add a value, overwriting the oldest one when full.
+        
+        Args:
+            value (float): Value to store
+        """
+        self.data[self.index] = value
+        self.index = (self.index + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+    
+    def newest(self):
+        """
+        Get the most recently added value.
+        
+        Returns:
+            float: Newest value or None if empty
+        """
+        if self.count == 0:
+            return None
+        return self.data[self.index - 1]
+    
+    def oldest(self):
+        """
+        Get the oldest value still held.
+        
+        Returns:
+            float: Oldest value or None if empty
+        """
+        if self.count == 0:
+            return None
+        return self.data[(self.index - self.count) % self.capacity]
+    
+    def values(self, n=None):
+        """
+        Get the held values in insertion order.
+        
+        Args:
+            n (int, optional): Only return the newest n values
+        
+        Returns:
+            list: Values from oldest to newest
+        """
+        n = self.count if n is None else min(n, self.count)
+        start = (self.index - n) % self.capacity
+        if start + n <= self.capacity:
+            return self.data[start:start + n].tolist()
+        return self.data[start:].tolist() + self.data[:self.index].tolist()
+    
+    def trimmed_mean(self, n, trim=0):
+        """
+        Average the newest values after dropping the extremes.
+        
+        Args:
+            n (int): Number of newest values to consider
+            trim (int): Values dropped from each end; ignored if too few values
+        
+        Returns:
+            float: Trimmed mean or None if empty
+        """
+        window = sorted(self.values(n))
+        if not window:
+            return None
+        if len(window) > 2 * trim:
+            window = window[trim:len(window) - trim]
+        return sum(window) / len(window)
+    
+    def clear(self):
+        """Drop all values without releasing the storage."""
+        self.index = 0
+        self.count = 0
@@ -0,0 +1,129 @@
+"""
+In-process publish/subscribe bus for sensor readings.
+"""
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+class Subscription:
+    """A callback registered for one channel of the sensor bus."""
+    
+    def __init__(self, channel, callback, min_change=None):
+        """
+        Initialize the subscription.
+        
+        Args:
+            channel (str): Channel to receive readings from
+            callback (callable): Called as callback(channel, value, timestamp)
+            min_change (float, optional): Smallest change from the last delivered
+                                          value worth a call; any change if None
+        """
+        self.channel = channel
+        self.callback = callback
+        self.min_change = min_change
+        self.last_value = None
+        self.delivered = False
+    
+    def wants(self, value):
+        """
+        Check whether a reading differs enough from the last one delivered.
+        
+        Args:
+            value: New reading
+        
+        Returns:
+            bool: True if the callback should be called
+        """
+        if not self.delivered:
+            return True
+        if self.min_change is None or value is None or self.last_value is None:
+            return value != self.last_value
+        return abs(value - self.last_value) >= self.min_change
+
+
+class SensorBus:
+    """
+    Delivers sensor readings to subscribers as soon as they are published.
+    
+    Sensors publish every reading from their own thread or GPIO callback,
+    and each subscriber is called on that thread only when the value has
+    changed by at least its threshold. Channels are 'weight' (grams),
+    'cup_present' (bool), 'level:<beverage>' (bool, liquid at that tap's
+    level sensor) and '<beverage>_temperature' (°C).
+    """
+    
+    def __init__(self):
+        """Initialize an empty bus."""
+        self.subscriptions = {}
+        self.latest = {}
+        self.lock = threading.Lock()
+    
+    def subscribe(self, channel, callback, min_change=None):
+        """
+        Register a callback for a channel.
+        
+        Args:
+            channel (str): Channel to receive readings from
+            callback (callable): Called as callback(channel, value, timestamp)
+            min_change (float, optional): Smallest change worth a call; any change if None
+        
+        Returns:
+            Subscription: Handle for unsubscribe
+        """
+        subscription = Subscription(channel, callback, min_change)
+        with self.lock:
+            self.subscriptions.setdefault(channel, []).append(subscription)
+        return subscription
+    
+    def unsubscribe(self, subscription):
+        """
+        Remove a subscription.
+        
+        Args:
+            subscription (Subscription): Handle returned by subscribe
+        """
+        with self.lock:
+            subscribers = self.subscriptions.get(subscription.channel, [])
+            if subscription in subscribers:
+                subscribers.remove(subscription)
+    
+    def publish(self, channel, value, timestamp=None):
+        """
+        Publish a reading and notify interested subscribers.
+        
+        Args:
+            channel (str): Channel of the reading
+            value: The reading
+            timestamp (float, optional): Time of the reading, defaults to now
+        """
+        timestamp = timestamp if timestamp is not None else time.time()
+        
+        with self.lock:
+            self.latest[channel] = (value, timestamp)
+            due = [s for s in self.subscriptions.get(channel, []) if s.wants(value)]
+            for subscription in due:
+                subscription.last_value = value
+                subscription.delivered = True
+        
+        # Callbacks run outside the lock so they may publish or subscribe themselves
+        for subscription in due:
+            try:
+                subscription.callback(channel, value, timestamp)
+            except Exception as e:
+                logger.error(f"Sensor bus subscriber for '{channel}' failed: {e}")
+    
+    def get_latest(self, channel, default=None):
+        """
+        Get the newest reading on a channel.
+        
+        Args:
+            channel (str): Channel to read
+            default: Value returned if nothing was published yet
+        
+        Returns:
+            tuple: (value, timestamp), or (default, None) if nothing was published
+        """
+        with self.lock:
+            return self.latest.get(channel, (default, None))
@@ -5,22 +5,54 @@ import time
 import logging
 import threading
 import RPi.GPIO as GPIO
-from config import GPIO_PINS
+from config import GPIO_PINS, CUP_SETTINGS, WEIGHT_SENSOR_SETTINGS, MONITOR_SETTINGS, TELEMETRY_SETTINGS
+from hardware.ring_buffer import RingBuffer
+from hardware.position_sensor import watch_edges
+from hardware.sensor_bus import SensorBus
+from hardware.timeseries import TelemetryStore
 
 logger = logging.getLogger(__name__)
 
 class WeightSensor:
-    """HX711 weight sensor integration for monitoring cup weight."""
+    """
+    HX711 weight sensor integration for monitoring cup weight.
     
-    def __init__(self):
-        """Initialize the weight sensor hardware connection."""
+    A sampler thread reads every conversion as soon as the HX711 signals
+    data ready and keeps the raw values in a ring buffer, so readers get a
+    filtered weight immediately without touching the hardware.
+    """
+    
+    def __init__(self, sensor_bus=None):
+        """
+        Initialize the weight sensor hardware connection.
+        
+        Args:
+            sensor_bus (SensorBus, optional): Bus to publish every filtered weight on
+        """
+        self.sensor_bus = sensor_bus
         self.data_pin = GPIO_PINS['WEIGHT_SENSOR_DATA']
         self.clock_pin = GPIO_PINS['WEIGHT_SENSOR_CLK']
         self.initialized = False
-        self.reference_unit = 1  # Calibration value, needs adjustment for actual hardware
+        self.reference_unit = WEIGHT_SENSOR_SETTINGS['REFERENCE_UNIT']  # Raw counts per gram
+        self.tare_offset = 0
+        
+        # Sampler state
+        self.sample_rate = WEIGHT_SENSOR_SETTINGS['SAMPLE_RATE_SPS']
+        self.filter_window = WEIGHT_SENSOR_SETTINGS['FILTER_WINDOW']
+        self.filter_trim = WEIGHT_SENSOR_SETTINGS['FILTER_TRIM']
+        self.samples = RingBuffer(WEIGHT_SENSOR_SETTINGS['BUFFER_SIZE'])
+        self.sample_count = 0
+        self.filtered_value = None
+        self.last_sample_time = 0
+        self.sample_condition = threading.Condition()
+        self.sampler_thread = None
+        self.sampler_active = False
         
     def initialize(self):
-        """Set up GPIO for the weight sensor (HX711)."""
+        """Set up GPIO for the weight sensor (HX711) and start sampling."""
+        if self.initialized:
+            return True
+        
         try:
             # Setup GPIO mode if not already set
             if GPIO.getmode() != GPIO.BCM:
@@ -35,46 +67,60 @@ class WeightSensor:
             time.sleep(0.1)
             GPIO.output(self.clock_pin, GPIO.LOW)
             
-            # Wait for the HX711 to settle
-            time.sleep(0.5)
+            # Start reading conversions in the background
+            self.sampler_active = True
+            self.sampler_thread = threading.Thread(target=self._sampler_loop, daemon=True)
+            self.sampler_thread.start()
             
             self.initialized = True
-            logger.info("Weight sensor initialized successfully")
+            logger.info(f"Weight sensor initialized, sampling at {self.sample_rate} SPS")
             return True
         except Exception as e:
             logger.error(f"Failed to initialize weight sensor: {e}")
+            self.sampler_active = False
             return False
     
+    def _wait_ready(self, timeout_ms):
+        """
+        Wait for the HX711 to signal a finished conversion.
+        
+        DOUT goes low when data is ready, so block on its falling edge
+        instead of polling.
+        
+        Args:
+            timeout_ms (int): Maximum time to wait in milliseconds
+        
+        Returns:
+            bool: True if a conversion is ready to be read
+        """
+        if GPIO.input(self.data_pin) == GPIO.LOW:
+            return True
+        GPIO.wait_for_edge(self.data_pin, GPIO.FALLING, timeout=timeout_ms)
+        return GPIO.input(self.data_pin) == GPIO.LOW
+    
     def _read_raw_value(self):
         """
-        Read a raw value from the HX711 weight sensor.
+        Clock a raw value out of the HX711 weight sensor.
         
-        This is a simplified implementation for demonstration.
-        A proper library like hx711py should be used in production.
+        The conversion must already be ready. The clock is toggled without
+        delays: every GPIO call takes longer than the HX711's minimum pulse
+        width, and holding the clock high for over 60µs powers the chip down.
         
         Returns:
             int: Raw value read from the sensor
         """
-        # Wait for the sensor to be ready
-        while GPIO.input(self.data_pin) == GPIO.HIGH:
-            pass
-            
         # Read 24 bits of data
         count = 0
         for i in range(24):
             GPIO.output(self.clock_pin, GPIO.HIGH)
-            time.sleep(0.000001)  # 1µs delay
             count = count << 1
-            
             GPIO.output(self.clock_pin, GPIO.LOW)
-            time.sleep(0.000001)  # 1µs delay
             
             if GPIO.input(self.data_pin) == GPIO.HIGH:
                 count += 1
         
         # Set the channel and gain by pulsing the clock pin an additional time
         GPIO.output(self.clock_pin, GPIO.HIGH)
-        time.sleep(0.000001)  # 1µs delay
         GPIO.output(self.clock_pin, GPIO.LOW)
         
         # 2's complement for negative values
@@ -83,10 +129,41 @@ class WeightSensor:
         
         return count
     
+    def _sampler_loop(self):
+        """Background thread reading every conversion into the ring buffer."""
+        # Allow two conversion periods before re-checking the data line
+        ready_timeout_ms = max(1, int(2000 / self.sample_rate))
+        
+        while self.sampler_active:
+            try:
+                if not self._wait_ready(ready_timeout_ms):
+                    continue
+                
+                raw = self._read_raw_value()
+                with self.sample_condition:
+                    self.samples.append(raw)
+                    self.sample_count += 1
+                    self.filtered_value = self.samples.trimmed_mean(self.filter_window, self.filter_trim)
+                    self.last_sample_time = time.time()
+                    self.sample_condition.notify_all()
+                
+                if self.sensor_bus is not None:
+                    self.sensor_bus.publish(
+                        'weight',
+                        (self.filtered_value - self.tare_offset) / self.reference_unit,
+                        self.last_sample_time
+                    )
+            except Exception as e:
+                logger.error(f"Error sampling weight sensor: {e}")
+                time.sleep(1.0 / self.sample_rate)
+    
     def get_weight(self):
         """
         Get the current weight reading in grams.
         
+        Returns the filtered value kept by the sampler, so it never waits
+        for the hardware.
+        
         Returns:
             float: Weight in grams or None if error
         """
@@ -94,29 +171,91 @@ class WeightSensor:
             if not self.initialize():
                 return None
         
-        try:
-            # Read multiple times and average for stability
-            readings = []
-            for _ in range(5):  # Take 5 readings
-                readings.append(self._read_raw_value())
-                time.sleep(0.1)
-            
-            # Remove outliers (optional improvement)
-            readings.sort()
-            if len(readings) >= 5:
-                readings = readings[1:-1]  # Remove highest and lowest
-            
-            # Average the readings
-            avg_reading = sum(readings) / len(readings)
-            
-            # Apply calibration factor
-            weight = avg_reading / self.reference_unit
-            
-            logger.debug(f"Current weight reading: {weight}g")
-            return weight
-        except Exception as e:
-            logger.error(f"Error reading weight: {e}")
+        value = self.filtered_value
+        if value is None:
             return None
+        
+        # A sensor that stopped converting must not report its last weight
+        if time.time() - self.last_sample_time > max(1.0, 10.0 / self.sample_rate):
+            logger.warning("Weight sensor samples are stale")
+            return None
+        
+        # Apply tare and calibration factor
+        return (value - self.tare_offset) / self.reference_unit
+    
+    @property
+    def filter_delay(self):
+        """float: Seconds the filtered weight lags behind the load on the scale."""
+        # Half a conversion for the sample itself plus the window's group delay
+        return (0.5 + (self.filter_window - 1) / 2.0) / self.sample_rate
+    
+    def wait_for_sample(self, last_count, timeout=None):
+        """
+        Block until the sampler has stored a sample newer than last_count.
+        
+        Args:
+            last_count (int): Sample count already seen by the caller
+            timeout (float, optional): Maximum time to wait in seconds
+        
+        Returns:
+            int: Current sample count, unchanged if the wait timed out
+        """
+        with self.sample_condition:
+            self.sample_condition.wait_for(lambda: self.sample_count > last_count, timeout=timeout)
+            return self.sample_count
+    
+    def _wait_fresh_mean(self, samples):
+        """
+        Average raw samples taken after the call.
+        
+        Args:
+            samples (int): Number of fresh samples to average
+        
+        Returns:
+            float: Mean raw value or None if the samples did not arrive in time
+        """
+        timeout = 2.0 * samples / self.sample_rate + 1.0
+        with self.sample_condition:
+            target = self.sample_count + samples
+            if not self.sample_condition.wait_for(lambda: self.sample_count >= target, timeout=timeout):
+                return None
+            return self.samples.trimmed_mean(samples)
+    
+    def get_settled_weight(self, samples=None):
+        """
+        Weigh the load using samples taken after the call.
+        
+        Unlike get_weight this waits for fresh conversions, so a load that
+        has just been placed on the scale is not averaged with older samples.
+        
+        Args:
+            samples (int, optional): Number of samples to average
+        
+        Returns:
+            float: Weight in grams or None if error
+        """
+        if not self.initialized:
+            if not self.initialize():
+                return None
+        
+        value = self._wait_fresh_mean(samples or WEIGHT_SENSOR_SETTINGS['CUP_TARE_SAMPLES'])
+        if value is None:
+            logger.error("Timed out waiting for weight samples")
+            return None
+        return (value - self.tare_offset) / self.reference_unit
+    
+    def get_raw_samples(self, n=None):
+        """
+        Get the newest raw samples.
+        
+        Args:
+            n (int, optional): Number of samples, all buffered samples if omitted
+        
+        Returns:
+            list: Raw values from oldest to newest
+        """
+        with self.sample_condition:
+            return self.samples.values(n)
     
     def tare(self):
         """
@@ -129,26 +268,49 @@ class WeightSensor:
             if not self.initialize():
                 return False
         
-        try:
-            # Read multiple times and average for stable tare value
-            readings = []
-            for _ in range(10):  # Take 10 readings for better accuracy
-                readings.append(self._read_raw_value())
-                time.sleep(0.1)
-            
-            # Average the readings
-            tare_value = sum(readings) / len(readings)
-            
-            # Store as offset
-            self.tare_offset = tare_value
-            logger.info("Scale tared successfully")
-            return True
-        except Exception as e:
-            logger.error(f"Error during tare: {e}")
+        # Average fresh samples taken after the call for stable tare value
+        tare_value = self._wait_fresh_mean(WEIGHT_SENSOR_SETTINGS['TARE_SAMPLES'])
+        if tare_value is None:
+            logger.error("Timed out waiting for weight samples during tare")
             return False
+        
+        # Store as offset
+        self.tare_offset = tare_value
+        logger.info("Scale tared successfully")
+        return True
+    
+    def calibrate(self, known_weight_g):
+        """
+        Set the scale factor from a known weight placed on the tared scale.
+        
+        Weighed pours calibrate the flow sensors, so the scale itself must
+        read true. Store the result as SCALE_REFERENCE_UNIT to keep it.
+        
+        Args:
+            known_weight_g (float): Weight of the load on the scale in grams
+        
+        Returns:
+            float: New reference unit in raw counts per gram, or None if failed
+        """
+        if not self.initialized:
+            if not self.initialize():
+                return None
+        
+        value = self._wait_fresh_mean(WEIGHT_SENSOR_SETTINGS['TARE_SAMPLES'])
+        if value is None or known_weight_g <= 0 or value == self.tare_offset:
+            logger.error("Scale calibration failed: no load reading")
+            return None
+        
+        self.reference_unit = (value - self.tare_offset) / known_weight_g
+        logger.info(f"Scale calibrated: reference unit {self.reference_unit:.3f} counts per gram")
+        return self.reference_unit
     
     def cleanup(self):
-        """Release resources and clean up GPIO pins."""
+        """Stop sampling, release resources and clean up GPIO pins."""
+        self.sampler_active = False
+        if self.sampler_thread and self.sampler_thread.is_alive():
+            self.sampler_thread.join(timeout=2.0)
+        
         if self.initialized:
             GPIO.cleanup([self.data_pin, self.clock_pin])
             self.initialized = False
@@ -156,11 +318,21 @@ class WeightSensor:
 
 
 class SystemMonitor:
-    """Monitor system state and sensor values."""
+    """
+    Monitor system state and sensor values.
+    
+    Sensors publish to a SensorBus as readings arrive: the weight sampler
+    on every conversion and the cup position sensor from its GPIO edge
+    callback. Subscribers react immediately instead of waiting for a
+    polling interval.
+    """
     
     def __init__(self):
         """Initialize the system monitoring."""
-        self.weight_sensor = WeightSensor()
+        self.sensor_bus = SensorBus()
+        self.weight_sensor = WeightSensor(self.sensor_bus)
+        self.cup_sensor_pin = GPIO_PINS['CUP_POSITION_SENSOR']
+        self.owns_cup_detection = False
         self.monitoring_thread = None
         self.monitoring_active = False
         self.sensor_data = {
@@ -170,13 +342,28 @@ class SystemMonitor:
             'last_update': 0
         }
         self.data_lock = threading.Lock()
+        
+        # Keep the snapshot for get_sensor_data current from the bus
+        self.sensor_bus.subscribe('weight', self._record_reading,
+                                  min_change=MONITOR_SETTINGS['WEIGHT_CHANGE_G'])
+        self.sensor_bus.subscribe('cup_present', self._record_reading)
+        self.sensor_bus.subscribe('beer_temperature', self._record_reading,
+                                  min_change=MONITOR_SETTINGS['TEMPERATURE_CHANGE_C'])
+        
+        # Keep every reading in the history, not just the snapshot
+        self.telemetry = TelemetryStore(TELEMETRY_SETTINGS['CHANNELS'],
+                                        TELEMETRY_SETTINGS['RAW_SAMPLES'],
+                                        TELEMETRY_SETTINGS['TIERS'])
+        for channel in self.telemetry.channels:
+            self.sensor_bus.subscribe(channel, self._record_history)
     
     def start_monitoring(self, interval=1.0):
         """
-        Start continuous monitoring of sensors.
+        Start publishing sensor readings.
         
         Args:
-            interval (float): Polling interval in seconds
+            interval (float): Seconds between re-reads of edge-triggered inputs,
+                              which only catch edges missed by the callbacks
         
         Returns:
             bool: True if monitoring started successfully, False otherwise
@@ -190,7 +377,14 @@ class SystemMonitor:
             if not self.weight_sensor.initialize():
                 return False
             
-            # Start monitoring thread
+            # Publish cup presence from the sensor edge
+            # The cup dispenser may already watch this sensor; share its edge detection
+            GPIO.setup(self.cup_sensor_pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+            self.owns_cup_detection = watch_edges(GPIO, self.cup_sensor_pin, self._cup_sensor_callback,
+                                                  bouncetime=CUP_SETTINGS['SENSOR_BOUNCE_MS'])
+            self._publish_cup_presence()
+            
+            # Start resync thread
             self.monitoring_active = True
             self.monitoring_thread = threading.Thread(
                 target=self._monitoring_loop,
@@ -198,35 +392,58 @@ class SystemMonitor:
                 daemon=True
             )
             self.monitoring_thread.start()
-            logger.info(f"System monitoring started with {interval}s interval")
+            logger.info("System monitoring started")
             return True
         except Exception as e:
             logger.error(f"Failed to start monitoring: {e}")
             self.monitoring_active = False
             return False
     
+    def _publish_cup_presence(self):
+        """Read the cup position sensor and publish its state."""
+        cup_present = GPIO.input(self.cup_sensor_pin) == GPIO.LOW
+        self.sensor_bus.publish('cup_present', cup_present)
+    
+    def _cup_sensor_callback(self, channel):
+        """Callback for the cup position sensor changing state."""
+        self._publish_cup_presence()
+    
+    def _record_reading(self, channel, value, timestamp):
+        """Bus subscriber keeping the sensor snapshot up to date."""
+        with self.data_lock:
+            self.sensor_data[channel] = value
+            self.sensor_data['last_update'] = timestamp
+    
+    def _record_history(self, channel, value, timestamp):
+        """Bus subscriber adding readings to the telemetry store."""
+        self.telemetry.record(channel, value, timestamp)
+    
+    def get_sensor_history(self, channel, resolution='raw', since=None):
+        """
+        Get the recorded history of a sensor channel.
+        
+        Args:
+            channel (str): Bus channel, e.g. 'weight' or 'beer_temperature'
+            resolution (str): 'raw' or a tier name from TELEMETRY_SETTINGS
+            since (float, optional): Only data at or after this time
+        
+        Returns:
+            dict: Parallel lists of the samples or min/max/mean buckets
+        
+        Raises:
+            ValueError: If the channel or resolution is unknown
+        """
+        return self.telemetry.query(channel, resolution, since)
+    
     def _monitoring_loop(self, interval):
-        """Background thread for continuous sensor monitoring."""
+        """Background thread re-reading inputs in case an edge was missed."""
         while self.monitoring_active:
             try:
-                # Read weight sensor
-                weight = self.weight_sensor.get_weight()
-                
-                # Read cup presence sensors
-                cup_present = GPIO.input(GPIO_PINS['CUP_POSITION_SENSOR']) == GPIO.LOW
-                
-                # Update the sensor data dictionary
-                with self.data_lock:
-                    self.sensor_data['weight'] = weight if weight is not None else self.sensor_data['weight']
-                    self.sensor_data['cup_present'] = cup_present
-                    self.sensor_data['last_update'] = time.time()
-                
-                # Sleep for the specified interval
-                time.sleep(interval)
-                
+                # Unchanged values are not passed on to subscribers
+                self._publish_cup_presence()
             except Exception as e:
                 logger.error(f"Error in monitoring loop: {e}")
-                time.sleep(interval)  # Continue monitoring despite errors
+            time.sleep(interval)
     
     def get_sensor_data(self):
         """
@@ -245,6 +462,11 @@ class SystemMonitor:
         if self.monitoring_thread and self.monitoring_thread.is_alive():
             self.monitoring_thread.join(timeout=2.0)
         
+        # Edge detection shared with the cup dispenser stays with the dispenser
+        if self.owns_cup_detection:
+            GPIO.remove_event_detect(self.cup_sensor_pin)
+            self.owns_cup_detection = False
+        
         # Clean up sensors
         self.weight_sensor.cleanup()
         logger.info("System monitoring stopped")
@@ -0,0 +1,861 @@
+"""
+Discrete-event hardware simulator running on a virtual clock.
+
+The simulated cup dispenser, taps and conveyor keep the interfaces of the
+mock hardware, but nothing sleeps: every delay is an event on a virtual
+clock, and each blocking call advances the clock until its operation has
+finished. Randomness comes from per-component generators seeded from
+SIMULATOR_SETTINGS['SEED'], so the same seed replays the same run.
+"""
+import math
+import heapq
+import random
+import logging
+import itertools
+import threading
+from hardware.mock_hardware import MockCupDispenser, MockTapChannel, MockBeerDispenser, MockCupDelivery
+from hardware.flow_calibration import FlowCalibration
+from hardware.pour_control import PourControl, SLOW, CLOSE
+from config import (
+    BEVERAGE_TYPES,
+    CUP_SETTINGS,
+    DELIVERY_SETTINGS,
+    WEIGHT_SENSOR_SETTINGS,
+    VOLUME_ESTIMATOR_SETTINGS,
+    FLOW_CALIBRATION_SETTINGS,
+    SIMULATOR_SETTINGS
+)
+
+logger = logging.getLogger(__name__)
+
+class SimEvent:
+    """An action scheduled on the virtual clock."""
+    
+    __slots__ = ('time', 'callback', 'args', 'cancelled')
+    
+    def __init__(self, time, callback, args):
+        self.time = time
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+
+class SimClock:
+    """
+    Virtual time and the queue of events waiting for it.
+    
+    Blocking calls from several threads are run one after another under
+    the clock's lock, so operations that would overlap on real hardware
+    add up in virtual time instead.
+    """
+    
+    def __init__(self, start=0.0):
+        """
+        Initialize the clock.
+        
+        Args:
+            start (float): Virtual time in seconds to start at
+        """
+        self.now = start
+        self.events = []  # (time, sequence, event)
+        self.sequence = itertools.count()
+        self.events_processed = 0
+        self.lock = threading.RLock()
+    
+    def time(self):
+        """
+        Get the virtual time.
+        
+        Returns:
+            float: Seconds since the start of the simulation
+        """
+        return self.now
+    
+    def schedule(self, delay, callback, *args):
+        """
+        Run a callback once virtual time has advanced by delay.
+        
+        Args:
+            delay (float): Seconds from now
+            callback (callable): Called with args when the event is due
+        
+        Returns:
+            SimEvent: Handle for cancel()
+        """
+        with self.lock:
+            event = SimEvent(self.now + max(delay, 0.0), callback, args)
+            heapq.heappush(self.events, (event.time, next(self.sequence), event))
+            return event
+    
+    def cancel(self, event):
+        """Drop a scheduled event if it has not run yet."""
+        if event is not None:
+            event.cancelled = True
+    
+    def step(self):
+        """
+        Run the next event.
+        
+        Returns:
+            bool: False if no event was waiting
+        """
+        with self.lock:
+            while self.events:
+                _, _, event = heapq.heappop(self.events)
+                if event.cancelled:
+                    continue
+                self.now = event.time
+                self.events_processed += 1
+                event.callback(*event.args)
+                return True
+            return False
+    
+    def run(self, until=None):
+        """
+        Run events in time order.
+        
+        Args:
+            until (float, optional): Virtual time to stop at; runs every event if None
+        """
+        with self.lock:
+            while self.events and (until is None or self.events[0][0] <= until):
+                self.step()
+            if until is not None:
+                self.now = max(self.now, until)
+    
+    def sleep(self, duration):
+        """Advance virtual time by duration, running the events due meanwhile."""
+        with self.lock:
+            self.run(self.now + duration)
+    
+    def complete(self, start):
+        """
+        Start an operation and advance virtual time until it reports its result.
+        
+        Args:
+            start (callable): Called with a done callback; returns False if the
+                              operation could not be started
+        
+        Returns:
+            The value passed to the done callback, or False if it never came
+        """
+        with self.lock:
+            results = []
+            if not start(results.append):
+                return False
+            while not results and self.step():
+                pass
+            return results[0] if results else False
+
+
+class Simulation:
+    """Virtual clock and seeded random sources shared by the simulated components."""
+    
+    def __init__(self, seed=None, clock=None):
+        """
+        Initialize the simulation.
+        
+        Args:
+            seed (int, optional): Seed of every random source, from SIMULATOR_SETTINGS by default
+            clock (SimClock, optional): Clock to run on, a new one if None
+        """
+        self.seed = SIMULATOR_SETTINGS['SEED'] if seed is None else seed
+        self.clock = clock or SimClock()
+    
+    def rng(self, name):
+        """
+        Get the random source of one component.
+        
+        Each component draws from its own generator, so the order in which
+        threads call into different components does not change the run.
+        
+        Args:
+            name (str): Component name
+        
+        Returns:
+            random.Random: Generator seeded from the simulation seed and the name
+        """
+        return random.Random(f"{self.seed}:{name}")
+
+
+_default_simulation = None
+_default_lock = threading.Lock()
+
+def get_simulation():
+    """
+    Get the simulation used by components created without one.
+    
+    Returns:
+        Simulation: Process-wide simulation, created on first use
+    """
+    global _default_simulation
+    with _default_lock:
+        if _default_simulation is None:
+            _default_simulation = Simulation()
+        return _default_simulation
+
+
+class FlowProfile:
+    """Flow rate through a valve over time, as piecewise-linear segments."""
+    
+    def __init__(self):
+        """Initialize the profile with the valve closed."""
+        self.segments = [(0.0, math.inf, 0.0, 0.0)]  # (start, duration, start rate, end rate)
+    
+    def rate_at(self, t):
+        """Flow rate in ml/s at time t after the pour started."""
+        for start, duration, q0, q1 in reversed(self.segments):
+            if t >= start:
+                if math.isinf(duration):
+                    return q0
+                return q0 + (q1 - q0) * min((t - start) / duration, 1.0) if duration > 0 else q1
+        return 0.0
+    
+    def switch(self, t, duration, rate):
+        """
+        Change the flow from time t, ramping linearly to a new rate.
+        
+        Args:
+            t (float): Time after the pour started at which the change begins
+            duration (float): Seconds the ramp takes
+            rate (float): Flow rate in ml/s held after the ramp
+        """
+        current = self.rate_at(t)
+        segments = []
+        for start, seg_duration, q0, q1 in self.segments:
+            if start >= t:
+                break
+            if start + seg_duration > t:
+                # Cut the segment at t
+                seg_duration, q1 = t - start, current
+            segments.append((start, seg_duration, q0, q1))
+        if duration > 0:
+            segments.append((t, duration, current, rate))
+        segments.append((t + duration, math.inf, rate, rate))
+        self.segments = segments
+    
+    def volume_at(self, t):
+        """Volume in ml that has flowed by time t after the pour started."""
+        volume = 0.0
+        for start, duration, q0, q1 in self.segments:
+            if t <= start:
+                break
+            span = min(t - start, duration)
+            if math.isinf(duration) or duration == 0:
+                volume += q0 * span
+            else:
+                volume += q0 * span + (q1 - q0) * span * span / (2 * duration)
+        return volume
+    
+    def time_for(self, volume):
+        """
+        Time after the pour started at which a volume has flowed.
+        
+        Returns:
+            float: Seconds, or infinity if the flow stops first
+        """
+        flowed = 0.0
+        for start, duration, q0, q1 in self.segments:
+            if math.isinf(duration):
+                return start + (volume - flowed) / q0 if q0 > 0 else math.inf
+            slope = (q1 - q0) / duration if duration > 0 else 0.0
+            segment_volume = q0 * duration + slope * duration * duration / 2
+            if flowed + segment_volume >= volume:
+                needed = volume - flowed
+                if needed <= 0:
+                    return start
+                if abs(slope) < 1e-12:
+                    return start + needed / q0
+                # Solve q0 * s + slope * s^2 / 2 = needed
+                return start + (-q0 + math.sqrt(q0 * q0 + 2 * slope * needed)) / slope
+            flowed += segment_volume
+        return math.inf
+
+
+class CupDropModel:
+    """Time for a released cup to land, with the odd jam."""
+    
+    def __init__(self, rng):
+        """
+        Initialize the model.
+        
+        Args:
+            rng (random.Random): Random source
+        """
+        self.rng = rng
+        self.median = SIMULATOR_SETTINGS['CUP_DROP_MEDIAN_SEC']
+        self.sigma = SIMULATOR_SETTINGS['CUP_DROP_SIGMA']
+        self.jam_probability = SIMULATOR_SETTINGS['CUP_JAM_PROBABILITY']
+    
+    def drop(self):
+        """
+        Release one cup.
+        
+        Returns:
+            float: Seconds until the cup lands, or None if it jammed
+        """
+        if self.rng.random() < self.jam_probability:
+            return None
+        return self.median * math.exp(self.rng.gauss(0.0, self.sigma))
+
+
+class ConveyorModel:
+    """Travel time of a cup on the belt from the pour position to pickup."""
+    
+    def __init__(self, rng):
+        """
+        Initialize the model.
+        
+        Args:
+            rng (random.Random): Random source
+        """
+        self.rng = rng
+        self.length = SIMULATOR_SETTINGS['CONVEYOR_LENGTH_MM']
+        self.max_speed = SIMULATOR_SETTINGS['CONVEYOR_MAX_SPEED_MM_PER_SEC']
+        self.slip = SIMULATOR_SETTINGS['CONVEYOR_SLIP']
+        self.stall_probability = SIMULATOR_SETTINGS['CONVEYOR_STALL_PROBABILITY']
+    
+    def travel_time(self, speed):
+        """
+        Move one cup.
+        
+        Args:
+            speed (float): Belt speed in percent
+        
+        Returns:
+            float: Seconds until the cup reaches pickup, or None if it stalled
+        """
+        if speed <= 0 or self.rng.random() < self.stall_probability:
+            return None
+        # Slip only ever slows the cup down
+        return self.length / (self.max_speed * speed / 100.0) * (1 + abs(self.rng.gauss(0.0, self.slip)))
+
+
+class SimCupDispenser(MockCupDispenser):
+    """
+    Cup dispenser releasing cups on the virtual clock.
+    
+    Unlike the driver, a dispense completes once the cup has landed even
+    if the previous cup is still at the pour position: the virtual clock
+    runs one blocking call at a time, so waiting here for the conveyor
+    would stall it. Landed cups are reported at the pour position one at a
+    time, each once the previous one has left, which is what the pour
+    stage waits for.
+    """
+    
+    def __init__(self, simulation=None):
+        """
+        Initialize the simulated cup dispenser.
+        
+        Args:
+            simulation (Simulation, optional): Simulation to run in, the shared one if None
+        """
+        super().__init__()
+        self.simulation = simulation or get_simulation()
+        self.clock = self.simulation.clock
+        self.model = CupDropModel(self.simulation.rng('cup_dispenser'))
+        self.busy = False
+        self.last_drop_time = None
+        self.drop_event = None
+        self.on_done = None
+        self.awaiting_position = 0  # Landed cups waiting for the pour position to clear
+    
+    def _on_cup_presence(self, channel, present, timestamp):
+        """Bus subscriber moving a waiting cup in once the pour position clears."""
+        super()._on_cup_presence(channel, present, timestamp)
+        with self.clock.lock:
+            if not present and self.awaiting_position:
+                # Published from the event queue rather than from inside this callback
+                self.clock.schedule(0.0, self._position_waiting_cup)
+    
+    def _position_waiting_cup(self):
+        """Event moving the next waiting cup to the pour position."""
+        self.awaiting_position -= 1
+        self._positioned()
+    
+    def _positioned(self):
+        """Report a landed cup at the pour position."""
+        if self.sensor_bus is not None:
+            self.sensor_bus.publish('cup_present', True)
+    
+    def start_dispense(self, on_done):
+        """
+        Release a cup without waiting for it.
+        
+        Like the driver, the dispenser is done as soon as the landed cup
+        is seen on the scale, or fails once DISPENSE_DELAY_SEC has passed
+        without it.
+        
+        Args:
+            on_done (callable): Called with True or False once the wait is over
+        
+        Returns:
+            bool: False if the dispenser is not ready
+        """
+        if not self.initialized:
+            logger.error("Cup dispenser not initialized")
+            return False
+        if self.busy:
+            logger.error("Cup dispenser already in use")
+            return False
+        
+        self.busy = True
+        self.on_done = on_done
+        self.last_drop_time = self.model.drop()
+        delay = CUP_SETTINGS['DISPENSE_DELAY_SEC']
+        landed = self.last_drop_time is not None and self.last_drop_time <= delay
+        self.drop_event = self.clock.schedule(self.last_drop_time if landed else delay, self._dispensed, landed)
+        return True
+    
+    def _dispensed(self, landed):
+        """Event ending the dispense wait."""
+        self.busy = False
+        self.drop_event = None
+        on_done, self.on_done = self.on_done, None
+        self.drop_stats.record(self.last_drop_time if landed else CUP_SETTINGS['DISPENSE_DELAY_SEC'],
+                               'weight' if landed else 'timeout')
+        if landed:
+            logger.debug("Cup dispensed successfully")
+            with self.position_condition:
+                occupied = self.position_occupied
+            if occupied or self.awaiting_position:
+                self.awaiting_position += 1
+            else:
+                self._positioned()
+        else:
+            logger.error("Failed to dispense cup")
+        on_done(landed)
+    
+    def dispense_cup(self):
+        """Dispense a cup, advancing the virtual clock until it is done."""
+        return self.clock.complete(self.start_dispense)
+    
+    def abort_dispense(self):
+        """Stop the dispense in progress; it fails."""
+        with self.clock.lock:
+            if not self.busy:
+                return
+            self.clock.cancel(self.drop_event)
+            self.busy = False
+            self.drop_event = None
+            on_done, self.on_done = self.on_done, None
+            logger.warning("Cup dispensing aborted")
+            on_done(False)
+
+
+class SimTapChannel(MockTapChannel):
+    """
+    One tap with a physical flow model on the virtual clock.
+    
+    The flow builds up while the valve opens, drops to the slow-pour rate
+    over the valve ramp and keeps running for the close latency after the
+    close command. Each flow sensor pulse and scale reading is an event
+    fed into the driver's own PourControl, so when the valve slows down
+    and closes is decided by the same logic as on the real tap. The
+    sensor's real volume per pulse differs from the nominal calibration
+    by a per-unit factor, which only weighed pours can learn.
+    
+    The pour follows TapChannel._pour: weigh the landed cup, pour until
+    the control or the pour deadline closes the valve, let the foam settle
+    for a second, then weigh the cup again and learn from the pour.
+    """
+    
+    # TapChannel._pour waits this long after closing before it weighs the cup
+    SETTLE_SEC = 1.0
+    
+    def __init__(self, beverage_type, simulation, calibration=None):
+        """
+        Initialize the simulated tap.
+        
+        Args:
+            beverage_type (str): Beverage served by this tap
+            simulation (Simulation): Simulation to run in
+            calibration (FlowCalibration, optional): Calibration shared by the
+                                                     manifold, a private one if None
+        """
+        super().__init__(beverage_type)
+        self.simulation = simulation
+        self.clock = simulation.clock
+        self.rng = simulation.rng(f"tap:{beverage_type}")
+        self.calibration = calibration or FlowCalibration([beverage_type], None, FLOW_CALIBRATION_SETTINGS)
+        self.control = PourControl(beverage_type, self.calibration)
+        self.pulses_per_ml = ((1 + self.rng.gauss(0.0, SIMULATOR_SETTINGS['K_FACTOR_SPREAD'])) /
+                              FLOW_CALIBRATION_SETTINGS['NOMINAL_ML_PER_PULSE'])
+        
+        # The scale samples at its conversion rate, lagging by its filter window
+        sample_rate = WEIGHT_SENSOR_SETTINGS['SAMPLE_RATE_SPS']
+        self.sample_interval = 1.0 / sample_rate
+        self.filter_delay = (0.5 + (WEIGHT_SENSOR_SETTINGS['FILTER_WINDOW'] - 1) / 2.0) / sample_rate
+        self.weigh_time = WEIGHT_SENSOR_SETTINGS['CUP_TARE_SAMPLES'] / sample_rate
+        self.weight_noise = VOLUME_ESTIMATOR_SETTINGS['WEIGHT_NOISE_ML']
+        
+        self.profile = None
+        self.started_at = None
+        self.pulse_phase = 0.0
+        self.pulse_event = None
+        self.sample_event = None
+        self.events = []
+        self.on_done = None
+        self.weigh = False
+        self.by_weight = False
+        self.target_ml = None
+        self.slow_rate = None
+        self.slow_pour_started = False
+        self.stop_reason = None
+        self.last_pour = None
+    
+    def _now(self):
+        """Time since the pour started, on the flow profile's time axis."""
+        return self.clock.time() - self.started_at
+    
+    def _schedule_pulse(self):
+        """Schedule the next flow sensor pulse on the current flow profile."""
+        self.clock.cancel(self.pulse_event)
+        self.pulse_event = None
+        t = self.profile.time_for((self.control.flow_count + 1 - self.pulse_phase) / self.pulses_per_ml)
+        if not math.isinf(t):
+            self.pulse_event = self.clock.schedule(t - self._now(), self._pulse)
+    
+    def start_pour(self, volume_ml=None, on_done=None, delay=0.0):
+        """
+        Start a pour without waiting for it to finish.
+        
+        Args:
+            volume_ml (float, optional): Volume to pour in milliliters.
+            on_done (callable, optional): Called with True or False once the pour is over
+            delay (float): Seconds before the pour starts, e.g. to change lines
+        
+        Returns:
+            bool: False if the tap is busy or its valve failed to open
+        """
+        if self.pouring:
+            logger.error(f"Tap {self.beverage_type} is already pouring")
+            return False
+        if self.rng.random() < SIMULATOR_SETTINGS['POUR_FAILURE_PROBABILITY']:
+            logger.error(f"Failed to start {self.settings['NAME']} pour")
+            return False
+        
+        volume = volume_ml if volume_ml is not None else self.settings['DEFAULT_VOLUME_ML']
+        # Like the driver: pour by weight if configured, weigh flow pours to learn from them
+        scale = self.weight_sensor is not None
+        self.by_weight = scale and self.settings['POUR_MODE'] == 'weight'
+        self.weigh = scale and (self.by_weight or FLOW_CALIBRATION_SETTINGS['LEARN_FROM_FLOW_POURS'])
+        self.target_ml = volume - (self.settings['WEIGHT_HEADSPACE_ML'] if self.by_weight
+                                   else self.settings['FOAM_HEADSPACE_ML'])
+        
+        self.pouring = True
+        self.stop_pouring = False
+        self.stop_reason = None
+        self.slow_pour_started = False
+        self.on_done = on_done
+        self.pulse_phase = self.rng.random()
+        
+        # Keg pressure varies from pour to pour
+        rate = self.settings['FLOW_RATE_ML_PER_SEC'] * (1 + self.rng.gauss(0.0, SIMULATOR_SETTINGS['PRESSURE_SPREAD']))
+        self.slow_rate = rate * self.settings['SLOW_POUR_RATE']
+        open_at = delay + (self.weigh_time if self.weigh else 0.0)
+        self.profile = FlowProfile()
+        self.profile.switch(open_at, SIMULATOR_SETTINGS['VALVE_OPEN_SEC'], rate)
+        
+        self.started_at = self.clock.time()
+        deadline = open_at + volume / (self.settings['FLOW_RATE_ML_PER_SEC'] * 0.5)
+        self.events = [
+            self.clock.schedule(open_at, self._open),
+            self.clock.schedule(deadline, self._close, 'timeout')
+        ]
+        logger.debug(f"Pouring {volume}ml of {self.settings['NAME']} "
+                     f"by {'weight' if self.by_weight else 'flow'} (target: {self.target_ml}ml)")
+        return True
+    
+    def _open(self):
+        """Event opening the valve and arming the pour control."""
+        self.valve.open()
+        self.control.start(self.target_ml)
+        self._schedule_pulse()
+        if self.by_weight:
+            self.sample_event = self.clock.schedule(self.sample_interval, self._sample)
+    
+    def _pulse(self):
+        """Event of a flow sensor pulse."""
+        self.pulse_event = None
+        action = self.control.add_pulse(self.clock.time())
+        self._schedule_pulse()
+        self._apply(action)
+    
+    def _sample(self):
+        """Event of a scale reading, showing the cup as it was one filter delay ago."""
+        reading = (self.profile.volume_at(self._now() - self.filter_delay) +
+                   self.rng.gauss(0.0, self.weight_noise))
+        self.sample_event = self.clock.schedule(self.sample_interval, self._sample)
+        self._apply(self.control.add_weight(reading, self.filter_delay, self.clock.time()))
+    
+    def _apply(self, action):
+        """Slow or close the valve as the pour control decided."""
+        if self.stop_reason is not None:
+            return
+        if action == CLOSE:
+            self._close('target')
+        elif action == SLOW and not self.slow_pour_started:
+            self.slow_pour_started = True
+            self.profile.switch(self._now(), self.valve.ramp_time, self.slow_rate)
+            self._schedule_pulse()
+            self.valve.open(self.settings['SLOW_POUR_RATE'] * 100)
+            logger.debug(f"Switching {self.beverage_type} tap to slow pour mode")
+    
+    def _close(self, reason):
+        """Close the valve; the flow stops after the close latency."""
+        if self.stop_reason is not None:
+            return
+        self.stop_reason = reason
+        self.valve.close()
+        self.control.closed(self.clock.time())
+        for event in self.events + [self.sample_event]:
+            self.clock.cancel(event)
+        self.sample_event = None
+        if reason == 'timeout':
+            logger.error("Pour timeout - flow might be impeded")
+        
+        latency = max(self.rng.gauss(SIMULATOR_SETTINGS['CLOSE_LATENCY_SEC'],
+                                     SIMULATOR_SETTINGS['CLOSE_LATENCY_SPREAD']), 0.0)
+        self.profile.switch(self._now() + latency, 0.0, 0.0)
+        self._schedule_pulse()
+        
+        # A stopped pour ends once the flow has; others settle and are weighed first
+        if reason == 'stopped':
+            finish_after = latency
+        else:
+            finish_after = self.SETTLE_SEC + (self.weigh_time if self.weigh else 0.0)
+        self.events = [self.clock.schedule(finish_after, self._finished)]
+    
+    def _finished(self):
+        """Event ending the pour."""
+        poured = self.profile.volume_at(self._now())
+        stopped = self.stop_reason == 'stopped'
+        if stopped:
+            measured = self.control.get_estimate()['volume_ml']
+        else:
+            weighed = poured + self.rng.gauss(0.0, self.weight_noise) if self.weigh else None
+            measured, _ = self.control.finish(weighed, self.clock.time())
+            self.control.learn(weighed, self.stop_reason == 'target')
+        
+        self.pouring = False
+        self.events = []
+        self.last_pour = {
+            'beverage': self.beverage_type,
+            'target_ml': self.target_ml,
+            'poured_ml': poured,
+            'measured_ml': measured,
+            'stop_reason': self.stop_reason,
+            'duration': self.clock.time() - self.started_at,
+            'stopped': stopped
+        }
+        logger.debug(f"Pour {'stopped' if stopped else 'complete'}: {poured:.1f}ml in "
+                     f"{self.last_pour['duration']:.1f} seconds")
+        
+        on_done, self.on_done = self.on_done, None
+        if on_done is not None:
+            on_done(not stopped)
+    
+    def get_volume_estimate(self):
+        """Get the pour control's estimate of the volume in the cup."""
+        estimate = self.control.get_estimate()
+        estimate['pouring'] = self.pouring
+        return estimate
+    
+    def pour(self, volume_ml=None):
+        """
+        Pour from this tap, advancing the virtual clock until the pour is done.
+        
+        Args:
+            volume_ml (float, optional): Volume to pour in milliliters.
+        
+        Returns:
+            bool: True if the beverage was poured, False otherwise
+        """
+        return self.clock.complete(lambda on_done: self.start_pour(volume_ml, on_done))
+    
+    def stop_pour(self):
+        """
+        Close the valve now; the pour ends after the close latency.
+        
+        Returns:
+            bool: True if a pour was stopped, False if the tap was idle or already closing
+        """
+        with self.clock.lock:
+            if not self.pouring or self.stop_reason is not None:
+                return False
+            self.stop_pouring = True
+            self._close('stopped')
+            return True
+
+
+class SimBeerDispenser(MockBeerDispenser):
+    """
+    Valve manifold of simulated taps.
+    
+    Pouring a different beverage than the last one is delayed by its
+    LINE_SWITCH_SEC. That is the same unmeasured figure the scheduler
+    plans with, so simulated scheduling gains only restate it.
+    """
+    
+    def __init__(self, simulation=None):
+        """
+        Initialize the simulated manifold.
+        
+        Args:
+            simulation (Simulation, optional): Simulation to run in, the shared one if None
+        """
+        super().__init__()
+        self.simulation = simulation or get_simulation()
+        self.clock = self.simulation.clock
+        # Learned in memory only, so simulated pours never touch the real calibration file
+        self.calibration = FlowCalibration(BEVERAGE_TYPES, None, FLOW_CALIBRATION_SETTINGS)
+        self.taps = {beverage: SimTapChannel(beverage, self.simulation, self.calibration)
+                     for beverage in BEVERAGE_TYPES}
+        self.last_beverage = None
+    
+    def start_pour(self, volume_ml=None, beverage_type=None, on_done=None):
+        """
+        Start a pour without waiting for it.
+        
+        Args:
+            volume_ml (float, optional): Volume to pour in milliliters.
+            beverage_type (str, optional): Type of beverage to pour
+            on_done (callable, optional): Called with True or False when the pour has ended
+        
+        Returns:
+            bool: False if the pour could not be started
+        """
+        if not self.initialized:
+            logger.error("Beverage dispenser not initialized")
+            return False
+        
+        beverage = beverage_type or self.current_beverage
+        if beverage not in self.taps:
+            logger.error(f"Unknown beverage type: {beverage}")
+            return False
+        
+        delay = 0.0
+        if self.last_beverage is not None and self.last_beverage != beverage:
+            delay = self.taps[beverage].settings['LINE_SWITCH_SEC']
+        if not self.taps[beverage].start_pour(volume_ml, on_done, delay):
+            return False
+        self.last_beverage = beverage
+        return True
+    
+    def pour_beer(self, volume_ml=None, beverage_type=None):
+        """
+        Pour a beverage, advancing the virtual clock until the pour is done.
+        
+        Args:
+            volume_ml (float, optional): Volume to pour in milliliters.
+            beverage_type (str, optional): Type of beverage to pour ('beer', 'kofola', or 'birel').
+        
+        Returns:
+            bool: True if the beverage was poured successfully, False otherwise
+        """
+        return self.clock.complete(lambda on_done: self.start_pour(volume_ml, beverage_type, on_done))
+    
+    def get_flow_calibration(self):
+        """
+        Get the flow sensor calibration the simulated taps have learned.
+        
+        Returns:
+            dict: Maps each beverage type to its learned pour count and ml per pulse by frequency
+        """
+        return self.calibration.get_status()
+
+
+class SimCupDelivery(MockCupDelivery):
+    """Conveyor moving cups on the virtual clock."""
+    
+    def __init__(self, simulation=None):
+        """
+        Initialize the simulated conveyor.
+        
+        Args:
+            simulation (Simulation, optional): Simulation to run in, the shared one if None
+        """
+        super().__init__()
+        self.simulation = simulation or get_simulation()
+        self.clock = self.simulation.clock
+        self.model = ConveyorModel(self.simulation.rng('cup_delivery'))
+        self.stop_event = None
+        self.on_done = None
+    
+    def start_delivery(self, on_done):
+        """
+        Start moving the cup at the pour position to pickup without waiting.
+        
+        Args:
+            on_done (callable): Called with True once the cup arrives, or False
+                                if it has not arrived within DELIVERY_TIMEOUT_SEC
+        
+        Returns:
+            bool: False if the conveyor is not ready
+        """
+        if not self.initialized:
+            logger.error("Cup delivery system not initialized")
+            return False
+        if self.conveyor_running:
+            logger.error("Delivery system already in use")
+            return False
+        
+        speed = DELIVERY_SETTINGS['CONVEYOR_SPEED']
+        timeout = DELIVERY_SETTINGS['DELIVERY_TIMEOUT_SEC']
+        travel_time = self.model.travel_time(speed)
+        arrived = travel_time is not None and travel_time <= timeout
+        
+        self.conveyor_running = True
+        self.conveyor_speed = speed
+        self.stop_conveyor_flag = False
+        self.on_done = on_done
+        self.stop_event = self.clock.schedule(travel_time if arrived else timeout, self._finish, arrived)
+        logger.debug(f"Conveyor started at speed {speed}%")
+        self._cup_left_pour_position()
+        return True
+    
+    def _finish(self, arrived):
+        """Event stopping the belt."""
+        self.conveyor_running = False
+        self.conveyor_speed = 0
+        self.stop_event = None
+        on_done, self.on_done = self.on_done, None
+        if on_done is not None:
+            if arrived:
+                logger.debug("Cup delivered successfully")
+            else:
+                logger.error("Failed to deliver cup")
+            on_done(arrived)
+    
+    def deliver_cup(self):
+        """Deliver a cup, advancing the virtual clock until it is done."""
+        return self.clock.complete(self.start_delivery)
+    
+    def move_conveyor(self, speed=None, duration=None):
+        """Run the conveyor, stopping it after duration virtual seconds if given."""
+        if not self.initialized:
+            logger.error("Cup delivery system not initialized")
+            return False
+        if self.conveyor_running:
+            logger.error("Conveyor already running")
+            return False
+        
+        self.conveyor_running = True
+        self.conveyor_speed = speed if speed is not None else DELIVERY_SETTINGS['CONVEYOR_SPEED']
+        self.stop_conveyor_flag = False
+        if duration is not None:
+            self.stop_event = self.clock.schedule(duration, self._finish, False)
+        logger.debug(f"Conveyor started at speed {self.conveyor_speed}%")
+        return True
+    
+    def stop_conveyor(self):
+        """Stop the belt; a delivery in progress fails."""
+        with self.clock.lock:
+            if not self.conveyor_running:
+                return False
+            self.stop_conveyor_flag = True
+            self.clock.cancel(self.stop_event)
+            self._finish(False)
+            logger.debug("Conveyor stopped")
+            return True
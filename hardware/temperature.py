@@ -0,0 +1,150 @@
+"""
+Background sampling of DS18B20 1-Wire temperature sensors on the beverage lines.
+"""
+import os
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Value a DS18B20 reports before its first conversion after power-up
+POWER_ON_RESET_MILLIDEGREES = 85000
+
+def read_w1_temperature(device_path):
+    """
+    Read a DS18B20 through the kernel's w1_slave file.
+    
+    The read blocks for the sensor's conversion time, about 750 ms at
+    12-bit resolution.
+    
+    Args:
+        device_path (str): Directory of the 1-Wire device, e.g. /sys/bus/w1/devices/28-0123456789ab
+    
+    Returns:
+        float: Temperature in Celsius or None if the reading is invalid
+    """
+    with open(os.path.join(device_path, 'w1_slave')) as f:
+        lines = f.read().splitlines()
+    
+    # First line ends in YES when the CRC matched
+    if len(lines) < 2 or not lines[0].strip().endswith('YES'):
+        return None
+    
+    marker = lines[1].find('t=')
+    if marker < 0:
+        return None
+    
+    millidegrees = int(lines[1][marker + 2:])
+    if millidegrees == POWER_ON_RESET_MILLIDEGREES:
+        return None
+    return millidegrees / 1000.0
+
+
+class TemperatureSampler:
+    """
+    Reads every line's temperature sensor on a background thread.
+    
+    Readers get the cached value with its age, so they never wait for a
+    1-Wire conversion.
+    """
+    
+    def __init__(self, sensor_ids, base_path, interval, stale_after, sensor_bus=None):
+        """
+        Initialize the sampler.
+        
+        Args:
+            sensor_ids (dict): Maps each beverage type to its 1-Wire device ID, or None
+            base_path (str): Directory containing the 1-Wire device directories
+            interval (float): Seconds between sampling rounds
+            stale_after (float): Age in seconds after which a reading is flagged stale
+            sensor_bus (SensorBus, optional): Bus to publish '<beverage>_temperature' on
+        """
+        self.sensor_ids = {beverage: device for beverage, device in sensor_ids.items() if device}
+        self.base_path = base_path
+        self.interval = interval
+        self.stale_after = stale_after
+        self.sensor_bus = sensor_bus
+        
+        self.readings = {}  # beverage -> (temperature, timestamp)
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+    
+    def start(self):
+        """Start the sampling thread."""
+        if self.thread and self.thread.is_alive():
+            return
+        if not self.sensor_ids:
+            logger.warning("No temperature sensors configured")
+            return
+        
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._sampling_loop, daemon=True)
+        self.thread.start()
+        logger.info(f"Temperature sampling started for: {', '.join(self.sensor_ids)}")
+    
+    def _sample(self, beverage, device):
+        """Read one sensor and cache the result."""
+        try:
+            temperature = read_w1_temperature(os.path.join(self.base_path, device))
+        except (OSError, ValueError) as e:
+            logger.error(f"Error reading {beverage} temperature sensor {device}: {e}")
+            return
+        
+        if temperature is None:
+            logger.warning(f"Invalid reading from {beverage} temperature sensor {device}")
+            return
+        
+        timestamp = time.time()
+        with self.lock:
+            self.readings[beverage] = (temperature, timestamp)
+        
+        if self.sensor_bus is not None:
+            self.sensor_bus.publish(f"{beverage}_temperature", temperature, timestamp)
+    
+    def _sampling_loop(self):
+        """Background thread reading each sensor in turn."""
+        while not self.stop_event.is_set():
+            for beverage, device in self.sensor_ids.items():
+                if self.stop_event.is_set():
+                    break
+                self._sample(beverage, device)
+            self.stop_event.wait(self.interval)
+    
+    def get_reading(self, beverage):
+        """
+        Get the cached reading for a beverage line.
+        
+        Args:
+            beverage (str): Beverage type
+        
+        Returns:
+            dict: Temperature in Celsius, timestamp and stale flag; temperature
+                  and timestamp are None if the line was never read
+        """
+        with self.lock:
+            temperature, timestamp = self.readings.get(beverage, (None, None))
+        
+        stale = timestamp is None or time.time() - timestamp > self.stale_after
+        return {
+            'temperature': temperature,
+            'timestamp': timestamp,
+            'stale': stale
+        }
+    
+    def get_readings(self):
+        """
+        Get the cached readings for every configured line.
+        
+        Returns:
+            dict: Maps each beverage type to its reading
+        """
+        return {beverage: self.get_reading(beverage) for beverage in self.sensor_ids}
+    
+    def stop(self):
+        """Stop the sampling thread."""
+        self.stop_event.set()
+        if self.thread and self.thread.is_alive():
+            # A conversion in progress finishes first
+            self.thread.join(timeout=2.0)
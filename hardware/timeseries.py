@@ -0,0 +1,286 @@
+"""
+Tiered sensor time-series store with fixed memory use.
+"""
+import time
+import bisect
+import threading
+from hardware.ring_buffer import RingBuffer
+
+
+class _Bucket:
+    """Running min/max/mean of the samples in one time bucket."""
+    
+    __slots__ = ('start', 'minimum', 'maximum', 'total', 'count')
+    
+    def __init__(self, start):
+        self.start = start
+        self.minimum = float('inf')
+        self.maximum = float('-inf')
+        self.total = 0.0
+        self.count = 0
+    
+    def add(self, minimum, maximum, total, count):
+        """Merge samples or a finished finer bucket into this one."""
+        self.minimum = min(self.minimum, minimum)
+        self.maximum = max(self.maximum, maximum)
+        self.total += total
+        self.count += count
+
+
+class RollupTier:
+    """Fixed number of min/max/mean buckets of one width, oldest overwritten first."""
+    
+    def __init__(self, width, capacity):
+        """
+        Initialize the tier.
+        
+        Args:
+            width (int): Bucket width in seconds
+            capacity (int): Number of buckets kept
+        """
+        self.width = width
+        self.starts = RingBuffer(capacity, 'd')
+        self.minimums = RingBuffer(capacity, 'f')
+        self.maximums = RingBuffer(capacity, 'f')
+        self.means = RingBuffer(capacity, 'f')
+        self.counts = RingBuffer(capacity, 'I')
+        self.current = None
+    
+    def add(self, timestamp, minimum, maximum, total, count):
+        """
+        Add samples, closing the current bucket when they fall in a later one.
+        
+        Returns:
+            _Bucket: The bucket that was closed, or None
+        """
+        start = timestamp - timestamp % self.width
+        closed = None
+        if self.current is not None and start != self.current.start:
+            closed = self.current
+            self._store(closed)
+            self.current = None
+        if self.current is None:
+            self.current = _Bucket(start)
+        self.current.add(minimum, maximum, total, count)
+        return closed
+    
+    def _store(self, bucket):
+        """Append a finished bucket to the arrays."""
+        self.starts.append(bucket.start)
+        self.minimums.append(bucket.minimum)
+        self.maximums.append(bucket.maximum)
+        self.means.append(bucket.total / bucket.count)
+        self.counts.append(bucket.count)
+    
+    def query(self, since=None, open_buckets=()):
+        """
+        Get the finished buckets followed by the ones still being filled.
+        
+        Args:
+            since (float, optional): Only buckets starting at or after this time
+            open_buckets (iterable): Unfinished buckets of this width, oldest first
+        
+        Returns:
+            dict: Parallel lists 'time', 'min', 'max', 'mean' and 'count'
+        """
+        starts = self.starts.values()
+        first = bisect.bisect_left(starts, since) if since is not None else 0
+        n = len(starts) - first
+        result = {
+            'time': starts[first:],
+            'min': self.minimums.values(n),
+            'max': self.maximums.values(n),
+            'mean': self.means.values(n),
+            'count': self.counts.values(n)
+        }
+        for bucket in open_buckets:
+            if since is None or bucket.start >= since:
+                result['time'].append(float(bucket.start))
+                result['min'].append(bucket.minimum)
+                result['max'].append(bucket.maximum)
+                result['mean'].append(bucket.total / bucket.count)
+                result['count'].append(bucket.count)
+        return result
+    
+    def memory_bytes(self):
+        """Storage allocated for the tier's arrays."""
+        return sum(buffer.data.itemsize * buffer.capacity
+                   for buffer in (self.starts, self.minimums, self.maximums, self.means, self.counts))
+
+
+class TimeSeries:
+    """
+    Raw samples of one sensor channel plus coarser roll-ups.
+    
+    Raw samples are kept until the raw buffer wraps. Every sample also
+    feeds the finest tier, and each bucket a tier closes feeds the next
+    coarser one, so a week of history costs a fixed few hundred kilobytes.
+    """
+    
+    def __init__(self, raw_capacity, tiers):
+        """
+        Initialize the series.
+        
+        Args:
+            raw_capacity (int): Number of raw samples kept
+            tiers (list): (bucket width in seconds, bucket count) from finest to coarsest
+        """
+        self.times = RingBuffer(raw_capacity, 'd')
+        self.values = RingBuffer(raw_capacity, 'f')
+        self.tiers = [RollupTier(width, capacity) for width, capacity in tiers]
+    
+    def add(self, value, timestamp):
+        """
+        Record a sample.
+        
+        Args:
+            value (float): Sample value
+            timestamp (float): Time of the sample in seconds since the epoch
+        """
+        self.times.append(timestamp)
+        self.values.append(value)
+        
+        closed = self.tiers[0].add(timestamp, value, value, value, 1)
+        for tier in self.tiers[1:]:
+            if closed is None:
+                break
+            closed = tier.add(closed.start, closed.minimum, closed.maximum, closed.total, closed.count)
+    
+    def open_buckets(self, index):
+        """
+        Get a tier's buckets that are still being filled.
+        
+        A bucket only closes when a sample for a later one arrives, and the
+        finer tiers' open buckets have not been rolled up yet, so the newest
+        data of a tier is the sum of its own and every finer tier's open
+        bucket. That can span two buckets right after a boundary.
+        
+        Args:
+            index (int): Tier index, finest first
+        
+        Returns:
+            list: Buckets of the tier's width, oldest first
+        """
+        width = self.tiers[index].width
+        buckets = {}
+        for tier in self.tiers[:index + 1]:
+            current = tier.current
+            if current is None:
+                continue
+            start = current.start - current.start % width
+            if start not in buckets:
+                buckets[start] = _Bucket(start)
+            buckets[start].add(current.minimum, current.maximum, current.total, current.count)
+        return [buckets[start] for start in sorted(buckets)]
+    
+    def query_tier(self, index, since=None):
+        """
+        Get the buckets of a tier, including the ones still being filled.
+        
+        Args:
+            index (int): Tier index, finest first
+            since (float, optional): Only buckets starting at or after this time
+        
+        Returns:
+            dict: Parallel lists 'time', 'min', 'max', 'mean' and 'count'
+        """
+        return self.tiers[index].query(since, self.open_buckets(index))
+    
+    def query_raw(self, since=None):
+        """
+        Get the raw samples.
+        
+        Args:
+            since (float, optional): Only samples at or after this time
+        
+        Returns:
+            dict: Parallel lists 'time' and 'value'
+        """
+        times = self.times.values()
+        first = bisect.bisect_left(times, since) if since is not None else 0
+        return {
+            'time': times[first:],
+            'value': self.values.values(len(times) - first)
+        }
+    
+    def memory_bytes(self):
+        """Storage allocated for the series."""
+        raw = sum(buffer.data.itemsize * buffer.capacity for buffer in (self.times, self.values))
+        return raw + sum(tier.memory_bytes() for tier in self.tiers)
+
+
+class TelemetryStore:
+    """Time series for a fixed set of sensor channels."""
+    
+    def __init__(self, channels, raw_capacity, tiers):
+        """
+        Initialize the store.
+        
+        Args:
+            channels (list): Channel names to record
+            raw_capacity (int): Number of raw samples kept per channel
+            tiers (dict): Maps resolution names to (bucket width in seconds, bucket count),
+                          from finest to coarsest
+        """
+        self.resolutions = list(tiers)
+        self.series = {
+            channel: TimeSeries(raw_capacity, list(tiers.values()))
+            for channel in channels
+        }
+        self.lock = threading.Lock()
+    
+    @property
+    def channels(self):
+        """list: Recorded channel names."""
+        return list(self.series)
+    
+    def record(self, channel, value, timestamp=None):
+        """
+        Record a sample; samples for unknown channels are ignored.
+        
+        Args:
+            channel (str): Channel name
+            value (float): Sample value; booleans are stored as 0 or 1
+            timestamp (float, optional): Time of the sample, defaults to now
+        """
+        series = self.series.get(channel)
+        if series is None or value is None:
+            return
+        with self.lock:
+            series.add(float(value), timestamp if timestamp is not None else time.time())
+    
+    def query(self, channel, resolution='raw', since=None):
+        """
+        Get the history of a channel.
+        
+        Args:
+            channel (str): Channel name
+            resolution (str): 'raw' or one of the tier names
+            since (float, optional): Only data at or after this time
+        
+        Returns:
+            dict: Parallel lists of the samples or buckets; the newest
+                  buckets may still be filling
+        
+        Raises:
+            ValueError: If the channel or resolution is unknown
+        """
+        if channel not in self.series:
+            raise ValueError(f"Unknown channel: {channel}")
+        if resolution != 'raw' and resolution not in self.resolutions:
+            raise ValueError(f"Unknown resolution: {resolution}")
+        
+        series = self.series[channel]
+        with self.lock:
+            if resolution == 'raw':
+                return series.query_raw(since)
+            return series.query_tier(self.resolutions.index(resolution), since)
+    
+    def memory_bytes(self):
+        """
+        Get the storage allocated for every channel.
+        
+        Returns:
+            int: Bytes allocated, independent of how much has been recorded
+        """
+        return sum(series.memory_bytes() for series in self.series.values())
@@ -0,0 +1,129 @@
+"""
+PWM valve driver for proportional control of beverage valves.
+"""
+import logging
+import threading
+from config import VALVE_SETTINGS
+
+logger = logging.getLogger(__name__)
+
+class ValveDriver:
+    """Drives a beverage valve with PWM so partial flow rates can be held."""
+    
+    def __init__(self, pin, gpio, frequency=None, ramp_time=None, ramp_steps=None):
+        """
+        Initialize the valve driver.
+        
+        Args:
+            pin (int): GPIO pin driving the valve
+            gpio: GPIO module to use (RPi.GPIO or mock_gpio)
+            frequency (float, optional): PWM frequency in Hz
+            ramp_time (float, optional): Duration of a duty cycle ramp in seconds
+            ramp_steps (int, optional): Number of duty cycle steps in a ramp
+        """
+        self.pin = pin
+        self.gpio = gpio
+        self.frequency = frequency or VALVE_SETTINGS['PWM_FREQUENCY_HZ']
+        self.ramp_time = ramp_time if ramp_time is not None else VALVE_SETTINGS['RAMP_TIME_SEC']
+        self.ramp_steps = ramp_steps or VALVE_SETTINGS['RAMP_STEPS']
+        
+        self.pwm = None
+        self.duty_cycle = 0.0
+        self.is_open = False
+        self.lock = threading.Lock()
+        self.ramp_cancel = threading.Event()
+        self.ramp_thread = None
+    
+    def initialize(self):
+        """Set up the valve pin and start PWM with the valve closed."""
+        self.gpio.setup(self.pin, self.gpio.OUT)
+        self.pwm = self.gpio.PWM(self.pin, self.frequency)
+        self.pwm.start(0)
+        self.duty_cycle = 0.0
+        self.is_open = False
+    
+    def _set_duty_locked(self, duty_cycle):
+        """Apply a duty cycle; must be called with lock held."""
+        self.duty_cycle = duty_cycle
+        self.pwm.ChangeDutyCycle(duty_cycle)
+    
+    def _cancel_ramp_locked(self):
+        """Stop any running ramp; must be called with lock held."""
+        self.ramp_cancel.set()
+        self.ramp_cancel = threading.Event()
+    
+    def open(self, duty_cycle=100.0):
+        """
+        Open the valve immediately.
+        
+        Args:
+            duty_cycle (float): Opening in percent (0-100)
+        """
+        with self.lock:
+            self._cancel_ramp_locked()
+            self.is_open = True
+            self._set_duty_locked(duty_cycle)
+    
+    def close(self):
+        """Close the valve immediately, cancelling any ramp in progress."""
+        with self.lock:
+            self._cancel_ramp_locked()
+            self.is_open = False
+            self._set_duty_locked(0)
+    
+    def ramp_to(self, duty_cycle, duration=None):
+        """
+        Move the valve opening smoothly to a new duty cycle.
+        
+        The ramp runs in the background and is abandoned if the valve is
+        closed or another ramp is started.
+        
+        Args:
+            duty_cycle (float): Target opening in percent (0-100)
+            duration (float, optional): Ramp duration, uses the default if None
+        
+        Returns:
+            bool: True if the ramp was started, False if the valve is closed
+        """
+        duration = self.ramp_time if duration is None else duration
+        
+        with self.lock:
+            if not self.is_open:
+                return False
+            
+            self._cancel_ramp_locked()
+            if duration <= 0:
+                self._set_duty_locked(duty_cycle)
+                return True
+            
+            cancel = self.ramp_cancel
+            start_duty = self.duty_cycle
+        
+        self.ramp_thread = threading.Thread(
+            target=self._ramp,
+            args=(start_duty, duty_cycle, duration, cancel),
+            daemon=True
+        )
+        self.ramp_thread.start()
+        return True
+    
+    def _ramp(self, start_duty, end_duty, duration, cancel):
+        """Background thread stepping the duty cycle towards the target."""
+        step_time = duration / self.ramp_steps
+        for step in range(1, self.ramp_steps + 1):
+            if cancel.wait(step_time):
+                return
+            
+            with self.lock:
+                if cancel.is_set():
+                    return
+                self._set_duty_locked(start_duty + (end_duty - start_duty) * step / self.ramp_steps)
+        
+        logger.debug(f"Valve on GPIO {self.pin} ramped to {end_duty:.0f}%")
+    
+    def cleanup(self):
+        """Close the valve and stop PWM."""
+        if self.pwm:
+            self.close()
+            self.pwm.stop()
+            self.pwm = None
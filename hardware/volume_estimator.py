@@ -0,0 +1,147 @@
+"""
+Volume-in-cup estimation fusing flow sensor pulses with scale readings.
+"""
+import math
+from hardware.ring_buffer import RingBuffer
+
+
+class VolumeEstimator:
+    """
+    Kalman filter for the volume in the cup and the flow sensor calibration.
+    
+    The state is the poured volume in ml and a scale factor on the nominal
+    volume per pulse. Every pulse advances the volume at once, so the
+    estimate reacts as fast as the flow sensor. Each weight reading then
+    corrects both the volume and the scale factor. A reading describes the
+    cup as it was one filter delay ago, so it is compared with the estimate
+    minus the pulses counted since then.
+    
+    The scale factor is kept between pours, so every weighed pour also
+    calibrates the pulse count of the pours that follow. When the volume
+    of each pulse comes from a calibration curve instead of the nominal
+    value, reset_scale() starts every pour from that curve.
+    """
+    
+    def __init__(self, ml_per_pulse, pulse_noise=0.05, scale_drift=0.002,
+                 initial_scale_std=0.1, weight_noise_ml=3.0, history=128):
+        """
+        Initialize the estimator.
+        
+        Args:
+            ml_per_pulse (float): Nominal flow sensor calibration
+            pulse_noise (float): Relative spread of the volume of a single pulse
+            scale_drift (float): Random walk of the scale factor per pulse
+            initial_scale_std (float): Uncertainty of the nominal calibration
+            weight_noise_ml (float): Standard deviation of a weight reading in ml
+            history (int): Number of recent pulse timestamps kept for delayed readings
+        """
+        self.nominal_ml_per_pulse = ml_per_pulse
+        self.pulse_noise = pulse_noise
+        self.scale_drift = scale_drift
+        self.weight_noise_ml = weight_noise_ml
+        self.initial_scale_std = initial_scale_std
+        self.pulse_times = RingBuffer(history)
+        self.pulse_volumes = RingBuffer(history)  # Unscaled volume of each pulse
+        
+        self.reset_scale()
+        self.reset()
+    
+    @property
+    def ml_per_pulse(self):
+        """float: Calibrated volume per pulse."""
+        return self.nominal_ml_per_pulse * self.scale
+    
+    def reset(self):
+        """Start a new pour with an empty cup, keeping the learned calibration."""
+        self.volume = 0.0
+        self.volume_var = 0.0
+        self.covariance = 0.0  # Between volume and scale
+        self.pulse_times.clear()
+        self.pulse_volumes.clear()
+    
+    def reset_scale(self, scale_std=None):
+        """
+        Forget the learned scale factor.
+        
+        Args:
+            scale_std (float, optional): Uncertainty of the calibration in use,
+                                         the initial uncertainty if None
+        """
+        self.scale = 1.0
+        self.scale_var = (self.initial_scale_std if scale_std is None else scale_std) ** 2
+    
+    def add_pulses(self, count, timestamp, ml_per_pulse=None):
+        """
+        Advance the estimate by flow sensor pulses.
+        
+        Args:
+            count (int): Number of new pulses
+            timestamp (float): Monotonic time of the pulses in seconds
+            ml_per_pulse (float, optional): Calibrated volume of these pulses,
+                                            the nominal volume if None
+        """
+        pulse_ml = self.nominal_ml_per_pulse if ml_per_pulse is None else ml_per_pulse
+        step = pulse_ml * count
+        self.volume += step * self.scale
+        
+        # Propagate through volume += step * scale
+        self.volume_var += 2 * step * self.covariance + step * step * self.scale_var
+        self.covariance += step * self.scale_var
+        
+        # Per-pulse noise and calibration drift
+        self.volume_var += count * (pulse_ml * self.scale * self.pulse_noise) ** 2
+        self.scale_var += count * self.scale_drift ** 2
+        
+        for _ in range(count):
+            self.pulse_times.append(timestamp)
+            self.pulse_volumes.append(pulse_ml)
+    
+    def _volume_since(self, timestamp):
+        """Sum the unscaled volume of the recorded pulses newer than timestamp."""
+        volume = 0.0
+        for pulse_time, pulse_ml in zip(reversed(self.pulse_times.values()),
+                                        reversed(self.pulse_volumes.values())):
+            if pulse_time <= timestamp:
+                break
+            volume += pulse_ml
+        return volume
+    
+    def add_weight(self, volume_ml, lag, now):
+        """
+        Correct the estimate with a scale reading.
+        
+        Args:
+            volume_ml (float): Net weight converted to volume
+            lag (float): Seconds the reading lags behind the cup
+            now (float): Current monotonic time in seconds
+        """
+        # The reading sees the volume before the pulses of the last lag seconds
+        w = self._volume_since(now - lag)
+        predicted = self.volume - w * self.scale
+        
+        # Innovation covariance for the reading model [1, -w]
+        hp_volume = self.volume_var - w * self.covariance
+        hp_scale = self.covariance - w * self.scale_var
+        innovation_var = hp_volume - w * hp_scale + self.weight_noise_ml ** 2
+        if innovation_var <= 0:
+            return
+        
+        gain_volume = hp_volume / innovation_var
+        gain_scale = hp_scale / innovation_var
+        innovation = volume_ml - predicted
+        
+        self.volume += gain_volume * innovation
+        self.scale = min(max(self.scale + gain_scale * innovation, 0.5), 2.0)
+        
+        self.volume_var -= gain_volume * hp_volume
+        self.covariance -= gain_volume * hp_scale
+        self.scale_var -= gain_scale * hp_scale
+    
+    def estimate(self):
+        """
+        Get the current volume estimate.
+        
+        Returns:
+            tuple: (volume_ml, uncertainty_ml) where uncertainty is one standard deviation
+        """
+        return self.volume, math.sqrt(max(self.volume_var, 0.0))
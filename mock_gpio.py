@@ -4,6 +4,7 @@ This allows the beer dispensing system to run without actual Raspberry Pi hardwa
 """
 import logging
 import random
+import threading
 import time
 
 logger = logging.getLogger(__name__)
@@ -26,8 +27,11 @@ PUD_OFF = 20
 _gpio_mode = None
 _pin_states = {}
 _pin_modes = {}
-_event_callbacks = {}
+_event_callbacks = {}  # channel -> callbacks run on a matching edge
+_event_edges = {}  # channel -> edge enabled by add_event_detect
 _pwm_instances = {}
+_edge_condition = threading.Condition()
+_edge_counts = {}
 
 def setmode(mode):
     """Set the GPIO mode (BCM or BOARD)."""
@@ -52,7 +56,8 @@ def setup(channel, direction, pull_up_down=PUD_OFF, initial=None):
         _pin_states[channel] = HIGH if initial == HIGH else LOW
         logger.debug(f"Set up GPIO {channel} as OUTPUT with initial value {_pin_states[channel]}")
     else:
-        _pin_states[channel] = LOW
+        # An unconnected input reads as its pull resistor
+        _pin_states[channel] = HIGH if pull_up_down == PUD_UP else LOW
         logger.debug(f"Set up GPIO {channel} as INPUT")
 
 def input(channel):
@@ -61,8 +66,9 @@ def input(channel):
     if channel not in _pin_states:
         _pin_states[channel] = LOW
     
-    # For simulation, randomly change some input values occasionally
-    if random.random() < 0.1 and _pin_modes.get(channel) == IN:
+    # For simulation, randomly change some input values occasionally. Pins with
+    # edge detection only change through trigger_input_event, so reads match the edges.
+    if random.random() < 0.1 and _pin_modes.get(channel) == IN and channel not in _event_edges:
         _pin_states[channel] = random.choice([HIGH, LOW])
     
     logger.debug(f"Reading GPIO {channel}: {_pin_states[channel]}")
@@ -80,12 +86,13 @@ def output(channel, value):
 
 def cleanup(channel=None):
     """Clean up GPIO resources."""
-    global _pin_states, _pin_modes, _event_callbacks
+    global _pin_states, _pin_modes, _event_callbacks, _event_edges
     
     if channel is None:
         _pin_states = {}
         _pin_modes = {}
         _event_callbacks = {}
+        _event_edges = {}
         logger.debug("Cleaned up all GPIO resources")
     elif isinstance(channel, list):
         for ch in channel:
@@ -95,26 +102,49 @@ def cleanup(channel=None):
             del _pin_states[channel]
         if channel in _pin_modes:
             del _pin_modes[channel]
-        if channel in _event_callbacks:
-            del _event_callbacks[channel]
+        _event_callbacks.pop(channel, None)
+        _event_edges.pop(channel, None)
         logger.debug(f"Cleaned up GPIO {channel}")
 
 def add_event_detect(channel, edge, callback=None, bouncetime=None):
-    """Add event detection to a GPIO channel."""
-    _event_callbacks[channel] = callback
+    """
+    Add event detection to a GPIO channel.
+    
+    Like RPi.GPIO, a channel can only have one edge detection; further
+    callbacks are added with add_event_callback().
+    """
+    if channel in _event_edges:
+        raise RuntimeError("Conflicting edge detection already enabled for this GPIO channel")
+    _event_edges[channel] = edge
+    _event_callbacks[channel] = [callback] if callback is not None else []
     logger.debug(f"Added event detection to GPIO {channel}")
 
 def remove_event_detect(channel):
-    """Remove event detection from a GPIO channel."""
-    if channel in _event_callbacks:
-        del _event_callbacks[channel]
+    """Remove event detection and its callbacks from a GPIO channel."""
+    _event_callbacks.pop(channel, None)
+    _event_edges.pop(channel, None)
     logger.debug(f"Removed event detection from GPIO {channel}")
 
 def add_event_callback(channel, callback):
     """Add a callback for an event already defined using add_event_detect()."""
-    _event_callbacks[channel] = callback
+    if channel not in _event_edges:
+        raise RuntimeError("Add event detection using add_event_detect first before adding a callback")
+    _event_callbacks[channel].append(callback)
     logger.debug(f"Added event callback to GPIO {channel}")
 
+def wait_for_edge(channel, edge, bouncetime=None, timeout=None):
+    """
+    Block until an edge is triggered on a GPIO channel.
+    
+    Returns the channel, or None if timeout (in milliseconds) expires first.
+    """
+    with _edge_condition:
+        start = _edge_counts.get(channel, 0)
+        if _edge_condition.wait_for(lambda: _edge_counts.get(channel, 0) != start,
+                                    timeout / 1000.0 if timeout is not None else None):
+            return channel
+    return None
+
 def event_detected(channel):
     """Returns True if an edge has been detected on the channel."""
     return random.random() < 0.05  # Simulate occasional edge detection
@@ -158,17 +188,26 @@ def trigger_input_event(channel, value):
     """
     Trigger an input event on a GPIO pin.
     This can be used to simulate sensor activation.
+    
+    A change matching the pin's detected edge runs its callbacks in the
+    calling thread before this returns, so edge-triggered code sees the
+    change at once.
     """
     old_value = _pin_states.get(channel, LOW)
     _pin_states[channel] = value
     
-    if channel in _event_callbacks and _event_callbacks[channel] is not None:
-        edge = None
-        if old_value == LOW and value == HIGH:
-            edge = RISING
-        elif old_value == HIGH and value == LOW:
-            edge = FALLING
-            
-        if edge:
-            logger.debug(f"Triggering event callback for GPIO {channel}")
-            _event_callbacks[channel](channel)
\ No newline at end of file
+    if old_value != value:
+        with _edge_condition:
+            _edge_counts[channel] = _edge_counts.get(channel, 0) + 1
+            _edge_condition.notify_all()
+    
+    edge = None
+    if old_value == LOW and value == HIGH:
+        edge = RISING
+    elif old_value == HIGH and value == LOW:
+        edge = FALLING
+    
+    if edge and _event_edges.get(channel) in (edge, BOTH):
+        logger.debug(f"Triggering event callbacks for GPIO {channel}")
+        for callback in list(_event_callbacks.get(channel, ())):
+            callback(channel)
\ No newline at end of file
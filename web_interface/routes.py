@@ -123,7 +123,7 @@ def system_status():
     if _controller is None:
         return jsonify({"error": "System not available"}), 503
     
-    status = _controller.get_system_status()
+    status = _controller.get_system_state()
     
     # Add additional information for the UI
     status['server_time'] = time.time()
@@ -147,24 +147,31 @@ def system_reset():
 
 @app.route('/api/dispense', methods=['POST'])
 def dispense():
-    """Manually dispense a beverage."""
+    """Manually queue a single beverage."""
     if _controller is None:
         return jsonify({"error": "System not available"}), 503
     
-    # Get parameters
+    # Get parameters; the control page sends 'volume'
     beverage_type = request.json.get('beverage_type', 'beer')
-    volume_ml = request.json.get('volume_ml', 300)
+    volume_ml = request.json.get('volume_ml', request.json.get('volume'))
     
     try:
-        # Start dispensing sequence
-        success, message = _controller.dispense_sequence.execute_full_sequence(volume_ml=volume_ml)
-        
-        if success:
-            return jsonify({"status": "Dispensing successful", "message": message})
-        else:
-            return jsonify({"error": message}), 400
+        # Queued like any other order; poll /api/dispensing_status for the outcome
+        order = _controller.submit_order([{'beverage': beverage_type, 'size': volume_ml}])
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        logger.error(f"Error queueing manual dispense: {str(e)}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+    
+    if order is None:
+        return jsonify({"status": "error", "message": "Dispenser is busy, please try again shortly"}), 503
+    
+    return jsonify({
+        "status": "success",
+        "message": "Dispensing queued",
+        "order_id": order.order_id
+    })
 
 
 @app.route('/api/save_state', methods=['POST'])
@@ -192,10 +199,91 @@ def get_errors():
     if _controller is None:
         return jsonify({"error": "System not available"}), 503
     
-    errors = _controller.error_handler.get_error_history()
+    # Clients pass the last id they have seen to fetch only newer errors
+    since_id = request.args.get('since', type=int)
+    errors = _controller.error_handler.get_error_history(since_id)
+    
+    return jsonify({
+        "errors": errors,
+        "last_id": errors[-1]['id'] if errors else since_id
+    })
+
+
+@app.route('/api/inventory', methods=['GET'])
+def inventory():
+    """Get the remaining consumables and their time-to-empty."""
+    if _controller is None:
+        return jsonify({"error": "System not available"}), 503
+    
+    return jsonify({
+        "inventory": _controller.get_inventory()
+    })
+
+
+@app.route('/api/inventory/refill', methods=['POST'])
+def inventory_refill():
+    """Record a keg swap or a restocked cup stack."""
+    if _controller is None:
+        return jsonify({"error": "System not available"}), 503
+    
+    data = request.get_json() or {}
+    item = data.get('item')
+    level = data.get('level')
+    
+    if not item:
+        return jsonify({"error": "No item provided"}), 400
+    
+    try:
+        level = float(level) if level is not None else None
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid level"}), 400
+    
+    if not _controller.refill_inventory(item, level):
+        return jsonify({"error": f"Unknown inventory item: {item}"}), 400
+    
+    return jsonify({
+        "status": "Refill recorded",
+        "inventory": _controller.get_inventory()
+    })
+
+
+@app.route('/api/pours', methods=['GET'])
+def recent_pours():
+    """Get the newest pours from the ledger."""
+    if _controller is None:
+        return jsonify({"error": "System not available"}), 503
+    
+    limit = request.args.get('limit', 50, type=int)
+    
+    try:
+        pours = _controller.get_recent_pours(min(max(limit, 1), 500))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    
+    return jsonify({
+        "pours": pours
+    })
+
+
+@app.route('/api/sensors/history', methods=['GET'])
+def sensor_history():
+    """Get the recorded history of a sensor channel."""
+    if _controller is None:
+        return jsonify({"error": "System not available"}), 503
+    
+    channel = request.args.get('channel', 'weight')
+    resolution = request.args.get('resolution', 'raw')
+    since = request.args.get('since', type=float)
+    
+    try:
+        history = _controller.get_sensor_history(channel, resolution, since)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
     return jsonify({
-        "errors": errors
+        "channel": channel,
+        "resolution": resolution,
+        "history": history
     })
 
 
@@ -385,30 +473,35 @@ def start_dispensing():
         }), 400
     
     try:
-        # In a real implementation, this would trigger the actual hardware
-        # Here we'll just simulate success
-        logger.info(f"Starting dispensing for order: {order_items}")
-        
-        # Store order in session for status checks
-        session['current_order'] = {
-            'items': order_items,
-            'start_time': time.time(),
-            'status': 'preparing',
-            'progress': 10,
-            'current_item_index': 0
-        }
-        
+        order = _controller.submit_order(order_items)
+    except ValueError as e:
         return jsonify({
-            "success": True,
-            "message": "Dispensing started",
-            "order_id": str(int(time.time()))  # Mock order ID
-        })
+            "success": False,
+            "message": str(e)
+        }), 400
     except Exception as e:
         logger.error(f"Error starting dispensing: {str(e)}")
         return jsonify({
             "success": False,
             "message": str(e)
         }), 500
+    
+    if order is None:
+        return jsonify({
+            "success": False,
+            "message": "Dispenser is busy, please try again shortly"
+        }), 503
+    
+    logger.info(f"Starting dispensing for order {order.order_id}: {order_items}")
+    
+    # Remember the order for status checks from this kiosk
+    session['current_order_id'] = order.order_id
+    
+    return jsonify({
+        "success": True,
+        "message": "Dispensing started",
+        "order_id": order.order_id
+    })
 
 
 @app.route('/api/dispensing_status')
@@ -417,61 +510,18 @@ def dispensing_status():
     if _controller is None:
         return jsonify({"error": "System not available"}), 503
     
-    # Get order from session
-    current_order = session.get('current_order', None)
+    # Look up the order given by the client, or the last one from this session
+    order_id = request.args.get('order_id') or session.get('current_order_id')
+    order_status = _controller.get_order_status(order_id) if order_id else None
     
-    if not current_order:
+    if not order_status:
         return jsonify({
             "status": "not_found",
             "message": "No active dispensing process",
             "progress": 0
         })
     
-    # In a real implementation, this would query the hardware
-    # Here we'll simulate progress based on time elapsed
-    elapsed_time = time.time() - current_order['start_time']
-    total_items = len(current_order['items'])
-    current_item_index = current_order['current_item_index']
-    
-    # Simulate different stages
-    if elapsed_time < 2:
-        # Still preparing
-        status = "preparing"
-        progress = min(30, int(elapsed_time * 15))
-    elif elapsed_time < 4:
-        # Dispensing cup
-        status = "dispensing_cup"
-        progress = min(50, 30 + int((elapsed_time - 2) * 10))
-    elif elapsed_time < 8:
-        # Pouring beverage
-        status = "pouring"
-        progress = min(80, 50 + int((elapsed_time - 4) * 7.5))
-        current_item_index = min(current_item_index + int((elapsed_time - 4) / 2), total_items - 1)
-    elif elapsed_time < 10:
-        # Delivering cup
-        status = "delivering"
-        progress = min(99, 80 + int((elapsed_time - 8) * 10))
-    else:
-        # Complete
-        status = "complete"
-        progress = 100
-    
-    # Update session
-    current_order['status'] = status
-    current_order['progress'] = progress
-    current_order['current_item_index'] = current_item_index
-    session['current_order'] = current_order
-    
-    # Get current item being processed
-    current_item = current_order['items'][current_item_index] if current_item_index < total_items else None
-    
-    return jsonify({
-        "status": status,
-        "progress": progress,
-        "message": f"Processing {current_item_index + 1} of {total_items}",
-        "current_item": current_item,
-        "order_items": current_order['items']
-    })
+    return jsonify(order_status)
 
 @app.route('/api/verify_age', methods=['POST'])
 def api_verify_age():